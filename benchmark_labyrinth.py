@@ -0,0 +1,345 @@
+"""
+Rendering benchmark for the Labyrinth and Tile classes.
+
+This module measures how long the drawing stages of a Labyrinth take as the board grows. For every board size it
+builds a real Labyrinth (on the current display, or on a virtual framebuffer started with Xvfb when requested) and
+drives it through a scripted stream of graph updates similar to the ones produced by worker.trabajador: random walls,
+random turtles and random colored marks.
+
+For each frame it measures the time spent in _check_walls, _mark_turtle, _mark_tiles, draw_graph and in the Tk idle
+tasks that flush the canvas, together with the number of items on the canvas and the memory in use. The construction
+of the board (get_board) is measured once per size.
+
+The report includes per-stage latency percentiles (p50, p90, p99 and max), the canvas item count over time and the
+memory over time. It is printed on the terminal and saved as a text file (bench_output.txt by default).
+
+With --startup the report also includes the cold start of the entry points of the project: the time to import each
+of them in a fresh interpreter, and whether the import pulled in tkinter or NumPy. Headless batch jobs only need the
+solvers, so these should start without loading the GUI or NumPy. --no-render skips the rendering part (no display is
+needed then). With --packed the viewer is driven with packed frames of wall bits (see cuadros_empaquetados) instead of
+graphs. With --replay the viewer is driven with the frames of a recording of a real run (see grabacion), at full speed
+and at the size of the recording, so a slow run can be measured again.
+
+Usage:
+    python benchmark_labyrinth.py --sizes 15x20 30x40 --frames 50 --xvfb
+    python benchmark_labyrinth.py --startup --no-render
+    python benchmark_labyrinth.py --sizes 60x80 --frames 200 --packed --xvfb
+    python benchmark_labyrinth.py --replay corrida.rec --xvfb
+"""
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cuadros_empaquetados
+from grabacion import Reproductor
+from grafo import Grafo
+from labyrinth import Labyrinth
+
+
+def percentil(muestras: list, p: float):
+    """
+    Compute the p-th percentile of a list of samples using linear interpolation between the closest ranks.
+
+    :param muestras: (list) The samples. It does not need to be sorted.
+    :param p: (float) The percentile to compute, between 0 and 100.
+    :return: (float) The percentile, or 0.0 if there are no samples.
+    """
+    if not muestras:
+        return 0.0
+    ordenadas = sorted(muestras)
+    k = (len(ordenadas) - 1) * p / 100
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenadas) - 1)
+    return ordenadas[inferior] + (ordenadas[superior] - ordenadas[inferior]) * (k - inferior)
+
+
+def memoria_rss():
+    """
+    Return the resident set size of the current process in bytes, or 0 if it cannot be read (non Linux systems).
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def flujo_trabajador(rows: int, columns: int, frames: int, seed: int = 0, turtles: int = 5):
+    """
+    Generate a scripted stream of graph updates like the ones produced by worker.trabajador.
+
+    Every frame is a full grid with random walls, a few random turtles facing a random neighbour and as many random
+    colored marks. The stream is reproducible for a given seed.
+
+    :param rows: (int) Number of rows of the board.
+    :param columns: (int) Number of columns of the board.
+    :param frames: (int) Number of frames to generate.
+    :param seed: (int) Seed of the random generator.
+    :param turtles: (int) Number of turtles (and colored marks) in each frame.
+    :return: (generator) The graph of each frame as a dictionary with the keys 'V', 'E', 'turtle' and 'colors'.
+    """
+    rnd = random.Random(seed)
+    total = rows * columns
+    colores = ['red', 'blue', 'green']
+    for _ in range(frames):
+        n_edges = rows * (columns - 1) + (rows - 1) * columns
+        # A weight of 0 is a wall, drawn in the same order as the edges of the grid
+        grafo = Grafo.grid(rows, columns, walls=[rnd.randint(0, 1) == 0 for _ in range(n_edges)])
+        for pos in rnd.sample(range(total), min(turtles, total)):
+            grafo.turtle[pos] = rnd.choice(grafo.V[pos]) if grafo.V.get(pos) else 'f'
+        for pos in rnd.sample(range(total), min(turtles, total)):
+            grafo.colors[pos] = rnd.choice(colores)
+        yield grafo.get_graph()
+
+
+def flujo_empaquetado(rows: int, columns: int, frames: int, seed: int = 0, turtles: int = 5):
+    """
+    Generate a scripted stream of packed frames like the ones produced by worker.trabajador_empaquetado, with random
+    turtles and colored marks as in flujo_trabajador. The stream is reproducible for a given seed.
+
+    :return: (generator) The packed frames (see cuadros_empaquetados).
+    """
+    rnd = random.Random(seed)
+    total = rows * columns
+    n_bytes = (cuadros_empaquetados.n_aristas(rows, columns) + 7) // 8
+    colores = ['red', 'blue', 'green']
+    for _ in range(frames):
+        turtle = {pos: 'f' for pos in rnd.sample(range(total), min(turtles, total))}
+        colors = {pos: rnd.choice(colores) for pos in rnd.sample(range(total), min(turtles, total))}
+        yield cuadros_empaquetados.cuadro(rows, columns, rnd.randbytes(n_bytes), turtle, colors)
+
+
+class LabyrinthMedido(Labyrinth):
+    """
+    A Labyrinth that records the time spent in each drawing stage.
+
+    The automatic update loop of the Labyrinth is disabled, the frames are applied explicitly with apply_frame so the
+    benchmark controls the cadence.
+
+    Attributes:
+    ----------
+    tiempos : dict
+        For each stage name, a list with the duration in seconds of every call.
+    """
+
+    def __init__(self, rows: int, columns: int):
+        """
+        Initialize the measured Labyrinth. The construction time of the board is stored in the 'get_board' stage.
+
+        :param rows: (int) The number of rows in the labyrinth.
+        :param columns: (int) The number of columns in the labyrinth.
+        """
+        self.tiempos = {'get_board': [], '_check_walls': [], '_mark_turtle': [], '_mark_tiles': [],
+                        'draw_graph': [], 'idletasks': [], 'frame': []}
+        super().__init__(rows, columns, path='')
+
+    def _medir(self, etapa: str, funcion, *args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        self.tiempos[etapa].append(time.perf_counter() - inicio)
+        return resultado
+
+    def get_board(self):
+        return self._medir('get_board', super().get_board)
+
+    def update_maze(self, imprimir=True):
+        # The benchmark drives the frames itself, the periodic polling of the Queue and the file is not used
+        pass
+
+    def apply_frame(self, graph: dict, draw_graph=False):
+        """
+        Apply one frame to the labyrinth and flush the canvas, measuring every stage.
+
+        :param graph: (dict) The graph of the frame.
+        :param draw_graph: (bool) If True, the graph is also drawn over the board with draw_graph (not for packed
+                           frames).
+        :return: None
+        """
+        inicio = time.perf_counter()
+        self._medir('_check_walls', self._check_walls, graph)
+        self._medir('_mark_turtle', self._mark_turtle, graph['turtle'])
+        self._medir('_mark_tiles', self._mark_tiles, graph['colors'])
+        if draw_graph and not cuadros_empaquetados.es_empaquetado(graph):  # A packed frame has no graph to draw
+            self._medir('draw_graph', self.draw_graph, graph)
+        self._medir('idletasks', self.window.update)
+        self.tiempos['frame'].append(time.perf_counter() - inicio)
+
+
+def iniciar_xvfb(display=':99', screen='4096x4096x24'):
+    """
+    Start a virtual framebuffer (Xvfb) and point the DISPLAY environment variable to it.
+
+    :param display: (str) The display number to use.
+    :param screen: (str) The screen geometry and depth.
+    :return: (subprocess.Popen) The Xvfb process. It must be terminated by the caller.
+    """
+    if shutil.which('Xvfb') is None:
+        raise RuntimeError('Xvfb is not installed, run the benchmark on a real display instead.')
+    proceso = subprocess.Popen(['Xvfb', display, '-screen', '0', screen],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)  # Give the server time to accept connections
+    os.environ['DISPLAY'] = display
+    return proceso
+
+
+def medir_tamano(rows: int, columns: int, frames: int, seed=0, draw_graph=False, muestreo=10, packed=False,
+                 replay: Reproductor = None):
+    """
+    Run the benchmark for one board size.
+
+    :param rows: (int) Number of rows of the board.
+    :param columns: (int) Number of columns of the board.
+    :param frames: (int) Number of frames of the scripted stream.
+    :param seed: (int) Seed of the scripted stream.
+    :param draw_graph: (bool) If True, draw_graph is also measured on every frame.
+    :param muestreo: (int) The canvas item count and the memory are sampled every `muestreo` frames.
+    :param packed: (bool) If True, the stream is made of packed frames (flujo_empaquetado) instead of graphs.
+    :param replay: (Reproductor) If given, the stream is the frames of the recording (the size must be the one of the
+                   recording, and frames and seed are ignored).
+    :return: (dict) The stage times, and the samples of canvas items and memory over time.
+    """
+    tracemalloc.start()
+    maze = LabyrinthMedido(rows, columns)
+    serie = []
+    try:
+        if replay is not None:
+            frames = len(replay)
+            flujo = (graph for _, graph in replay.cuadros())
+        else:
+            flujo = (flujo_empaquetado if packed else flujo_trabajador)(rows, columns, frames, seed)
+        for k, graph in enumerate(flujo):
+            maze.apply_frame(graph, draw_graph=draw_graph)
+            if k % muestreo == 0 or k == frames - 1:
+                actual, _ = tracemalloc.get_traced_memory()
+                serie.append((k, len(maze.canvas.find_all()), actual, memoria_rss()))
+    finally:
+        maze.stop()
+        tracemalloc.stop()
+    return {'size': (rows, columns), 'tiempos': maze.tiempos, 'serie': serie}
+
+
+MODULOS_ARRANQUE = ['sol_escenario_', 'sol_escenario_diferencia', 'gen_escenario', 'gen_escenario_conprio',
+                    'flujo_escenario', 'orquestador']
+
+_SONDA = """
+import sys, time
+inicio = time.perf_counter()
+import {modulo}
+print(time.perf_counter() - inicio, 'tkinter' in sys.modules, 'numpy' in sys.modules)
+"""
+
+
+def medir_arranque(modulos: list = MODULOS_ARRANQUE, repeticiones: int = 5):
+    """
+    Measure the cold start of some modules: every module is imported in a fresh interpreter, `repeticiones` times.
+
+    :param modulos: (list) The names of the modules.
+    :param repeticiones: (int) Number of fresh interpreters per module.
+    :return: (list) For every module, a dictionary with its name, the import times in seconds, the time of the
+             whole interpreter (start, import and exit) in seconds, and whether tkinter and NumPy were loaded.
+    """
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    resultados = []
+    for modulo in modulos:
+        importacion, proceso, tk, np = [], [], False, False
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            salida = subprocess.run([sys.executable, '-c', _SONDA.format(modulo=modulo)], cwd=directorio,
+                                    capture_output=True, text=True, check=True).stdout
+            proceso.append(time.perf_counter() - inicio)
+            segundos, tk, np = salida.split()[-3:]
+            importacion.append(float(segundos))
+            tk, np = tk == 'True', np == 'True'
+        resultados.append({'modulo': modulo, 'importacion': importacion, 'proceso': proceso, 'tkinter': tk,
+                           'numpy': np})
+    return resultados
+
+
+def reporte_arranque(resultados: list):
+    """
+    Format the cold start of the modules as text.
+
+    :param resultados: (list) The results returned by medir_arranque.
+    :return: (str) The report.
+    """
+    lineas = ['Cold start (fresh interpreter per run)',
+              f'  {"module":<26}{"import p50 ms":>15}{"process p50 ms":>16}{"tkinter":>9}{"numpy":>7}']
+    for resultado in resultados:
+        lineas.append(f'  {resultado["modulo"]:<26}{percentil(resultado["importacion"], 50) * 1000:>15.1f}'
+                      f'{percentil(resultado["proceso"], 50) * 1000:>16.1f}'
+                      f'{"yes" if resultado["tkinter"] else "no":>9}{"yes" if resultado["numpy"] else "no":>7}')
+    lineas.append('')
+    return '\n'.join(lineas)
+
+
+def reporte(resultados: list):
+    """
+    Format the results of the benchmark as text.
+
+    :param resultados: (list) The results returned by medir_tamano for every board size.
+    :return: (str) The report.
+    """
+    lineas = []
+    for resultado in resultados:
+        rows, columns = resultado['size']
+        lineas.append(f'Board {rows}x{columns} ({rows * columns} tiles)')
+        lineas.append(f'  {"stage":<14}{"calls":>7}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+        for etapa, muestras in resultado['tiempos'].items():
+            if not muestras:
+                continue
+            valores = [percentil(muestras, p) * 1000 for p in (50, 90, 99)] + [max(muestras) * 1000]
+            lineas.append(f'  {etapa:<14}{len(muestras):>7}' + ''.join(f'{v:>10.3f}' for v in valores))
+        lineas.append(f'  {"frame":<8}{"items":>10}{"traced KiB":>14}{"RSS KiB":>12}')
+        for k, items, trazada, rss in resultado['serie']:
+            lineas.append(f'  {k:<8}{items:>10}{trazada // 1024:>14}{rss // 1024:>12}')
+        lineas.append('')
+    return '\n'.join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendering benchmark for the Labyrinth viewer.')
+    parser.add_argument('--sizes', nargs='+', default=['15x20', '30x40', '60x80'],
+                        help='Board sizes as ROWSxCOLUMNS.')
+    parser.add_argument('--frames', type=int, default=50, help='Frames of the scripted stream per size.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the scripted stream.')
+    parser.add_argument('--draw-graph', action='store_true', help='Also measure draw_graph on every frame.')
+    parser.add_argument('--packed', action='store_true', help='Drive the viewer with packed frames of wall bits.')
+    parser.add_argument('--replay', help='Drive the viewer with the frames of a recording (see grabacion).')
+    parser.add_argument('--xvfb', action='store_true', help='Run on a virtual framebuffer started with Xvfb.')
+    parser.add_argument('--startup', action='store_true', help='Also measure the cold start of the entry points.')
+    parser.add_argument('--no-render', action='store_true', help='Skip the rendering benchmark.')
+    parser.add_argument('--output', default='bench_output.txt', help='File where the report is saved.')
+    args = parser.parse_args()
+
+    texto = reporte_arranque(medir_arranque()) if args.startup else ''
+    if not args.no_render:
+        xvfb = iniciar_xvfb() if args.xvfb else None
+        try:
+            resultados = []
+            if args.replay:
+                grabacion = Reproductor(args.replay)
+                resultados.append(medir_tamano(grabacion.nrows, grabacion.ncols, len(grabacion),
+                                              draw_graph=args.draw_graph, replay=grabacion))
+            else:
+                for size in args.sizes:
+                    rows, columns = (int(x) for x in size.lower().split('x'))
+                    resultados.append(medir_tamano(rows, columns, args.frames, args.seed, args.draw_graph,
+                                                  packed=args.packed))
+        finally:
+            if xvfb is not None:
+                xvfb.terminate()
+        texto += reporte(resultados)
+    print(texto)
+    with open(args.output, 'w') as f:
+        f.write(texto)
+
+
+if __name__ == '__main__':
+    main()
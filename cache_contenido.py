@@ -0,0 +1,187 @@
+"""
+This module implements an on-disk content-addressed cache for the labyrinth project.
+
+Every entry is a JSON value stored under the hash of the inputs that produced it (see clave), so identical inputs find
+the previous result no matter which run produced it: a scenario generated with the same seed, or the routes of the
+same maze with the same turtles, colors and solver options. The entries are files named after their hash, and the
+files are written atomically, so a run that is interrupted never leaves a broken entry.
+
+The cache has a size cap. When it is exceeded, the least recently used entries are evicted (every hit refreshes the
+modification time of its file, which is used as the time of the last use). The cache keeps a running total of the size
+of its entries, so the directory is only scanned once, and again when the cap is exceeded.
+
+The cache is opt-in: the solvers only use it when they are asked to (usar_cache).
+
+The directory and the size cap can be set with the environment variables LABERINTO_CACHE and LABERINTO_CACHE_MB.
+Setting LABERINTO_CACHE to an empty string disables the default cache.
+
+Usage:
+    cache = cache_por_defecto()
+    llave = clave('rutas', graph, opciones)
+    valor = cache.obtener(llave)
+    if valor is None:
+        valor = ...
+        cache.guardar(llave, valor)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+DIRECTORIO = '.cache_laberinto'  # Default directory of the cache
+TAMANO_MAXIMO = 64 * 1024 * 1024  # Default size cap in bytes
+
+
+def clave(*partes):
+    """
+    Return the key of some inputs: the SHA-256 of their canonical JSON. The keys of the dictionaries are sorted, so an
+    input whose order matters must be given as a list (for example, the items of the dictionary).
+
+    :param partes: Values that can be serialized as JSON.
+    :return: (str) The key as a hexadecimal string.
+    """
+    texto = json.dumps(partes, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+class CacheContenido:
+    """
+    On-disk cache of JSON values by key, with LRU eviction.
+
+    Attributes:
+    ----------
+    directorio : str
+        The directory of the entries.
+    tamano_maximo : int
+        The size cap of the cache in bytes.
+    aciertos : int
+        Number of hits since the cache was created.
+    fallos : int
+        Number of misses since the cache was created.
+    """
+
+    def __init__(self, directorio: str = DIRECTORIO, tamano_maximo: int = TAMANO_MAXIMO):
+        """
+        :param directorio: (str) The directory of the entries. It is created if it does not exist.
+        :param tamano_maximo: (int) The size cap of the cache in bytes.
+        """
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        self.aciertos = 0
+        self.fallos = 0
+        self._total = None  # Running total of the size of the entries, scanned at the first write
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, llave: str):
+        return os.path.join(self.directorio, f'{llave}.json')
+
+    def obtener(self, llave: str):
+        """
+        Return the value stored under a key, or None if there is none.
+        """
+        ruta = self._ruta(llave)
+        try:
+            with open(ruta, 'r') as f:
+                valor = json.load(f)
+        except FileNotFoundError:
+            self.fallos += 1
+            return None
+        except ValueError:  # A broken entry is discarded
+            self._descontar(ruta)
+            self._borrar(ruta)
+            self.fallos += 1
+            return None
+        os.utime(ruta)  # Last use, for the LRU eviction
+        self.aciertos += 1
+        return valor
+
+    def guardar(self, llave: str, valor):
+        """
+        Store a value under a key, and evict the least recently used entries if the cache exceeds its size cap.
+
+        :param llave: (str) The key (see clave).
+        :param valor: A value that can be serialized as JSON.
+        :return: None
+        """
+        if self._total is None:
+            self._total = self.tamano()
+        ruta = self._ruta(llave)
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as f:
+            json.dump(valor, f, separators=(',', ':'))
+        nuevo = os.stat(temporal).st_size
+        self._descontar(ruta)  # The entry replaced, if any
+        os.replace(temporal, ruta)
+        self._total += nuevo
+        if self._total > self.tamano_maximo:
+            self._desalojar()
+
+    def _entradas(self):
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.json'):
+                try:
+                    estado = os.stat(os.path.join(self.directorio, nombre))
+                except FileNotFoundError:
+                    continue
+                entradas.append((estado.st_mtime, estado.st_size, nombre))
+        return entradas
+
+    def tamano(self):
+        """
+        Return the total size of the entries in bytes.
+        """
+        return sum(tamano for _, tamano, _ in self._entradas())
+
+    def _descontar(self, ruta):
+        # Remove the size of an entry from the running total, before the entry is removed or replaced
+        if self._total is not None:
+            try:
+                self._total -= os.stat(ruta).st_size
+            except FileNotFoundError:
+                pass
+
+    def _desalojar(self):
+        # The directory is scanned again, so the total also catches the entries written by other processes
+        entradas = sorted(self._entradas())
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, nombre in entradas:
+            if total <= self.tamano_maximo:
+                break
+            self._borrar(os.path.join(self.directorio, nombre))
+            total -= tamano
+        self._total = total
+
+    @staticmethod
+    def _borrar(ruta):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+    def limpiar(self):
+        """
+        Remove all the entries.
+        """
+        for _, _, nombre in self._entradas():
+            self._borrar(os.path.join(self.directorio, nombre))
+        self._total = 0
+
+
+_cache = None
+
+
+def cache_por_defecto():
+    """
+    Return the default cache of the project, or None if it is disabled. Its directory and size cap are read from the
+    environment variables LABERINTO_CACHE and LABERINTO_CACHE_MB.
+    """
+    global _cache
+    directorio = os.environ.get('LABERINTO_CACHE', DIRECTORIO)
+    if not directorio:
+        return None
+    if _cache is None or _cache.directorio != directorio:
+        megas = os.environ.get('LABERINTO_CACHE_MB')
+        _cache = CacheContenido(directorio, int(float(megas) * 1024 * 1024) if megas else TAMANO_MAXIMO)
+    return _cache
@@ -0,0 +1,85 @@
+"""
+This module implements the packed frames of walls sent to the Labyrinth through the Queue.
+
+A graph frame repeats every vertex and every edge key as strings, so building, copying and drawing it costs several
+Python objects per edge. A packed frame only carries the wall flags of the grid, one bit per edge:
+
+    {"formato": "paredes_bits", "filas": 15, "columnas": 20, "paredes": b'...', "turtle": {}, "colors": {}}
+
+The edges are numbered as in laberintos_perfectos.Paredes: first the horizontal edges row by row (the edge between
+the cells i and i + 1 of the row f has the number i - f), then the vertical edges (the edge between the cells i and
+i + ncols has the number nrows * (ncols - 1) + i). The bit of the edge k is the bit 7 - k % 8 of the byte k // 8 (the
+order of numpy.packbits), 1 if the edge is open and 0 if there is a wall, as in the key 'E' of a graph.
+
+The Labyrinth keeps the walls of the last packed frame and only redraws the edges whose bit changed (see cambios). This
+module does not need NumPy, so the viewer can decode the frames without loading it.
+"""
+
+FORMATO = 'paredes_bits'
+
+
+def es_empaquetado(graph: dict):
+    """
+    Return True if the given graph is a packed frame.
+    """
+    return graph.get('formato') == FORMATO
+
+
+def n_aristas(nrows: int, ncols: int):
+    """
+    Return the number of edges of a grid of nrows x ncols cells.
+    """
+    return nrows * (ncols - 1) + (nrows - 1) * ncols
+
+
+def cuadro(nrows: int, ncols: int, paredes: bytes, turtle: dict = None, colors: dict = None):
+    """
+    Build a packed frame.
+
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :param paredes: (bytes) The packed wall bits, at least ceil(n_aristas / 8) bytes. Extra bits are ignored.
+    :param turtle: (dict) The turtles of the frame, as in a graph. Default is no turtles.
+    :param colors: (dict) The colored points of the frame, as in a graph. Default is no points.
+    :return: (dict) The frame.
+    """
+    if len(paredes) * 8 < n_aristas(nrows, ncols):
+        raise ValueError('There are fewer wall bits than edges in the grid.')
+    return {'formato': FORMATO, 'filas': nrows, 'columnas': ncols, 'paredes': bytes(paredes),
+            'turtle': {} if turtle is None else turtle, 'colors': {} if colors is None else colors}
+
+
+def arista(k: int, nrows: int, ncols: int):
+    """
+    Return the cells of the edge number k of the grid, as a tuple (lower cell, higher cell).
+    """
+    horizontales = nrows * (ncols - 1)
+    if k < horizontales:
+        fila = k // (ncols - 1)
+        return k + fila, k + fila + 1
+    i = k - horizontales
+    return i, i + ncols
+
+
+def cambios(anterior, actual: bytes, nrows: int, ncols: int):
+    """
+    Compare the wall bits of two packed frames.
+
+    :param anterior: (bytes) The wall bits of the previous frame, or None to get every edge of the current frame.
+    :param actual: (bytes) The wall bits of the current frame.
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :return: (generator) Tuples (vertex_o, vertex_i, abierta) for every edge whose bit differs, where abierta is True if
+             the edge is open in the current frame.
+    """
+    total = n_aristas(nrows, ncols)
+    for n, byte in enumerate(actual[:(total + 7) // 8]):
+        diferencia = 0xFF if anterior is None else byte ^ anterior[n]
+        if not diferencia:  # Most of the bytes of two similar frames are equal
+            continue
+        for bit in range(8):
+            if diferencia & (0x80 >> bit):
+                k = n * 8 + bit
+                if k >= total:
+                    break
+                yield (*arista(k, nrows, ncols), bool(byte & (0x80 >> bit)))
@@ -0,0 +1,262 @@
+"""
+This module searches for scenarios of a given difficulty, to build graded corpora for load tests.
+
+The scenarios of motor_escenario are drawn at random, so their difficulty varies from one seed to the next. Here many
+candidate scenarios are generated in batches of consecutive seeds, every one is scored with breadth-first searches
+over its open edges, and only the ones that meet the targets are kept. The metrics of a scenario are:
+
+- longitud: the shortest route (in cells) from a turtle to the exit, over all the turtles;
+- desvio: the mean over the turtles of the length of the route to the exit divided by the Manhattan distance to it
+  (1.0 is a straight path, larger values mean the walls force the turtles around);
+- disputadas: the number of points that are the nearest point of two or more turtles, which the turtles have to
+  compete for;
+- inalcanzables: the number of turtles and points that cannot reach the exit. A candidate with any of them is always
+  rejected.
+
+Every candidate costs two searches: one from the exit and one from all the points at once (multi-source, every cell
+gets its distance to the nearest point and which point it is). They count steps and ignore the traversal costs 'C',
+which is enough to rank the scenarios and much cheaper than the solvers. The passable cells are the ones of the solvers
+(motor_rutas.Transitabilidad).
+
+The batches run in a pool of processes, and the search stops when enough scenarios are found or when the time budget
+runs out. The results are taken in the order of the seeds, so the corpus does not depend on the number of processes:
+with enough time it is always the first n seeds that meet the targets. A scenario of the corpus is stored as its seed
+and its options, and it is generated again, byte by byte, with cargar.
+
+Usage:
+    metas = {'longitud': (10, None), 'desvio': (1.3, None), 'disputadas': (1, None)}
+    entradas, reporte = buscar(metas, 100, n_tortugas=4, presupuesto=30)
+    guardar_corpus(entradas, 'corpus.jsonl')
+    escenario = cargar(entradas[0])
+
+    python dificultad.py --n 500 --tortugas 4 --longitud 10 - --disputadas 1 - --presupuesto 120
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import motor_rutas
+
+NROWS, NCOLS = 15, 20
+METRICAS = ('longitud', 'desvio', 'disputadas', 'inalcanzables')
+
+
+def bfs_multiple(vecinos: list, fuentes, paso: bytearray):
+    """
+    Breadth-first search from several sources at once.
+
+    :param vecinos: (list) The open neighbours of every cell.
+    :param fuentes: (iterable) The source cells. A source that is not passable is ignored.
+    :param paso: (bytearray) 1 for the cells a path can enter, 0 otherwise.
+    :return: (tuple) Two lists with one element per cell: the distance to the nearest source and the index of that
+             source in fuentes (-1 for the cells that no source reaches). A cell at the same distance of several
+             sources gets the one whose search reached it first.
+    """
+    n = len(vecinos)
+    distancia, origen = [-1] * n, [-1] * n
+    cola = deque()
+    for k, fuente in enumerate(fuentes):
+        if 0 <= fuente < n and paso[fuente] and distancia[fuente] < 0:
+            distancia[fuente], origen[fuente] = 0, k
+            cola.append(fuente)
+    while cola:
+        nodo = cola.popleft()
+        siguiente, k = distancia[nodo] + 1, origen[nodo]
+        for vecino in vecinos[nodo]:
+            if distancia[vecino] < 0 and paso[vecino]:
+                distancia[vecino], origen[vecino] = siguiente, k
+                cola.append(vecino)
+    return distancia, origen
+
+
+def medir(grafo, cuadros_encerrados: list, nrows: int = NROWS, ncols: int = NCOLS):
+    """
+    Compute the difficulty metrics of a scenario.
+
+    :param grafo: (Grafo) The graph of the scenario, with the turtles (the exit has the value 'f') and the points.
+    :param cuadros_encerrados: (list) The enclosed cells.
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :return: (dict) The metrics (see METRICAS). longitud and desvio are None if no turtle reaches the exit.
+    """
+    n = max(nrows * ncols, max(map(int, grafo.V), default=-1) + 1)
+    vecinos = [[] for _ in range(n)]
+    for a, b in zip(*grafo.open_edges()):
+        vecinos[a].append(b)
+        vecinos[b].append(a)
+    paso = motor_rutas.Transitabilidad(nrows, ncols, cuadros_encerrados, n).base
+    tortugas = [int(pos) for pos, destino in grafo.turtle.items() if destino != 'f']
+    salidas = [int(pos) for pos, destino in grafo.turtle.items() if destino == 'f']
+    puntos = [int(pos) for pos in grafo.colors]
+
+    distancia, _ = bfs_multiple(vecinos, salidas, paso)
+    rutas = [(pos, distancia[pos]) for pos in tortugas if distancia[pos] > 0]
+    inalcanzables = len(tortugas) - len(rutas) + sum(1 for pos in puntos if distancia[pos] < 0)
+    longitud = desvio = None
+    if rutas:
+        fila_s, columna_s = divmod(salidas[0], ncols)
+        longitud = min(d for _, d in rutas)
+        desvio = sum(d / (abs(pos // ncols - fila_s) + abs(pos % ncols - columna_s)) for pos, d in rutas) / len(rutas)
+
+    # Nearest point of every turtle, from a single search started at all the points
+    _, cercano = bfs_multiple(vecinos, puntos, paso)
+    elegidos = Counter(cercano[pos] for pos in tortugas if cercano[pos] >= 0)
+    disputadas = sum(1 for veces in elegidos.values() if veces > 1)
+    return {'longitud': longitud, 'desvio': desvio, 'disputadas': disputadas, 'inalcanzables': inalcanzables}
+
+
+def cumple(metricas: dict, metas: dict):
+    """
+    Return True if the metrics of a scenario meet the targets.
+
+    :param metricas: (dict) The metrics, as returned by medir.
+    :param metas: (dict) For some metrics, a tuple (minimum, maximum), both included. None leaves a side open.
+    :return: (bool) True if every metric is inside its range and no turtle or point is unreachable.
+    """
+    if metricas['inalcanzables']:
+        return False
+    for nombre, (minimo, maximo) in metas.items():
+        valor = metricas[nombre]
+        if valor is None or (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+            return False
+    return True
+
+
+def _lote(tarea):
+    # Generate and score the scenarios of a batch of consecutive seeds in a worker; only the ones that pass travel back
+    from motor_escenario import generar_escenario  # NumPy is only loaded in the workers
+
+    primera, cantidad, n_tortugas, prioridad, metas, opciones = tarea
+    nrows, ncols = opciones.get('nrows', NROWS), opciones.get('ncols', NCOLS)
+    aceptadas = []
+    for semilla in range(primera, primera + cantidad):
+        grafo, cuadros_encerrados = generar_escenario(n_tortugas, semilla, prioridad=prioridad, **opciones)
+        metricas = medir(grafo, cuadros_encerrados, nrows, ncols)
+        if cumple(metricas, metas):
+            aceptadas.append({'semilla': semilla, 'n_tortugas': n_tortugas, 'prioridad': prioridad,
+                              'opciones': opciones, 'metricas': metricas})
+    return aceptadas
+
+
+def buscar(metas: dict, n: int, n_tortugas: int, prioridad: bool = False, presupuesto: float = 60.0,
+           procesos: int = None, tamano_lote: int = 64, semilla: int = 0, **opciones):
+    """
+    Search for scenarios that meet the targets.
+
+    :param metas: (dict) The targets, as in cumple.
+    :param n: (int) Number of scenarios wanted.
+    :param n_tortugas: (int) Number of turtles of every scenario.
+    :param prioridad: (bool) If True, the scenarios have points of the three priority colors.
+    :param presupuesto: (float) Seconds after which no more batches are started. The batches already running are
+                        discarded.
+    :param procesos: (int) Number of worker processes. If None, one per CPU.
+    :param tamano_lote: (int) Number of candidates of a batch.
+    :param semilla: (int) The first seed. The candidates are the seeds semilla, semilla + 1, ...
+    :param opciones: Other options of motor_escenario.generar_escenario (nrows, ncols, n_piezas, terreno...).
+    :return: (tuple) The scenarios found (at most n, in the order of their seeds, as dictionaries with the seed, the
+             options and the metrics) and a report with the candidates scored, the seconds and whether n were found.
+    """
+    desconocidas = set(metas) - set(METRICAS)
+    if desconocidas:
+        raise ValueError(f"Unknown metrics {', '.join(sorted(desconocidas))}, use {', '.join(METRICAS)}.")
+    inicio = time.perf_counter()
+    entradas, evaluados = [], 0
+    siguiente = semilla
+    procesos = procesos or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=procesos)
+    en_vuelo = deque()
+    try:
+        # Keep two batches per worker in flight, and take the results in the order of the seeds
+        while len(entradas) < n:
+            while len(en_vuelo) < 2 * procesos and time.perf_counter() - inicio < presupuesto:
+                tarea = (siguiente, tamano_lote, n_tortugas, prioridad, metas, opciones)
+                en_vuelo.append(executor.submit(_lote, tarea))
+                siguiente += tamano_lote
+            if not en_vuelo:
+                break
+            restante = presupuesto - (time.perf_counter() - inicio)
+            if restante <= 0:
+                break
+            try:
+                aceptadas = en_vuelo[0].result(timeout=restante)
+            except TimeoutError:
+                break
+            en_vuelo.popleft()
+            entradas.extend(aceptadas)
+            evaluados += tamano_lote
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    completo = len(entradas) >= n
+    entradas = entradas[:n]
+    if completo and entradas:
+        evaluados = entradas[-1]['semilla'] - semilla + 1  # The candidates after the last scenario kept do not count
+    return entradas, {'evaluados': evaluados, 'segundos': time.perf_counter() - inicio, 'completo': completo}
+
+
+def guardar_corpus(entradas: list, ruta: str):
+    """
+    Write the scenarios of a search as JSON lines, one scenario per line.
+    """
+    with open(ruta, 'w') as f:
+        f.write(''.join(json.dumps(entrada) + '\n' for entrada in entradas))
+
+
+def leer_corpus(ruta: str):
+    """
+    Read the scenarios written by guardar_corpus.
+    """
+    with open(ruta, 'r') as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def cargar(entrada: dict):
+    """
+    Generate again the scenario of an entry of a corpus.
+
+    :param entrada: (dict) The entry, as returned by buscar or leer_corpus.
+    :return: (flujo_escenario.Escenario) The scenario.
+    """
+    import flujo_escenario
+
+    opciones = dict(entrada['opciones'])
+    nrows, ncols = opciones.pop('nrows', NROWS), opciones.pop('ncols', NCOLS)
+    return flujo_escenario.generar(entrada['n_tortugas'], entrada['semilla'], entrada['prioridad'], nrows, ncols,
+                                   **opciones)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search for scenarios of a given difficulty.')
+    parser.add_argument('--n', type=int, default=100, help='Number of scenarios wanted.')
+    parser.add_argument('--tortugas', type=int, default=4, help='Number of turtles of every scenario.')
+    parser.add_argument('--prioridad', action='store_true', help='Place points of the three priority colors.')
+    for nombre in METRICAS[:-1]:
+        parser.add_argument(f'--{nombre}', nargs=2, metavar=('MIN', 'MAX'),
+                            help=f"Range of '{nombre}'; '-' leaves a side open.")
+    parser.add_argument('--presupuesto', type=float, default=60.0, help='Time budget in seconds.')
+    parser.add_argument('--procesos', type=int, help='Number of worker processes (default: one per CPU).')
+    parser.add_argument('--lote', type=int, default=64, help='Number of candidates of a batch.')
+    parser.add_argument('--semilla', type=int, default=0, help='The first seed.')
+    parser.add_argument('--tamano', default=f'{NROWS}x{NCOLS}', help='Board size as ROWSxCOLUMNS.')
+    parser.add_argument('--piezas', type=int, default=7, help='Maximum number of pieces.')
+    parser.add_argument('--salida', default='corpus.jsonl', help='File where the scenarios are saved.')
+    args = parser.parse_args()
+
+    metas = {}
+    for nombre in METRICAS[:-1]:
+        rango = getattr(args, nombre)
+        if rango is not None:
+            metas[nombre] = tuple(None if valor == '-' else float(valor) for valor in rango)
+    nrows, ncols = (int(x) for x in args.tamano.lower().split('x'))
+    entradas, reporte = buscar(metas, args.n, args.tortugas, args.prioridad, args.presupuesto, args.procesos,
+                               args.lote, args.semilla, nrows=nrows, ncols=ncols, n_piezas=args.piezas)
+    guardar_corpus(entradas, args.salida)
+    print(f"{len(entradas)} of {args.n} scenarios in {reporte['segundos']:.1f} s, "
+          f"{reporte['evaluados']} candidates scored, saved in {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
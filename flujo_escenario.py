@@ -0,0 +1,153 @@
+"""
+This module offers the generate -> solve -> render pipeline of the labyrinth project as a library API in memory.
+
+The scripts pass every scenario through files: the generator writes graph_generado.json and cuadros_encerrados.txt,
+the solver reads them back and writes the solution, and the viewer reads a copy of it. Here every stage takes and
+returns objects:
+
+- generar returns an Escenario with the graph (Grafo), the enclosed cells and the passability mask of the maze;
+- resolver takes the Escenario and returns the routes of the turtles;
+- renderizar draws it in a Labyrinth, and it is optional (tkinter is only imported there);
+- guardar writes the files of the scripts, and it is optional too.
+
+Usage:
+    escenario = generar(3, semilla=7)
+    caminos = resolver(escenario)
+    guardar(escenario)  # Only if the files are needed
+    renderizar(escenario, tiempo=3000)
+"""
+
+import json
+import queue
+
+import formato_rutas
+import instrumentacion
+import motor_rutas
+
+NROWS, NCOLS = 15, 20
+
+
+class Escenario:
+    """
+    A scenario in memory.
+
+    Attributes:
+    ----------
+    grafo : Grafo
+        The graph of the maze, with the turtles and the colored points.
+    cuadros_encerrados : list
+        The enclosed cells.
+    mascara : motor_rutas.Transitabilidad
+        The passability mask of the maze (enclosed cells and borders of the board).
+    nrows : int
+        Number of rows of the board.
+    ncols : int
+        Number of columns of the board.
+    caminos : list
+        The route of every turtle as a list of cells, or None until the scenario is solved.
+    """
+
+    def __init__(self, grafo, cuadros_encerrados: list, nrows: int = NROWS, ncols: int = NCOLS):
+        """
+        :param grafo: (Grafo) The graph of the maze.
+        :param cuadros_encerrados: (list) The enclosed cells.
+        :param nrows: (int) Number of rows of the board.
+        :param ncols: (int) Number of columns of the board.
+        """
+        self.grafo = grafo
+        self.cuadros_encerrados = cuadros_encerrados
+        self.nrows, self.ncols = nrows, ncols
+        self.mascara = motor_rutas.Transitabilidad(nrows, ncols, cuadros_encerrados,
+                                                   max(map(int, grafo.V), default=-1) + 1)
+        self.caminos = None
+
+    def solucion(self):
+        """
+        Return the graph of the scenario ready to be drawn: with the routes in the compact format if it is solved.
+        """
+        graph = dict(self.grafo.get_graph())
+        if self.caminos is not None:
+            graph['turtle'] = [{'inicio': camino[0],
+                                'movimientos': formato_rutas.codificar_movimientos(camino, self.ncols)}
+                               for camino in self.caminos]
+        return graph
+
+
+def generar(n_tortugas: int, semilla=None, prioridad: bool = False, nrows: int = NROWS, ncols: int = NCOLS,
+            **opciones):
+    """
+    Generate a scenario in memory.
+
+    :param n_tortugas: (int) Number of turtles.
+    :param semilla: (int) Seed of the scenario. If None, the scenario is not reproducible.
+    :param prioridad: (bool) If True, points of the three priority colors are placed (see generar_escenario).
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :param opciones: Other options of motor_escenario.generar_escenario (n_piezas, terreno...).
+    :return: (Escenario) The scenario.
+    """
+    from motor_escenario import generar_escenario  # NumPy is only loaded to generate
+
+    grafo, cuadros_encerrados = generar_escenario(n_tortugas, semilla, prioridad=prioridad, nrows=nrows, ncols=ncols,
+                                                  **opciones)
+    return Escenario(grafo, cuadros_encerrados, nrows, ncols)
+
+
+def resolver(escenario: Escenario, metodo: str = 'diferencia', procesos: int = None):
+    """
+    Solve a scenario in memory. The routes are also kept in escenario.caminos.
+
+    :param escenario: (Escenario) The scenario.
+    :param metodo: (str) 'diferencia' for the solver of the levels (sol_escenario_diferencia), or 'secuencial' for
+                   the assignment by nearest point of sol_escenario_.
+    :param procesos: (int) If given, the routes are computed with a pool of processes (see rutas_paralelas).
+    :return: (list) The route of every turtle as a list of cells.
+    """
+    if metodo == 'diferencia':
+        from sol_escenario_diferencia import calcular_caminos
+    elif metodo == 'secuencial':
+        from sol_escenario_ import calcular_caminos
+    else:
+        raise ValueError("The method must be 'diferencia' or 'secuencial'.")
+    with instrumentacion.temporizador('resolver'):
+        escenario.caminos = calcular_caminos(escenario.grafo.get_graph(), escenario.mascara, escenario.nrows,
+                                             escenario.ncols, procesos)
+    return escenario.caminos
+
+
+def guardar(escenario: Escenario, ruta_grafo: str = 'graph_generado.json',
+            ruta_encerrados: str = 'cuadros_encerrados.txt', metodo: str = 'Dijkstra'):
+    """
+    Write the files of the scripts: the graph, the enclosed cells and, if the scenario is solved, the compact
+    solution (next to the graph, with the suffix '_solucion<metodo>').
+
+    :return: (str) The path of the solution file, or None if the scenario is not solved.
+    """
+    escenario.grafo.save_graph(ruta_grafo)
+    with open(ruta_encerrados, 'w') as f:
+        f.write(''.join(f'{celda}\n' for celda in escenario.cuadros_encerrados))
+    instrumentacion.bytes_archivo('bytes_escritos', ruta_encerrados)
+    if escenario.caminos is None:
+        return None
+    ruta_solucion = ruta_grafo.replace('.json', f'_solucion{metodo}.json')
+    with open(ruta_solucion, 'w') as f:
+        json.dump(formato_rutas.solucion(escenario.grafo.get_graph(), escenario.caminos, escenario.ncols, ruta_grafo,
+                                         metodo), f)
+    instrumentacion.bytes_archivo('bytes_escritos', ruta_solucion)
+    return ruta_solucion
+
+
+def renderizar(escenario: Escenario, tiempo: int = 0):
+    """
+    Draw a scenario (solved or not) in a Labyrinth. It blocks until the window is closed.
+
+    :param escenario: (Escenario) The scenario.
+    :param tiempo: (int) Milliseconds before the window closes by itself. 0 keeps it open until the user closes it.
+    :return: None
+    """
+    from labyrinth import Labyrinth
+
+    cola = queue.Queue()
+    cola.put(escenario.solucion())
+    laberinto = Labyrinth(escenario.nrows, escenario.ncols, queue=cola)
+    laberinto.start(auto_close=bool(tiempo), time=tiempo)
@@ -0,0 +1,158 @@
+"""
+This module implements the compact format of the solution files.
+
+A solution used to be the whole graph of the maze with the 'turtle' key replaced by a dictionary {cell: next cell},
+with 'f' at the end of every route. That copies V and E in every solution, and two turtles passing through the same
+cell overwrite each other. In the compact format every route is stored on its own as its start cell and a run-length
+encoded string of moves (U, D, L, R; 'R3D2L' is three cells right, two down and one left), and the maze is referenced
+by the name of its file and the hash of its content instead of being copied:
+
+    {"formato": "rutas_rle", "laberinto": "<sha256>", "grafo": "graph_generado.json", "columnas": 20,
+     "metodo": "Dijkstra", "rutas": [{"inicio": 17, "movimientos": "R3D2L"}, ...]}
+
+The Labyrinth expands a compact solution with expandir and draws the routes with pasos.
+"""
+
+import hashlib
+import json
+import re
+
+FORMATO = 'rutas_rle'
+_DESPLAZAMIENTOS = {'U': (-1, 0), 'D': (1, 0), 'L': (0, -1), 'R': (0, 1)}
+_TRAMO = re.compile(r'([UDLR])(\d*)')
+
+
+def hash_laberinto(graph: dict):
+    """
+    Return the hash of a maze: the SHA-256 of its vertices, edges, costs and colors in canonical JSON.
+
+    :param graph: (dict) The graph with the keys 'V', 'E' and optionally 'C' and 'colors'.
+    :return: (str) The hash as a hexadecimal string.
+    """
+    contenido = {clave: graph.get(clave, {}) for clave in ('V', 'E', 'C', 'colors')}
+    # The keys are turned into strings first, so a graph in memory (int keys) and its JSON file have the same hash
+    contenido = json.loads(json.dumps(contenido))
+    texto = json.dumps(contenido, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def codificar_movimientos(camino: list, ncols: int):
+    """
+    Encode a route as a run-length encoded string of moves.
+
+    :param camino: (list) The cells of the route, every one next to the previous one.
+    :param ncols: (int) Number of columns of the board.
+    :return: (str) The moves. The count of a run is omitted when it is 1.
+    """
+    tramos = []
+    for a, b in zip(camino, camino[1:]):
+        if b == a + 1:
+            letra = 'R'
+        elif b == a - 1:
+            letra = 'L'
+        elif b == a + ncols:
+            letra = 'D'
+        elif b == a - ncols:
+            letra = 'U'
+        else:
+            raise ValueError(f'The cells {a} and {b} of the route are not neighbours.')
+        if tramos and tramos[-1][0] == letra:
+            tramos[-1][1] += 1
+        else:
+            tramos.append([letra, 1])
+    return ''.join(letra if n == 1 else f'{letra}{n}' for letra, n in tramos)
+
+
+def decodificar_movimientos(inicio: int, movimientos: str, ncols: int):
+    """
+    Decode a run-length encoded string of moves.
+
+    :param inicio: (int) The start cell of the route.
+    :param movimientos: (str) The moves, as returned by codificar_movimientos.
+    :param ncols: (int) Number of columns of the board.
+    :return: (list) The cells of the route.
+    """
+    camino = [inicio]
+    for letra, n in _TRAMO.findall(movimientos):
+        drow, dcol = _DESPLAZAMIENTOS[letra]
+        paso = drow * ncols + dcol
+        for _ in range(int(n or 1)):
+            camino.append(camino[-1] + paso)
+    return camino
+
+
+def pasos(rutas: list, ncols: int):
+    """
+    Decode the routes of a compact solution into the positions of the turtles.
+
+    :param rutas: (list) The routes, as dictionaries with the keys 'inicio' and 'movimientos'.
+    :param ncols: (int) Number of columns of the board.
+    :return: (generator) Tuples (cell, direction) for every cell of every route, with the direction ('u', 'd', 'l'
+             or 'r') towards the next cell. The last cell of a route faces up.
+    """
+    for ruta in rutas:
+        celda = ruta['inicio']
+        for letra, n in _TRAMO.findall(ruta['movimientos']):
+            drow, dcol = _DESPLAZAMIENTOS[letra]
+            for _ in range(int(n or 1)):
+                yield celda, letra.lower()
+                celda += drow * ncols + dcol
+        yield celda, 'u'
+
+
+def como_diccionario(rutas: list, ncols: int):
+    """
+    Convert the routes of a compact solution into the old format of the 'turtle' key ({cell: next cell}, 'f' at the
+    end of every route). Where two routes share a cell, the last one wins, as in the old solution files.
+    """
+    turtle = {}
+    for ruta in rutas:
+        camino = decodificar_movimientos(ruta['inicio'], ruta['movimientos'], ncols)
+        for a, b in zip(camino, camino[1:]):
+            turtle[a] = b
+        turtle[camino[-1]] = 'f'
+    return turtle
+
+
+def solucion(graph: dict, caminos: list, ncols: int, archivo: str, metodo: str = ''):
+    """
+    Build a compact solution.
+
+    :param graph: (dict) The graph of the maze.
+    :param caminos: (list) The route of every turtle as a list of cells.
+    :param ncols: (int) Number of columns of the board.
+    :param archivo: (str) The file of the maze, used to find it when the solution is expanded.
+    :param metodo: (str) The method used to find the routes.
+    :return: (dict) The compact solution, ready to be saved as JSON.
+    """
+    return {
+        'formato': FORMATO,
+        'laberinto': hash_laberinto(graph),
+        'grafo': archivo,
+        'columnas': ncols,
+        'metodo': metodo,
+        'rutas': [{'inicio': camino[0], 'movimientos': codificar_movimientos(camino, ncols)} for camino in caminos],
+    }
+
+
+def es_compacta(data: dict):
+    """
+    Return True if the given JSON data is a compact solution.
+    """
+    return data.get('formato') == FORMATO
+
+
+def expandir(data: dict):
+    """
+    Expand a compact solution into a graph that the Labyrinth can draw: the maze is loaded from its file and its
+    'turtle' key is replaced by the list of routes (see Labyrinth._mark_turtle).
+
+    :param data: (dict) The compact solution.
+    :return: (dict) The graph.
+    """
+    with open(data['grafo'], 'r') as f:
+        graph = json.load(f)
+    if hash_laberinto(graph) != data['laberinto']:
+        raise ValueError(f"The maze in {data['grafo']} does not match the hash of the solution.")
+    graph['turtle'] = data['rutas']
+    return graph
@@ -0,0 +1,438 @@
+"""
+This module records the stream of graphs fed to a Labyrinth and replays it.
+
+A run of the viewer is driven by whatever arrives through the Queue (globales.cola) or the JSON file, and it is gone
+once it has been drawn, so a slow frame cannot be reproduced later. A Grabadora writes every graph drawn by the
+Labyrinth (or any graph given to it) to a file, with the time when it arrived, and a Reproductor reads the file back
+and feeds the same stream to a Labyrinth, to the benchmark or to any function, at the original pace or as fast as
+possible, from any frame.
+
+Most consecutive frames are almost equal, so a frame is stored as a delta against the previous one: for every key of
+the graph that is a dictionary ('V', 'E', 'C', 'turtle', 'colors') only the entries that changed and the keys that were
+removed, for bytes (the wall bits of a packed frame, see cuadros_empaquetados) the XOR with the previous bytes, and any
+other value whole when it changed. Every `intervalo_clave` frames a keyframe stores the whole graph. Every record is
+compressed with zlib:
+
+    cabecera | registro 0 (clave) | registro 1 (delta) | ... | indice | posicion del indice | FIN
+
+where a record is its type, its time and its length (struct '<BdI') followed by its compressed JSON. The index at the
+end lists the frame number, the time and the position in the file of every keyframe, so a frame is found with a
+binary search over the keyframes and at most `intervalo_clave` deltas, in O(log n) with respect to the length of the
+recording. A file without index (the recording did not end) is still read, the index is rebuilt by skipping over the
+records.
+
+The keys of the dictionaries are stored as pairs, so the int keys of a graph in memory and the str keys of a graph
+loaded from JSON are replayed as they were recorded. A snapshot of a Grafo (see Grafo.snapshot) is replayed as a plain
+graph with the same keys.
+
+Usage:
+    with Grabadora('corrida.rec', 15, 20) as grabadora:
+        Labyrinth(15, 20, recorder=grabadora).start()
+
+    reproductor = Reproductor('corrida.rec')
+    laberinto = Labyrinth(reproductor.nrows, reproductor.ncols)
+    reproductor.en_laberinto(laberinto, velocidad=1.0, desde=120)
+    laberinto.start()
+"""
+
+import base64
+import bisect
+import json
+import struct
+import time
+import zlib
+
+from grafo import GrafoSnapshot
+
+MAGICO = b'LABGRAB1'
+FIN = b'FIN!'
+_REGISTRO = struct.Struct('<BdI')  # Type, time in seconds since the first frame and length of the record
+_POSICION = struct.Struct('<Q')  # Position of the index in the file
+CLAVE, DELTA, INDICE = 0, 1, 2
+
+
+def _codificar_bytes(valor: bytes):
+    return base64.b64encode(valor).decode('ascii')
+
+
+def _decodificar_bytes(texto: str):
+    return base64.b64decode(texto)
+
+
+def _copia(graph: dict):
+    """
+    Copy a graph down to the lists of its dictionaries, so the producer can keep changing its graph in place.
+    """
+    copia = {}
+    for nombre, valor in graph.items():
+        if isinstance(valor, dict):
+            valor = {k: list(v) if isinstance(v, list) else v for k, v in valor.items()}
+        elif isinstance(valor, bytearray):
+            valor = bytes(valor)
+        copia[nombre] = valor
+    return copia
+
+
+def _delta(anterior: dict, actual: dict, compartidas: bool = False):
+    """
+    Return the changes from a graph to the next one, as a dictionary that can be serialized as JSON.
+
+    :param anterior: (dict) The previous graph, or an empty dictionary for a keyframe.
+    :param actual: (dict) The current graph.
+    :param compartidas: (bool) If True, a value that is the same object in both graphs did not change (the dictionaries
+                        of two snapshots of a Grafo are only shared while they are equal).
+    :return: (dict) The delta.
+    """
+    delta = {}
+    for nombre, valor in actual.items():
+        previo = anterior.get(nombre)
+        if compartidas and valor is previo:
+            continue
+        if isinstance(valor, dict) and isinstance(previo, dict):
+            cambios = [[k, v] for k, v in valor.items() if k not in previo or previo[k] != v]
+            quitadas = [k for k in previo if k not in valor]
+            if cambios or quitadas:
+                delta.setdefault('cambios', {})[nombre] = cambios
+                if quitadas:
+                    delta.setdefault('quitadas', {})[nombre] = quitadas
+        elif isinstance(valor, dict):
+            delta.setdefault('diccionarios', {})[nombre] = [[k, v] for k, v in valor.items()]
+        elif isinstance(valor, (bytes, bytearray)) and isinstance(previo, (bytes, bytearray)) and len(previo) == len(valor):
+            if valor != previo:
+                xor = (int.from_bytes(valor, 'big') ^ int.from_bytes(previo, 'big')).to_bytes(len(valor), 'big')
+                delta.setdefault('xor', {})[nombre] = _codificar_bytes(xor)
+        elif isinstance(valor, (bytes, bytearray)):
+            delta.setdefault('bytes', {})[nombre] = _codificar_bytes(valor)
+        elif nombre not in anterior or previo != valor:
+            delta.setdefault('valores', {})[nombre] = valor
+    borradas = [nombre for nombre in anterior if nombre not in actual]
+    if borradas:
+        delta['borradas'] = borradas
+    return delta
+
+
+def _aplicar(anterior: dict, delta: dict):
+    """
+    Apply a delta to a graph. The previous graph is not modified, the dictionaries that change are copied.
+
+    :return: (dict) The next graph.
+    """
+    actual = dict(anterior)
+    for nombre in delta.get('borradas', ()):
+        del actual[nombre]
+    for nombre, pares in delta.get('diccionarios', {}).items():
+        actual[nombre] = {k: v for k, v in pares}
+    quitadas = delta.get('quitadas', {})
+    for nombre, pares in delta.get('cambios', {}).items():
+        valor = dict(actual[nombre])
+        for k in quitadas.get(nombre, ()):
+            del valor[k]
+        valor.update((k, v) for k, v in pares)
+        actual[nombre] = valor
+    for nombre, texto in delta.get('bytes', {}).items():
+        actual[nombre] = _decodificar_bytes(texto)
+    for nombre, texto in delta.get('xor', {}).items():
+        previo, xor = actual[nombre], _decodificar_bytes(texto)
+        actual[nombre] = (int.from_bytes(previo, 'big') ^ int.from_bytes(xor, 'big')).to_bytes(len(previo), 'big')
+    actual.update(delta.get('valores', {}))
+    return actual
+
+
+class Grabadora:
+    """
+    Recorder of a stream of graphs.
+
+    Attributes:
+    ----------
+    ruta : str
+        The path of the recording.
+    nrows : int
+        Number of rows of the board.
+    ncols : int
+        Number of columns of the board.
+    intervalo_clave : int
+        A keyframe is stored every `intervalo_clave` frames.
+    n_cuadros : int
+        Number of frames recorded.
+    """
+
+    def __init__(self, ruta: str, nrows: int, ncols: int, intervalo_clave: int = 64, nivel: int = 6):
+        """
+        Open a recording. An existing file is replaced.
+
+        :param ruta: (str) The path of the recording.
+        :param nrows: (int) Number of rows of the board.
+        :param ncols: (int) Number of columns of the board.
+        :param intervalo_clave: (int) Number of frames between two keyframes.
+        :param nivel: (int) Compression level of zlib, from 1 (fastest) to 9 (smallest).
+        """
+        if intervalo_clave < 1:
+            raise ValueError('The interval between keyframes must be at least 1.')
+        self.ruta, self.nrows, self.ncols = ruta, nrows, ncols
+        self.intervalo_clave, self.nivel = intervalo_clave, nivel
+        self.n_cuadros = 0
+        self._claves = []  # [frame, time, position] of every keyframe
+        self._anterior = {}
+        self._inicio = None
+        self._archivo = open(ruta, 'wb')
+        cabecera = json.dumps({'filas': nrows, 'columnas': ncols, 'intervalo_clave': intervalo_clave}).encode()
+        self._archivo.write(MAGICO + struct.pack('<I', len(cabecera)) + cabecera)
+
+    def registrar(self, graph, instante: float = None):
+        """
+        Record a frame.
+
+        :param graph: (dict | GrafoSnapshot) The graph or the packed frame, as it is drawn by the Labyrinth.
+        :param instante: (float) The time of the frame in seconds (time.perf_counter). Default is now.
+        :return: None
+        """
+        if self._archivo is None:
+            raise ValueError('The recording is closed.')
+        instante = time.perf_counter() if instante is None else instante
+        if self._inicio is None:
+            self._inicio = instante
+        t = instante - self._inicio
+        compartidas = isinstance(graph, GrafoSnapshot)
+        # A snapshot does not change, any other graph is copied because it can be changed in place after it is drawn
+        graph = dict(graph) if compartidas else _copia(graph)
+        if self.n_cuadros % self.intervalo_clave == 0:
+            self._claves.append([self.n_cuadros, t, self._archivo.tell()])
+            self._escribir(CLAVE, t, _delta({}, graph))
+        else:
+            self._escribir(DELTA, t, _delta(self._anterior, graph, compartidas))
+        self._anterior = graph
+        self.n_cuadros += 1
+
+    def _escribir(self, tipo: int, t: float, contenido):
+        datos = zlib.compress(json.dumps(contenido, separators=(',', ':')).encode(), self.nivel)
+        self._archivo.write(_REGISTRO.pack(tipo, t, len(datos)) + datos)
+
+    def cerrar(self):
+        """
+        Write the index of the keyframes and close the file. Closing twice does nothing.
+        """
+        if self._archivo is None:
+            return
+        posicion = self._archivo.tell()
+        self._escribir(INDICE, 0.0, {'n_cuadros': self.n_cuadros, 'claves': self._claves})
+        self._archivo.write(_POSICION.pack(posicion) + FIN)
+        self._archivo.close()
+        self._archivo = None
+        self._anterior = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+class Reproductor:
+    """
+    Replayer of a recording made with a Grabadora.
+
+    Attributes:
+    ----------
+    ruta : str
+        The path of the recording.
+    nrows : int
+        Number of rows of the board.
+    ncols : int
+        Number of columns of the board.
+    n_cuadros : int
+        Number of frames of the recording.
+    """
+
+    def __init__(self, ruta: str):
+        """
+        Open a recording and read its index (or rebuild it, if the recording did not end).
+
+        :param ruta: (str) The path of the recording.
+        """
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            self._datos = f.read()
+        if self._datos[:len(MAGICO)] != MAGICO:
+            raise ValueError(f'{ruta} is not a recording of graphs.')
+        largo, = struct.unpack_from('<I', self._datos, len(MAGICO))
+        self._primer_registro = len(MAGICO) + 4 + largo
+        cabecera = json.loads(self._datos[len(MAGICO) + 4:self._primer_registro])
+        self.nrows, self.ncols = cabecera['filas'], cabecera['columnas']
+        self._leer_indice()
+        self._cuadros = [c for c, _, _ in self._claves]
+        self._tiempos = [t for _, t, _ in self._claves]
+
+    def _leer_indice(self):
+        final = len(self._datos) - len(FIN)
+        if self._datos[final:] == FIN:
+            posicion, = _POSICION.unpack_from(self._datos, final - _POSICION.size)
+            indice = self._leer(posicion)[2]
+            self.n_cuadros = indice['n_cuadros']
+            self._claves = indice['claves']
+            return
+        # Without index: walk over the records without decompressing the deltas
+        self.n_cuadros, self._claves = 0, []
+        posicion = self._primer_registro
+        while posicion + _REGISTRO.size <= len(self._datos):
+            tipo, t, largo = _REGISTRO.unpack_from(self._datos, posicion)
+            siguiente = posicion + _REGISTRO.size + largo
+            if tipo == INDICE or siguiente > len(self._datos):  # A record cut by the end of the run is dropped
+                break
+            if tipo == CLAVE:
+                self._claves.append([self.n_cuadros, t, posicion])
+            self.n_cuadros += 1
+            posicion = siguiente
+
+    def _leer(self, posicion: int):
+        """
+        Read the record at a position of the file.
+
+        :return: (tuple) The type, the time, the content and the position of the next record.
+        """
+        tipo, t, largo = _REGISTRO.unpack_from(self._datos, posicion)
+        inicio = posicion + _REGISTRO.size
+        contenido = json.loads(zlib.decompress(self._datos[inicio:inicio + largo]))
+        return tipo, t, contenido, inicio + largo
+
+    def __len__(self):
+        return self.n_cuadros
+
+    def duracion(self):
+        """
+        Return the time of the last frame in seconds, relative to the first one.
+        """
+        if not self.n_cuadros:
+            return 0.0
+        return next(self._recorrer(self.n_cuadros - 1, solo_tiempos=True))[0]
+
+    def _recorrer(self, desde: int, solo_tiempos: bool = False):
+        """
+        Walk over the frames from the frame `desde`: a binary search finds the keyframe before it, and the deltas
+        between the keyframe and the frame are applied.
+
+        :param desde: (int) The first frame.
+        :param solo_tiempos: (bool) If True, only the times are read, and the frames are None.
+        :return: (generator) Tuples (time, graph).
+        """
+        if not 0 <= desde < self.n_cuadros:
+            raise IndexError(f'The recording has {self.n_cuadros} frames, there is no frame {desde}.')
+        k = bisect.bisect_right(self._cuadros, desde) - 1
+        cuadro, _, posicion = self._claves[k]
+        graph = {}
+        while cuadro < self.n_cuadros:
+            if solo_tiempos:  # Only the header of the record is read, the delta is skipped
+                _, t, largo = _REGISTRO.unpack_from(self._datos, posicion)
+                posicion += _REGISTRO.size + largo
+            else:
+                tipo, t, delta, posicion = self._leer(posicion)
+                graph = _aplicar({} if tipo == CLAVE else graph, delta)
+            if cuadro >= desde:
+                yield t, None if solo_tiempos else graph
+            cuadro += 1
+
+    def cuadro(self, k: int):
+        """
+        Return the frame number k of the recording.
+
+        :param k: (int) The frame, from 0. Negative numbers count from the end, as in a list.
+        :return: (dict) The graph.
+        """
+        if k < 0:
+            k += self.n_cuadros
+        return next(self._recorrer(k))[1]
+
+    def buscar(self, t: float):
+        """
+        Return the number of the last frame that arrived at or before a time.
+
+        :param t: (float) Seconds from the first frame.
+        :return: (int) The frame, 0 if t is before the first frame.
+        """
+        k = max(bisect.bisect_right(self._tiempos, t) - 1, 0)
+        cuadro = self._cuadros[k]
+        for actual, (instante, _) in enumerate(self._recorrer(cuadro, solo_tiempos=True), start=cuadro):
+            if instante > t:
+                return max(actual - 1, 0)
+        return self.n_cuadros - 1
+
+    def cuadros(self, desde: int = 0, hasta: int = None):
+        """
+        Iterate over the frames of the recording.
+
+        :param desde: (int) The first frame.
+        :param hasta: (int) The frame where the iteration stops (not included). Default is the end of the recording.
+        :return: (generator) Tuples (time, graph), with the time in seconds from the first frame of the recording.
+        """
+        hasta = self.n_cuadros if hasta is None else min(hasta, self.n_cuadros)
+        if desde >= hasta:
+            return
+        for k, (t, graph) in enumerate(self._recorrer(desde), start=desde):
+            if k >= hasta:
+                return
+            yield t, graph
+
+    def reproducir(self, aplicar, velocidad: float = 1.0, desde: int = 0, hasta: int = None):
+        """
+        Feed the frames to a function, keeping the pace of the recording.
+
+        :param aplicar: (callable) Function called with every graph, for example LabyrinthMedido.apply_frame of the
+                        benchmark or Labyrinth.apply_graph.
+        :param velocidad: (float) 1.0 keeps the original pace, 2.0 replays twice as fast. None replays as fast as
+                          possible.
+        :param desde: (int) The first frame.
+        :param hasta: (int) The frame where the replay stops (not included). Default is the end of the recording.
+        :return: (dict) The report: frames applied, seconds, and the maximum delay of a frame behind its time.
+        """
+        aplicados, retraso_maximo = 0, 0.0
+        inicio = time.perf_counter()
+        origen = None
+        for t, graph in self.cuadros(desde, hasta):
+            if origen is None:
+                origen = t
+            if velocidad:
+                objetivo = inicio + (t - origen) / velocidad
+                espera = objetivo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                else:
+                    retraso_maximo = max(retraso_maximo, -espera)
+            aplicar(graph)
+            aplicados += 1
+        return {'cuadros': aplicados, 'segundos': time.perf_counter() - inicio, 'retraso_maximo': retraso_maximo}
+
+    def en_laberinto(self, laberinto, velocidad: float = 1.0, desde: int = 0, hasta: int = None):
+        """
+        Schedule the frames on the event loop of a Labyrinth, so they are drawn while the window runs (start). The
+        frames are drawn directly, not through the Queue of the Labyrinth.
+
+        :param laberinto: (Labyrinth) The viewer, of the size of the recording.
+        :param velocidad: (float) 1.0 keeps the original pace, 2.0 replays twice as fast. None draws a frame on every
+                          turn of the event loop.
+        :param desde: (int) The first frame.
+        :param hasta: (int) The frame where the replay stops (not included). Default is the end of the recording.
+        :return: None
+        """
+        if (laberinto.rows, laberinto.columns) != (self.nrows, self.ncols):
+            raise ValueError(f'The recording is {self.nrows}x{self.ncols}, '
+                             f'the labyrinth is {laberinto.rows}x{laberinto.columns}.')
+        flujo = self.cuadros(desde, hasta)
+        inicio, origen = None, None
+
+        def siguiente():
+            nonlocal inicio, origen
+            cuadro = next(flujo, None)
+            if cuadro is None:
+                return
+            t, graph = cuadro
+            if inicio is None:
+                inicio, origen = time.perf_counter(), t
+            espera = 0
+            if velocidad:
+                espera = max(int(((t - origen) / velocidad - (time.perf_counter() - inicio)) * 1000), 0)
+            laberinto.window.after(espera, dibujar, graph)
+
+        def dibujar(graph):
+            laberinto.apply_graph(graph)
+            laberinto.window.after(0, siguiente)  # The canvas is flushed before the next frame is read
+
+        laberinto.window.after(0, siguiente)
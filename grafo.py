@@ -4,12 +4,25 @@ This module defines the Grafo class which represents a graph, specifically a lab
 The Grafo class includes methods for initializing the graph, representing the graph as a string, getting the graph,
 sending the graph to a Queue, saving the graph as a JSON file, and adding an edge to the graph.
 
-The graph is represented as a dictionary with three keys: 'V', 'E', and 'turtle'. 'V' maps to a dictionary where each
-key is a vertex and the value is a list of vertices adjacent to the key. 'E' maps to a dictionary where each key is a
-tuple of two vertices and the value is the weight of the edge between the vertices. 'turtle' maps to a dictionary where
+The graph is represented as a dictionary with the keys 'V', 'E', 'C', 'turtle' and 'colors'. 'V' maps to a dictionary
+where each key is a vertex and the value is a list of vertices adjacent to the key. 'E' maps to a dictionary where each
+key is a tuple of two vertices and the value is the wall flag of the edge between the vertices (0 if there is a wall, 1
+if there is not). 'C' maps to a dictionary with the traversal cost of the edges that are slower than the default cost
+of 1, with the same keys as 'E'. 'turtle' maps to a dictionary where
 each key is a vertex and the value is the vertex that the turtle is facing towards. If the value is 'f', it means the
 turtle is in the last node.
 
+Besides the dictionaries, a Grafo keeps an index of its edges by integer ids (see _EdgeIndex), built on the first
+query. The queries has_wall, open_neighbors, degree and open_edges use the index, so they never format or parse the
+string keys of E.
+
+A Grafo can take read-only snapshots of itself in O(1) (see snapshot): the wall flags are stored in pages shared
+copy-on-write between the graph and its snapshots, so send_graph no longer deep-copies the graph for every frame and a
+history of snapshots only costs memory for what changed.
+
+Large graphs are built with add_edges, which adds arrays of edges with vectorized validation and deduplication, or with
+the grid constructor, which builds a full grid with its walls at once.
+
 The main function of this module creates a graph with a specific adjacency list of vertices and weighted edges, and a
 specific list of vertices to show a turtle and the turtle's goal. It then saves the graph as a JSON file.
 
@@ -21,9 +34,191 @@ German A Holguin L.
 UTP - Pereira, Colombia 2024.
 """
 
+import gc
 import json
+from array import array
+from collections.abc import Mapping
+from itertools import compress
 from globales import cola, candado
-from copy import deepcopy
+import instrumentacion
+
+
+PAGE_BITS = 10  # The wall flags are stored in pages of 2 ** PAGE_BITS edges
+PAGE_SIZE = 1 << PAGE_BITS
+_PAGE_MASK = PAGE_SIZE - 1
+
+
+class _PagedFlags:
+    """
+    Wall flags stored in fixed-size pages, shared copy-on-write with the snapshots.
+
+    freeze hands the current list of pages to a snapshot in O(1). The next write copies the list of pages (one
+    reference per page) and the page it changes; the following writes to that page are in place. So a snapshot only
+    costs the pages written after it.
+
+    Attributes:
+    ----------
+    pages : list
+        The pages, bytearrays of PAGE_SIZE flags (the last one can be shorter).
+    length : int
+        The number of flags.
+    """
+
+    __slots__ = ('pages', 'length', '_frozen', '_owned')
+
+    def __init__(self, data: bytes = b''):
+        self.pages = [bytearray(data[start:start + PAGE_SIZE]) for start in range(0, len(data), PAGE_SIZE)]
+        self.length = len(data)
+        self._frozen = False  # The list of pages is shared with a snapshot
+        self._owned = None  # Pages copied since the last snapshot (None while there is no snapshot)
+
+    def freeze(self):
+        """
+        Share the current pages with a snapshot.
+
+        :return: (tuple) The list of pages and the number of flags. Neither is modified afterwards.
+        """
+        self._frozen = True
+        self._owned = set()
+        return self.pages, self.length
+
+    def _writable(self, page: int):
+        # Return a page that can be modified, copying it (and the list of pages) if a snapshot shares it
+        if self._frozen:
+            self.pages = list(self.pages)
+            self._frozen = False
+        if self._owned is not None and page not in self._owned:
+            self.pages[page] = bytearray(self.pages[page])
+            self._owned.add(page)
+        return self.pages[page]
+
+    def __getitem__(self, k: int):
+        return self.pages[k >> PAGE_BITS][k & _PAGE_MASK]
+
+    def __setitem__(self, k: int, value: int):
+        if not 0 <= k < self.length:
+            raise IndexError('flag index out of range')
+        self._writable(k >> PAGE_BITS)[k & _PAGE_MASK] = value
+
+    def append(self, value: int):
+        if self.length & _PAGE_MASK == 0:
+            if self._frozen:
+                self.pages = list(self.pages)
+                self._frozen = False
+            self.pages.append(bytearray())
+            if self._owned is not None:
+                self._owned.add(len(self.pages) - 1)
+        self._writable(len(self.pages) - 1).append(value)
+        self.length += 1
+
+    def extend(self, data: bytes):
+        start = 0
+        while start < len(data):
+            if self.length & _PAGE_MASK == 0:
+                self.append(data[start])
+                start += 1
+                continue
+            free = PAGE_SIZE - (self.length & _PAGE_MASK)
+            self._writable(len(self.pages) - 1).extend(data[start:start + free])
+            self.length += min(free, len(data) - start)
+            start += free
+
+    def __len__(self):
+        return self.length
+
+    def tobytes(self):
+        """
+        Return all the flags as bytes.
+        """
+        return b''.join(self.pages)
+
+
+class _EdgeIndex:
+    """
+    Index of the edges of a graph by integer ids.
+
+    Every edge of E gets an id, in the order of E. The index keeps, for every id, the two vertices of the edge (the
+    order of its key in E), its key in E and its wall flag, and for every vertex the list of its edges.
+
+    Only the wall flags change once an edge is in the index; everything else is only appended to. So a snapshot shares
+    the index and only remembers how many edges it had (see GrafoSnapshot).
+
+    Attributes:
+    ----------
+    src : array
+        The first vertex of every edge.
+    dst : array
+        The second vertex of every edge.
+    keys : list
+        The key in E of every edge.
+    flags : _PagedFlags
+        The wall flag of every edge: 0 if there is a wall, 1 if there is not.
+    ids : dict
+        The id of every edge, by the pair (lower vertex, higher vertex).
+    incident : dict
+        For every vertex, the list of its edges as tuples (neighbour, id).
+    """
+
+    def __init__(self, E: dict, src: list = None, dst: list = None):
+        """
+        Build the index, parsing every key of E once.
+
+        :param E: (dict) The edges of the graph.
+        :param src: (list) The first vertex of every edge of E, in order, if they are already known (then the keys
+                    are not parsed).
+        :param dst: (list) The second vertex of every edge of E, in order, if they are already known.
+        """
+        self.keys = list(E)
+        self.flags = _PagedFlags(bytes(1 if E[key] != 0 else 0 for key in self.keys))
+        if src is None:
+            src, dst = [], []
+            for key in self.keys:
+                vertex_o, vertex_i = key[1:-1].split(', ')
+                src.append(int(vertex_o))
+                dst.append(int(vertex_i))
+        self.src, self.dst = array('q', src), array('q', dst)
+        self.ids = {(vertex_o, vertex_i) if vertex_o < vertex_i else (vertex_i, vertex_o): edge_id
+                    for edge_id, (vertex_o, vertex_i) in enumerate(zip(src, dst))}
+        self.incident = {}
+        for edge_id, (vertex_o, vertex_i) in enumerate(zip(src, dst)):
+            self._incide(edge_id, vertex_o, vertex_i)
+
+    def _incide(self, edge_id: int, vertex_o: int, vertex_i: int):
+        incident = self.incident
+        if vertex_o in incident:
+            incident[vertex_o].append((vertex_i, edge_id))
+        else:
+            incident[vertex_o] = [(vertex_i, edge_id)]
+        if vertex_i in incident:
+            incident[vertex_i].append((vertex_o, edge_id))
+        else:
+            incident[vertex_i] = [(vertex_o, edge_id)]
+
+    def append(self, key: str, vertex_o: int, vertex_i: int, weight):
+        """
+        Add a new edge at the end of the index.
+        """
+        edge_id = len(self.keys)
+        self.keys.append(key)
+        self.flags.append(1 if weight != 0 else 0)
+        self.src.append(vertex_o)
+        self.dst.append(vertex_i)
+        self.ids[(vertex_o, vertex_i) if vertex_o < vertex_i else (vertex_i, vertex_o)] = edge_id
+        self._incide(edge_id, vertex_o, vertex_i)
+
+    def extend(self, keys: list, src: list, dst: list, weights: list):
+        """
+        Add several new edges at the end of the index.
+        """
+        first = len(self.keys)
+        self.keys.extend(keys)
+        self.flags.extend(bytes(1 if weight != 0 else 0 for weight in weights))
+        self.src.extend(src)
+        self.dst.extend(dst)
+        self.ids.update(((vertex_o, vertex_i) if vertex_o < vertex_i else (vertex_i, vertex_o), edge_id)
+                        for edge_id, (vertex_o, vertex_i) in enumerate(zip(src, dst), first))
+        for edge_id, (vertex_o, vertex_i) in enumerate(zip(src, dst), first):
+            self._incide(edge_id, vertex_o, vertex_i)
 
 
 class Grafo:
@@ -39,6 +234,10 @@ class Grafo:
         The vertices of the graph. Each key is a vertex and the value is a list of vertices adjacent to the key.
     E : dict
         The edges of the graph. Each key is a tuple of two vertices and the value is the weight of the edge between the vertices.
+        A weight of 0 means there is a wall between the vertices, a weight of 1 means there is not.
+    C : dict
+        The traversal costs of the edges. Each key is an edge of E and the value is the cost of moving along the edge.
+        Only the edges with a cost different from the default cost of 1 are stored.
     turtle : dict
         The turtle's position and direction. Each key is a vertex and the value is the vertex that the turtle is facing towards.
         If the value is 'f', it means the turtle is in the last node and facing up.
@@ -47,21 +246,47 @@ class Grafo:
 
     Methods:
     -------
-    __init__(self, V: dict = None, E: dict = None, turtle: dict = None, colors: dict = None):
-        Initializes the graph with the given vertices, edges, and the turtle's position.
+    __init__(self, V: dict = None, E: dict = None, turtle: dict = None, colors: dict = None, C: dict = None):
+        Initializes the graph with the given vertices, edges, costs and the turtle's position.
     __repr__(self):
         Returns the graph as a string.
     get_graph(self):
         Returns the graph as a dictionary.
     send_graph(self):
-        Gets the graph and puts it into the global queue 'cola'.
+        Puts a snapshot of the graph into the global queue 'cola'.
     save_graph(self, path: str):
         Gets the graph and saves it as a JSON file at the specified path.
-    add_edge(self, vertex_o: int, vertex_i: int, weight: int):
+    add_edge(self, vertex_o: int, vertex_i: int, weight: int, cost: int = 1):
         Adds an edge between two vertices in the graph.
+    add_edges(self, src, dst, weights=1, costs=None):
+        Adds several edges at once, with vectorized validation and deduplication.
+    grid(cls, rows: int, columns: int, walls=None, costs=None):
+        Builds the graph of a full grid.
+    grid_edges(rows: int, columns: int):
+        Returns the edges of a grid as two integer arrays.
+    set_cost(self, vertex_o: int, vertex_i: int, cost: int):
+        Sets the traversal cost of an existing edge.
+    get_cost(self, vertex_o: int, vertex_i: int):
+        Returns the traversal cost of an edge.
+    from_graph(cls, graph: dict):
+        Builds a Grafo from a graph dictionary, as returned by get_graph or loaded from a JSON file.
+    has_wall(self, vertex_o: int, vertex_i: int):
+        Returns True if there is a wall between two vertices.
+    set_wall(self, vertex_o: int, vertex_i: int, wall: bool):
+        Sets the wall flag of an existing edge.
+    open_neighbors(self, vertex: int):
+        Returns the vertices joined to a vertex by an edge without a wall.
+    degree(self, vertex: int):
+        Returns the number of edges without a wall of a vertex.
+    open_edges(self):
+        Returns the edges without a wall as two integer arrays.
+    edge_arrays(self):
+        Returns every edge as two integer arrays and its wall flags.
+    snapshot(self):
+        Takes a read-only copy-on-write snapshot of the graph in O(1).
     """
 
-    def __init__(self, V: dict = None, E: dict = None, turtle: dict = None, colors: dict = None):
+    def __init__(self, V: dict = None, E: dict = None, turtle: dict = None, colors: dict = None, C: dict = None):
         """
         Initialize the graph with the vertices, edges, and the turtle's position.
 
@@ -76,6 +301,8 @@ class Grafo:
                     the turtle is facing towards. If the value is 'f', it means the turtle is in the last node and
                     facing up. Default is an empty dictionary.
         :param colors: (dict) The colors of the vertices. Each key is a vertex and the value is the color of the vertex.
+        :param C: (dict) The traversal costs of the edges slower than the default cost of 1. Each key is an edge of E
+                    and the value is its cost. Default is an empty dictionary.
         :return: None
         """
         if V is None:
@@ -90,12 +317,18 @@ class Grafo:
         if colors is None:
             colors = dict()
         self.colors = colors
+        if C is None:
+            C = dict()
+        self.C = C
+        self._index = None  # Index of the edges by id, built on the first query
+        self._shared = False  # V and C are shared with a snapshot and must be copied before they change
+        self._index_hint = None  # The vertices of the edges of E, in order, if add_edges built E from empty
 
     def __repr__(self):
         """
         Return the graph as a string
         """
-        return f'Vertices: {self.V}\nEdges: {self.E}\nTurtle: {self.turtle}\nColors: {self.colors}'
+        return f'Vertices: {self.V}\nEdges: {self.E}\nCosts: {self.C}\nTurtle: {self.turtle}\nColors: {self.colors}'
 
     def get_graph(self):
         """
@@ -105,26 +338,28 @@ class Grafo:
         position and direction in the graph.
 
         :return: (dict) The graph. It includes 'V' followed by the vertices of the graph, 'E' followed by the edges of the
-                 graph, and 'turtle' followed by the turtle's position and direction.
+                 graph, 'C' followed by the traversal costs of the edges, 'turtle' followed by the turtle's position and
+                 direction, and 'colors' followed by the colors of the vertices.
         """
-        grafo_g = {'V': self.V, 'E': self.E, 'turtle': self.turtle, 'colors': self.colors}
+        grafo_g = {'V': self.V, 'E': self.E, 'C': self.C, 'turtle': self.turtle, 'colors': self.colors}
         return grafo_g
 
     def send_graph(self):
         """
         Send the graph to the Queue.
 
-        This method gets the graph and puts it into the global queue 'cola'. This can be used to share the graph between
-        different parts of the program or with different threads.
+        This method takes a snapshot of the graph and puts it into the global queue 'cola'. This can be used to share the
+        graph between different parts of the program or with different threads.
 
         :return: None
         """
-        grafo_g = self.get_graph()
         with candado:
             # Put the graph into the global queue 'cola'
-            # The deepcopy function is used to avoid
-            # the Queue storing a reference to the graph to the original graph
-            cola.put(deepcopy(grafo_g))
+            # The snapshot keeps the graph as it is now while the producer goes on changing it, without the deep copy
+            # of the whole graph that was needed before (see snapshot)
+            cola.put(self.snapshot())
+        if instrumentacion.activo:
+            instrumentacion.registrar('profundidad_cola', cola.qsize())
 
     def save_graph(self, path: str):
         """
@@ -141,8 +376,9 @@ class Grafo:
             json.dump(grafo_g, file_graph, indent=4)
         # Close the file_graph
         file_graph.close()
+        instrumentacion.bytes_archivo('bytes_escritos', path)
 
-    def add_edge(self, vertex_o: int, vertex_i: int, weight: int):
+    def add_edge(self, vertex_o: int, vertex_i: int, weight: int, cost: int = 1):
         """
         This method adds an edge between two vertices in the graph. If the edge already exists, it prints a message and
         does not add the edge. If the vertices do not exist in the graph, it adds them. The edge is represented as a
@@ -152,6 +388,7 @@ class Grafo:
         :param vertex_i: (int) The destination vertex of the edge.
         :param weight: (int) The weight of the edge. If the weight is 0, there is no path between the nodes
                        (a wall exists), if the weight is 1, there is a path between the nodes (a wall does not exist).
+        :param cost: (int) The traversal cost of the edge, a positive integer. Default is 1.
         :return: None
         """
         # Verify if the edge already exists
@@ -159,6 +396,7 @@ class Grafo:
             if __name__ == '__main__':
                 print(f"The edge ({vertex_o}, {vertex_i}) already exists.")
         else:
+            self._unshare()
             # Verify if vertices exist or add them if they are not in the graph
             if vertex_o not in self.V:
                 self.V[vertex_o] = [vertex_i]
@@ -169,7 +407,446 @@ class Grafo:
             else:
                 self.V[vertex_i].append(vertex_o)
             # Add the edge to the graph
-            self.E[f"({vertex_o}, {vertex_i})"] = weight
+            key = f"({vertex_o}, {vertex_i})"
+            self.E[key] = weight
+            if self._index is not None:
+                self._index.append(key, vertex_o, vertex_i, weight)
+            elif self._index_hint is not None:
+                self._index_hint[0].append(vertex_o)
+                self._index_hint[1].append(vertex_i)
+            if cost != 1:
+                self.C[f"({vertex_o}, {vertex_i})"] = cost
+
+    def add_edges(self, src, dst, weights=1, costs=None):
+        """
+        Add several edges at once. The result is the same as calling add_edge for every edge in order: an edge that
+        already exists in the graph, or that appears earlier in the same call, is skipped, and the vertices and their
+        neighbours are added in the same order. The validation and the deduplication are vectorized, so only the keys
+        of E and the lists of V are built in Python.
+
+        :param src: (array-like) The origin vertex of every edge.
+        :param dst: (array-like) The destination vertex of every edge.
+        :param weights: (int | array-like) The weight (wall flag) of every edge, or one weight for all of them: 0 if
+                        there is a wall between the vertices, 1 if there is not. Default is 1.
+        :param costs: (int | array-like) The traversal cost of every edge, or one cost for all of them, positive
+                      integers. Default is 1.
+        :return: (int) The number of edges added.
+        """
+        import numpy as np  # NumPy is only loaded to add edges in bulk
+
+        src = np.asarray(src, dtype=np.int64).ravel()
+        dst = np.asarray(dst, dtype=np.int64).ravel()
+        if src.shape != dst.shape:
+            raise ValueError('The origin and destination arrays of the edges must have the same length.')
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.int64), src.shape)
+        costs = np.broadcast_to(np.asarray(1 if costs is None else costs, dtype=np.int64), src.shape)
+        if src.size and (src == dst).any():
+            raise ValueError('An edge cannot join a vertex with itself.')
+        if src.size and (src.min() < 0 or dst.min() < 0):
+            raise ValueError('The vertices must be non-negative integers.')
+        if (costs < 1).any():
+            raise ValueError('The traversal cost of an edge must be a positive integer.')
+
+        # Deduplicate by the unordered pair of vertices: the first occurrence in the call wins
+        low, high = np.minimum(src, dst), np.maximum(src, dst)
+        codes = low * (int(high.max(initial=0)) + 1) + high
+        _, first = np.unique(codes, return_index=True)
+        keep = np.zeros(src.size, dtype=bool)
+        keep[first] = True
+        # The edges that already exist in the graph are skipped
+        if self.E:
+            old_src, old_dst = self._endpoints()
+            old_src, old_dst = np.array(old_src, dtype=np.int64), np.array(old_dst, dtype=np.int64)
+            base = int(max(high.max(initial=0), old_src.max(initial=0), old_dst.max(initial=0))) + 1
+            codes = low * base + high
+            keep &= ~np.isin(codes, np.minimum(old_src, old_dst) * base + np.maximum(old_src, old_dst))
+        src, dst, weights, costs = src[keep], dst[keep], weights[keep], costs[keep]
+        if not src.size:
+            return 0
+
+        # The build creates millions of small lists and strings without cycles, so the cyclic garbage collector is
+        # paused instead of letting it scan them over and over
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return self._add_edges(src, dst, weights, costs)
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _add_edges(self, src, dst, weights, costs):
+        import numpy as np
+
+        self._unshare()
+        src_l, dst_l = src.tolist(), dst.tolist()
+        keys = [f"({vertex_o}, {vertex_i})" for vertex_o, vertex_i in zip(src_l, dst_l)]
+        empty = not self.E
+        self.E.update(zip(keys, weights.tolist()))
+        slow = np.flatnonzero(costs != 1).tolist()
+        self.C.update((keys[k], int(costs[k])) for k in slow)
+
+        # The neighbours of every vertex in the order of the edges, grouped with a stable sort, and the vertices in the
+        # order of their first appearance
+        ends = np.column_stack((src, dst)).ravel()
+        others = np.column_stack((dst, src)).ravel()
+        order = np.argsort(ends, kind='stable')
+        vertices, starts = np.unique(ends[order], return_index=True)
+        _, first = np.unique(ends, return_index=True)
+        neighbors = others[order].tolist()
+        bounds = starts.tolist() + [ends.size]
+        groups = {vertex: neighbors[bounds[n]:bounds[n + 1]] for n, vertex in enumerate(vertices.tolist())}
+        for vertex in vertices[np.argsort(first, kind='stable')].tolist():
+            if vertex in self.V:
+                self.V[vertex].extend(groups[vertex])
+            else:
+                self.V[vertex] = groups[vertex]
+
+        if empty:
+            # The vertices of the edges are known, so the index can be built later without parsing the keys
+            self._index_hint = (src_l, dst_l)
+        elif self._index is not None:
+            self._index.extend(keys, src_l, dst_l, weights.tolist())
+        elif self._index_hint is not None:
+            self._index_hint[0].extend(src_l)
+            self._index_hint[1].extend(dst_l)
+        return len(keys)
+
+    def _endpoints(self):
+        # The vertices of every edge of E, in order, without building the index if add_edges already knows them
+        hint = self._index_hint
+        if self._index is None and hint is not None and len(hint[0]) == len(self.E):
+            return hint
+        index = self.index()
+        return index.src, index.dst
+
+    @staticmethod
+    def grid_edges(rows: int, columns: int):
+        """
+        Return the edges of a grid of rows x columns vertices (numbered row by row) in the order used by the generators
+        of the project: vertex by vertex, first the edge to the right and then the edge below.
+
+        :param rows: (int) Number of rows of the grid.
+        :param columns: (int) Number of columns of the grid.
+        :return: (tuple) Two numpy arrays with the lower and the higher vertex of every edge.
+        """
+        import numpy as np
+
+        cells = np.arange(rows * columns, dtype=np.int64).reshape(rows, columns)
+        right, down = cells[:, :-1].ravel(), cells[:-1, :].ravel()
+        src = np.concatenate((right, down))
+        dst = np.concatenate((right + 1, down + columns))
+        order = np.argsort(src * 2 + (np.arange(src.size) >= right.size), kind='stable')
+        return src[order], dst[order]
+
+    @classmethod
+    def grid(cls, rows: int, columns: int, walls=None, costs=None):
+        """
+        Build the graph of a full grid of rows x columns vertices, with its edges in the order of grid_edges.
+
+        :param rows: (int) Number of rows of the grid.
+        :param columns: (int) Number of columns of the grid.
+        :param walls: The walls of the grid, either as a collection of pairs of vertices (in any order), or as one
+                      flag per edge in the order of grid_edges (True or 1 if there is a wall). Default is no walls.
+        :param costs: (int | array-like) The traversal cost of every edge in the order of grid_edges, or one cost for
+                      all of them. Default is 1.
+        :return: (Grafo) The graph.
+        """
+        import numpy as np
+
+        src, dst = cls.grid_edges(rows, columns)
+        weights = np.ones(src.size, dtype=np.int64)
+        if walls is not None:
+            walls = np.asarray(list(walls) if isinstance(walls, (set, frozenset)) else walls, dtype=np.int64)
+            if not walls.size:
+                pass
+            elif walls.ndim == 2 and walls.shape[1] == 2:
+                total = rows * columns
+                pairs = np.minimum(walls[:, 0], walls[:, 1]) * total + np.maximum(walls[:, 0], walls[:, 1])
+                weights[np.isin(src * total + dst, pairs)] = 0
+            elif walls.shape == src.shape:
+                weights[walls != 0] = 0
+            else:
+                raise ValueError('The walls must be pairs of vertices or one flag per edge of the grid.')
+        grafo = cls()
+        grafo.add_edges(src, dst, weights, costs)
+        if not src.size:  # A single vertex has no edges, but it is still part of the grid
+            grafo.V.update((vertex, []) for vertex in range(rows * columns))
+        return grafo
+
+    def _edge_key(self, vertex_o: int, vertex_i: int):
+        """
+        Return the key of the edge between two vertices in E, or None if the edge does not exist.
+        """
+        if self._index is not None:
+            edge_id = self.edge_id(vertex_o, vertex_i)
+            return None if edge_id is None else self._index.keys[edge_id]
+        key = f"({vertex_o}, {vertex_i})"
+        if key in self.E:
+            return key
+        key = f"({vertex_i}, {vertex_o})"
+        return key if key in self.E else None
+
+    def set_cost(self, vertex_o: int, vertex_i: int, cost: int):
+        """
+        Set the traversal cost of an existing edge. The cost is independent of the wall flag of the edge.
+
+        :param vertex_o: (int) One vertex of the edge.
+        :param vertex_i: (int) The other vertex of the edge.
+        :param cost: (int) The traversal cost, a positive integer.
+        :return: None
+        """
+        if cost < 1:
+            raise ValueError('The traversal cost of an edge must be a positive integer.')
+        key = self._edge_key(vertex_o, vertex_i)
+        if key is None:
+            raise KeyError(f"The edge ({vertex_o}, {vertex_i}) does not exist.")
+        self._unshare()
+        if cost == 1:
+            self.C.pop(key, None)
+        else:
+            self.C[key] = cost
+
+    def _unshare(self):
+        """
+        Copy V and C if a snapshot shares them, before they change.
+        """
+        if self._shared:
+            self.V = {vertex: list(neighbors) for vertex, neighbors in self.V.items()}
+            self.C = dict(self.C)
+            self._shared = False
+
+    def snapshot(self):
+        """
+        Take a read-only snapshot of the graph, in O(1) with respect to the size of the graph once the index of the
+        edges exists (the first snapshot or query builds it).
+
+        The snapshot shares the index of the edges and the pages of the wall flags with the graph, copy-on-write: a
+        wall changed later (set_wall) copies only its page, so a long history of snapshots only costs the pages that
+        changed between them. V and C are shared as well and copied as a whole only if the graph adds edges or changes
+        a cost afterwards. The turtles and the colors, which are small and changed directly by the callers, are copied.
+
+        The changes made to E directly (not with add_edge, add_edges or set_wall) are not seen by the snapshot unless
+        invalidate_index is called before it.
+
+        :return: (GrafoSnapshot) The snapshot.
+        """
+        index = self.index()
+        pages, length = index.flags.freeze()
+        self._shared = True
+        return GrafoSnapshot(index, pages, length, self.V, self.C, dict(self.turtle), dict(self.colors))
+
+    def get_cost(self, vertex_o: int, vertex_i: int):
+        """
+        Return the traversal cost of an edge (1 unless it was set to another value).
+        """
+        key = self._edge_key(vertex_o, vertex_i)
+        return self.C.get(key, 1) if key is not None else 1
+
+
+    @classmethod
+    def from_graph(cls, graph: dict):
+        """
+        Build a Grafo from a graph dictionary, as returned by get_graph or loaded from a JSON file. The dictionaries
+        are shared, not copied.
+
+        :param graph: (dict) The graph, with the keys 'V' and 'E' and optionally 'C', 'turtle' and 'colors'.
+        :return: (Grafo) The graph.
+        """
+        return cls(graph['V'], graph['E'], graph.get('turtle'), graph.get('colors'), graph.get('C'))
+
+    def index(self):
+        """
+        Return the index of the edges, building it if needed.
+
+        The index is kept up to date by add_edge and set_wall. If E is modified directly, call invalidate_index
+        (adding keys directly to E is detected).
+
+        :return: (_EdgeIndex) The index.
+        """
+        if self._index is None or len(self._index.keys) != len(self.E):
+            hint = self._index_hint
+            if hint is not None and len(hint[0]) == len(self.E):
+                self._index = _EdgeIndex(self.E, *hint)
+            else:
+                self._index = _EdgeIndex(self.E)
+            self._index_hint = None
+        return self._index
+
+    def invalidate_index(self):
+        """
+        Discard the index of the edges, so it is built again on the next query.
+        """
+        self._index = None
+        self._index_hint = None
+
+    def edge_id(self, vertex_o: int, vertex_i: int):
+        """
+        Return the id of the edge between two vertices in the index, or None if the edge does not exist.
+        """
+        key = (vertex_o, vertex_i) if vertex_o < vertex_i else (vertex_i, vertex_o)
+        return self.index().ids.get(key)
+
+    def has_wall(self, vertex_o: int, vertex_i: int):
+        """
+        Return True if there is a wall between two vertices.
+
+        :param vertex_o: (int) One vertex of the edge.
+        :param vertex_i: (int) The other vertex of the edge.
+        :return: (bool) True if the edge has a wall (weight 0).
+        """
+        edge_id = self.edge_id(vertex_o, vertex_i)
+        if edge_id is None:
+            raise KeyError(f"The edge ({vertex_o}, {vertex_i}) does not exist.")
+        return not self._index.flags[edge_id]
+
+    def set_wall(self, vertex_o: int, vertex_i: int, wall: bool):
+        """
+        Set the wall flag of an existing edge, in E and in the index.
+
+        :param vertex_o: (int) One vertex of the edge.
+        :param vertex_i: (int) The other vertex of the edge.
+        :param wall: (bool) True to put a wall between the vertices, False to remove it.
+        :return: None
+        """
+        edge_id = self.edge_id(vertex_o, vertex_i)
+        if edge_id is None:
+            raise KeyError(f"The edge ({vertex_o}, {vertex_i}) does not exist.")
+        self._index.flags[edge_id] = 0 if wall else 1
+        self.E[self._index.keys[edge_id]] = 0 if wall else 1
+
+    def open_neighbors(self, vertex: int):
+        """
+        Return the vertices joined to a vertex by an edge without a wall.
+
+        :param vertex: (int) The vertex.
+        :return: (list) The neighbours, in the order of the edges in E.
+        """
+        index = self.index()
+        flags = index.flags
+        return [neighbor for neighbor, edge_id in index.incident.get(vertex, ()) if flags[edge_id]]
+
+    def degree(self, vertex: int):
+        """
+        Return the number of edges without a wall of a vertex.
+        """
+        index = self.index()
+        flags = index.flags
+        return sum(flags[edge_id] for _, edge_id in index.incident.get(vertex, ()))
+
+    def open_edges(self):
+        """
+        Return the edges without a wall as two integer arrays, with the two vertices of every edge (in the order of
+        its key in E). The arrays support the buffer protocol, so numpy.asarray wraps them without parsing anything.
+
+        :return: (tuple) The arrays (array.array of type 'q') of the first and second vertices.
+        """
+        index = self.index()
+        flags = index.flags.tobytes()
+        return array('q', compress(index.src, flags)), array('q', compress(index.dst, flags))
+
+    def edge_arrays(self):
+        """
+        Return every edge of the graph as two integer arrays and its wall flags, in the order of the ids.
+
+        :return: (tuple) The arrays of the first and second vertices, which belong to the index and must not be
+                 modified, and the flags (bytes, 1 for no wall).
+        """
+        index = self.index()
+        return index.src, index.dst, index.flags.tobytes()
+
+
+class GrafoSnapshot(Mapping):
+    """
+    A read-only snapshot of a Grafo, taken with Grafo.snapshot.
+
+    It is also a read-only mapping with the keys of Grafo.get_graph ('V', 'E', 'C', 'turtle' and 'colors'), so it can
+    be used wherever a graph dictionary is read, for example by the Labyrinth. The dictionary E is only built when it
+    is read; has_wall, open_edges and edge_arrays read the shared index and pages instead.
+
+    Attributes:
+    ----------
+    V : dict
+        The vertices of the graph (shared with the graph, must not be modified).
+    C : dict
+        The traversal costs of the edges (shared with the graph, must not be modified).
+    turtle : dict
+        The turtles of the graph when the snapshot was taken.
+    colors : dict
+        The colors of the vertices when the snapshot was taken.
+    """
+
+    def __init__(self, index: _EdgeIndex, pages: list, length: int, V: dict, C: dict, turtle: dict, colors: dict):
+        """
+        :param index: (_EdgeIndex) The index of the edges of the graph. Only its first `length` edges belong to the
+                      snapshot.
+        :param pages: (list) The pages of the wall flags, frozen for the snapshot.
+        :param length: (int) The number of edges of the snapshot.
+        """
+        self._index, self._pages, self._length = index, pages, length
+        self.V, self.C, self.turtle, self.colors = V, C, turtle, colors
+        self._E = None
+
+    @property
+    def E(self):
+        """
+        The edges of the graph as a dictionary, as in Grafo.E. It is built on the first access.
+        """
+        if self._E is None:
+            self._E = dict(zip(self._index.keys[:self._length], self._flags()))
+        return self._E
+
+    def _flags(self):
+        return b''.join(self._pages)
+
+    def __getitem__(self, key):
+        if key in ('V', 'E', 'C', 'turtle', 'colors'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(('V', 'E', 'C', 'turtle', 'colors'))
+
+    def __len__(self):
+        return 5
+
+    def get_graph(self):
+        """
+        Return the snapshot as a graph dictionary, as Grafo.get_graph.
+        """
+        return {'V': self.V, 'E': self.E, 'C': self.C, 'turtle': self.turtle, 'colors': self.colors}
+
+    def has_wall(self, vertex_o: int, vertex_i: int):
+        """
+        Return True if there was a wall between two vertices when the snapshot was taken.
+        """
+        edge_id = self._index.ids.get((vertex_o, vertex_i) if vertex_o < vertex_i else (vertex_i, vertex_o))
+        if edge_id is None or edge_id >= self._length:
+            raise KeyError(f"The edge ({vertex_o}, {vertex_i}) does not exist.")
+        return not self._pages[edge_id >> PAGE_BITS][edge_id & _PAGE_MASK]
+
+    def open_edges(self):
+        """
+        Return the edges without a wall as two integer arrays, as Grafo.open_edges.
+        """
+        flags = self._flags()
+        return (array('q', compress(self._index.src[:self._length], flags)),
+                array('q', compress(self._index.dst[:self._length], flags)))
+
+    def edge_arrays(self):
+        """
+        Return every edge as two integer arrays and its wall flags, as Grafo.edge_arrays.
+        """
+        return self._index.src[:self._length], self._index.dst[:self._length], self._flags()
+
+    def to_grafo(self):
+        """
+        Build a new Grafo with the state of the snapshot (for example to undo the changes made since). It copies the
+        vertices and the edges, in O(size of the graph).
+
+        :return: (Grafo) The graph.
+        """
+        V = {vertex: list(neighbors) for vertex, neighbors in self.V.items()}
+        return Grafo(V, dict(self.E), dict(self.turtle), dict(self.colors), dict(self.C))
 
 
 if __name__ == '__main__':
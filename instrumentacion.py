@@ -0,0 +1,328 @@
+"""
+This module implements an opt-in instrumentation layer for the labyrinth project.
+
+It keeps counters (nodes expanded, heap pushes, frames applied or dropped, bytes read and written...), gauges (the
+depth of the global queue 'cola') and timers for the stages of the solvers and the viewer, and it offers context
+managers to wrap any stage in cProfile or in a simple sampling profiler. All the metrics can be exported to a JSON file.
+
+The instrumentation is disabled by default. While it is disabled, every hook is a no-op: the hot loops of the
+solvers get the plain heapq, deque and list functions from operaciones_heap, operaciones_cola and operaciones_cubetas,
+and the other call sites check the 'activo' flag before doing any work, so the overhead is zero. It can be enabled
+from code with activar() or by setting the environment variable LABERINTO_METRICAS to the path of the metrics file,
+which is then written when the program exits.
+
+Usage:
+    import instrumentacion
+    instrumentacion.activar('metricas.json')
+    with instrumentacion.temporizador('asignacion'):
+        ...
+    with instrumentacion.perfilar('dijkstra', modo='muestreo'):
+        ...
+    instrumentacion.exportar()
+
+Attributes:
+----------
+activo : bool
+    True if the instrumentation is enabled.
+"""
+
+import atexit
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+
+activo = False  # Flag checked by the call sites before recording anything
+_ruta = None  # Path of the metrics file
+_candado = threading.Lock()  # The viewer and the solvers may record from different threads
+_contadores = Counter()
+_medidores = dict()  # Gauges: name -> [last value, max value, samples]
+_tiempos = dict()  # Timers: name -> [calls, total seconds, max seconds]
+_perfiles = dict()  # Profiles: name -> summary of the profile
+_nulo = nullcontext()  # Shared context manager returned while disabled
+
+
+def activar(ruta: str = None):
+    """
+    Enable the instrumentation.
+
+    :param ruta: (str) Path of the JSON file where the metrics are exported when the program exits. If None, the
+                 metrics are only exported when exportar() is called with a path.
+    :return: None
+    """
+    global activo, _ruta
+    activo = True
+    if ruta is not None:
+        if _ruta is None:
+            atexit.register(exportar)
+        _ruta = ruta
+
+
+def desactivar():
+    """
+    Disable the instrumentation. The metrics recorded so far are kept.
+    """
+    global activo
+    activo = False
+
+
+def reiniciar():
+    """
+    Discard all the metrics recorded so far.
+    """
+    with _candado:
+        _contadores.clear()
+        _medidores.clear()
+        _tiempos.clear()
+        _perfiles.clear()
+
+
+def contar(nombre: str, n: int = 1):
+    """
+    Add n to the counter with the given name, if the instrumentation is enabled.
+    """
+    if activo:
+        with _candado:
+            _contadores[nombre] += n
+
+
+def registrar(nombre: str, valor: float):
+    """
+    Record a sample of a gauge (for example the depth of a queue), if the instrumentation is enabled.
+    The last value, the maximum value and the number of samples are kept.
+    """
+    if activo:
+        with _candado:
+            medidor = _medidores.get(nombre)
+            if medidor is None:
+                _medidores[nombre] = [valor, valor, 1]
+            else:
+                medidor[0] = valor
+                medidor[1] = max(medidor[1], valor)
+                medidor[2] += 1
+
+
+def bytes_archivo(nombre: str, ruta: str):
+    """
+    Add the size of a file to the counter with the given name (for example 'bytes_leidos'), if the instrumentation
+    is enabled.
+    """
+    if activo:
+        contar(nombre, os.path.getsize(ruta))
+
+
+def operaciones_heap():
+    """
+    Return the push and pop functions to be used by a solver.
+
+    While the instrumentation is disabled these are heapq.heappush and heapq.heappop themselves. While it is enabled
+    they are wrappers that count the heap pushes ('heap_pushes') and the nodes expanded ('nodos_expandidos').
+
+    :return: (tuple) The push and pop functions.
+    """
+    if not activo:
+        return heapq.heappush, heapq.heappop
+    return _heappush_contado, _heappop_contado
+
+
+def _heappush_contado(heap, item):
+    with _candado:
+        _contadores['heap_pushes'] += 1
+    heapq.heappush(heap, item)
+
+
+def _heappop_contado(heap):
+    with _candado:
+        _contadores['nodos_expandidos'] += 1
+    return heapq.heappop(heap)
+
+
+def operaciones_cola():
+    """
+    Return the functions to push at the back, push at the front and pop from the front of a deque, to be used by the
+    0-1 BFS of the solvers. They are called with the deque as first argument.
+
+    While the instrumentation is disabled these are the methods of deque themselves. While it is enabled they are
+    wrappers that count the pushes ('heap_pushes') and the nodes expanded ('nodos_expandidos'), as operaciones_heap.
+
+    :return: (tuple) The append, appendleft and popleft functions.
+    """
+    if not activo:
+        return deque.append, deque.appendleft, deque.popleft
+    return _append_contado, _appendleft_contado, _popleft_contado
+
+
+def _append_contado(cola, item):
+    with _candado:
+        _contadores['heap_pushes'] += 1
+    cola.append(item)
+
+
+def _appendleft_contado(cola, item):
+    with _candado:
+        _contadores['heap_pushes'] += 1
+    cola.appendleft(item)
+
+
+def _popleft_contado(cola):
+    with _candado:
+        _contadores['nodos_expandidos'] += 1
+    return cola.popleft()
+
+
+def operaciones_cubetas():
+    """
+    Return the functions to push to and pop from a bucket (a list) of the bucket queue of the solvers. They are
+    called with the bucket as first argument.
+
+    While the instrumentation is disabled these are list.append and list.pop themselves. While it is enabled they are
+    wrappers that count the pushes ('heap_pushes') and the nodes expanded ('nodos_expandidos'), as operaciones_heap.
+
+    :return: (tuple) The append and pop functions.
+    """
+    if not activo:
+        return list.append, list.pop
+    return _cubeta_append_contado, _cubeta_pop_contado
+
+
+def _cubeta_append_contado(cubeta, item):
+    with _candado:
+        _contadores['heap_pushes'] += 1
+    cubeta.append(item)
+
+
+def _cubeta_pop_contado(cubeta):
+    with _candado:
+        _contadores['nodos_expandidos'] += 1
+    return cubeta.pop()
+
+
+def temporizador(nombre: str):
+    """
+    Return a context manager that measures the wall time of the wrapped block under the given name.
+    While the instrumentation is disabled, a shared no-op context manager is returned.
+    """
+    if not activo:
+        return _nulo
+    return _medir(nombre)
+
+
+@contextmanager
+def _medir(nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        with _candado:
+            tiempo = _tiempos.setdefault(nombre, [0, 0.0, 0.0])
+            tiempo[0] += 1
+            tiempo[1] += duracion
+            tiempo[2] = max(tiempo[2], duracion)
+
+
+def perfilar(nombre: str, modo: str = 'cprofile', intervalo: float = 0.005, top: int = 20):
+    """
+    Return a context manager that profiles the wrapped block.
+
+    With modo='cprofile' the block runs under cProfile, the statistics are dumped to '<nombre>.prof' next to the
+    metrics file and the functions with the highest cumulative time are added to the metrics. With modo='muestreo'
+    a background thread samples the stack of the calling thread every `intervalo` seconds, which has a much lower
+    overhead, and the most frequent frames are added to the metrics.
+
+    While the instrumentation is disabled, a shared no-op context manager is returned.
+
+    :param nombre: (str) Name of the profiled stage.
+    :param modo: (str) 'cprofile' or 'muestreo'.
+    :param intervalo: (float) Sampling interval in seconds (only for modo='muestreo').
+    :param top: (int) Number of entries kept in the metrics.
+    :return: A context manager.
+    """
+    if not activo:
+        return _nulo
+    if modo == 'cprofile':
+        return _perfilar_cprofile(nombre, top)
+    if modo == 'muestreo':
+        return _perfilar_muestreo(nombre, intervalo, top)
+    raise ValueError("The profiling mode must be 'cprofile' or 'muestreo'.")
+
+
+@contextmanager
+def _perfilar_cprofile(nombre, top):
+    import cProfile
+    import io
+    import pstats
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        directorio = os.path.dirname(_ruta) if _ruta else ''
+        perfil.dump_stats(os.path.join(directorio, f'{nombre}.prof'))
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(top)
+        with _candado:
+            _perfiles[nombre] = {'modo': 'cprofile', 'resumen': salida.getvalue().splitlines()}
+
+
+@contextmanager
+def _perfilar_muestreo(nombre, intervalo, top):
+    objetivo = threading.get_ident()
+    muestras = Counter()
+    terminar = threading.Event()
+
+    def muestrear():
+        while not terminar.wait(intervalo):
+            frame = sys._current_frames().get(objetivo)
+            if frame is not None:
+                codigo = frame.f_code
+                muestras[f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})'] += 1
+
+    hilo = threading.Thread(target=muestrear, daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        terminar.set()
+        hilo.join()
+        with _candado:
+            _perfiles[nombre] = {'modo': 'muestreo', 'intervalo': intervalo, 'muestras': sum(muestras.values()),
+                                 'frecuentes': muestras.most_common(top)}
+
+
+def metricas():
+    """
+    Return all the metrics recorded so far as a dictionary that can be serialized as JSON.
+    """
+    with _candado:
+        return {
+            'contadores': dict(_contadores),
+            'medidores': {nombre: {'ultimo': m[0], 'maximo': m[1], 'muestras': m[2]}
+                          for nombre, m in _medidores.items()},
+            'tiempos': {nombre: {'llamadas': t[0], 'total_s': t[1], 'max_s': t[2], 'media_s': t[1] / t[0]}
+                        for nombre, t in _tiempos.items()},
+            'perfiles': dict(_perfiles),
+        }
+
+
+def exportar(ruta: str = None):
+    """
+    Save the metrics as a JSON file.
+
+    :param ruta: (str) Path of the metrics file. If None, the path given to activar() is used.
+    :return: None
+    """
+    ruta = ruta or _ruta
+    if ruta is None:
+        return
+    with open(ruta, 'w') as f:
+        json.dump(metricas(), f, indent=4)
+
+
+if os.environ.get('LABERINTO_METRICAS'):
+    activar(os.environ['LABERINTO_METRICAS'])
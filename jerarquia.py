@@ -0,0 +1,319 @@
+"""
+This module implements hierarchical pathfinding (HPA*) for large boards.
+
+The board is split into square clusters of tamano x tamano cells. On the border between two neighbouring clusters,
+every run of consecutive open edges (both cells passable) becomes an entrance, represented by the edge in the middle
+of the run. A run is cut where a wall separates two consecutive cells along the border, so every crossing of a run
+can reach its entrance. The cells of the entrances are the nodes of a small abstract graph, with two kinds of edges:
+
+- the entrance edges themselves, between two clusters;
+- the distances between the entrances of the same cluster, computed with a Dijkstra restricted to the cluster.
+
+The intra-cluster distances are cached per cluster. When some walls change (events as in replanificacion), only the
+clusters and borders touched by the events are marked as dirty, and they are recomputed at the next query.
+
+A query inserts the start and the target in the abstract graph (connecting them to the entrances of their clusters),
+runs A* on it and returns the abstract route. The route over the cells is refined lazily, one abstract edge at a
+time, with the same restricted Dijkstra. The routes are near optimal: the cost of a route is exact, but the shortest
+path may cross a border through an entrance that was not chosen.
+
+Usage:
+    mapa = MapaJerarquico(grafo, mascara, tamano=10)  # grafo as returned by cargar_grafo
+    camino, costo = mapa.ruta(inicio, objetivo)
+    mapa.aplicar(diferencias(graph_anterior, graph_nuevo))
+"""
+
+import heapq
+
+import motor_rutas
+from replanificacion import adyacencia_mutable, aplicar_evento
+
+INF = float('inf')
+
+
+class MapaJerarquico:
+    """
+    Abstraction of a maze in clusters for HPA* queries.
+
+    Attributes:
+    ----------
+    vecinos : dict
+        The adjacency {u: {v: cost}} of the maze.
+    mascara : motor_rutas.Transitabilidad
+        The passability mask of the maze.
+    tamano : int
+        The side of the clusters, in cells.
+    recalculados : int
+        Number of clusters whose distances have been computed since the map was created.
+    """
+
+    def __init__(self, grafo: dict, mascara: motor_rutas.Transitabilidad, tamano: int = 10):
+        """
+        :param grafo: (dict) The adjacency dictionary of the maze, as returned by cargar_grafo.
+        :param mascara: (motor_rutas.Transitabilidad) The passability mask of the maze.
+        :param tamano: (int) The side of the clusters, in cells.
+        """
+        self.vecinos = adyacencia_mutable(grafo)
+        self.mascara = mascara
+        self.tamano = tamano
+        self.nrows, self.ncols = mascara.nrows, mascara.ncols
+        self._cfilas = -(-self.nrows // tamano)
+        self._ccols = -(-self.ncols // tamano)
+        self._heuristica = motor_rutas.heuristica_manhattan(self.ncols, motor_rutas.costo_minimo(grafo))
+        self._entradas = {}  # Border (cluster a, cluster b) -> list of entrance edges (u, v, cost)
+        self._distancias = {}  # Cluster -> {entrance: {entrance: distance}}
+        self._grafo_entradas = {}  # Entrance cell -> [(entrance cell in the other cluster, cost)]
+        self._bordes_sucios = set(self._bordes())
+        self._clusters_sucios = set(range(self._cfilas * self._ccols))
+        self.recalculados = 0
+
+    def cluster(self, pos: int):
+        """
+        Return the cluster of a cell, or -1 if the cell is not on the board.
+        """
+        if not 0 <= pos < self.nrows * self.ncols:
+            return -1
+        row, col = divmod(pos, self.ncols)
+        return (row // self.tamano) * self._ccols + col // self.tamano
+
+    def _bordes(self):
+        for ci in range(self._cfilas):
+            for cj in range(self._ccols):
+                c = ci * self._ccols + cj
+                if cj + 1 < self._ccols:
+                    yield c, c + 1
+                if ci + 1 < self._cfilas:
+                    yield c, c + self._ccols
+
+    def _bordes_celda(self, pos: int):
+        # Borders on which a cell lies
+        cluster = self.cluster(pos)
+        if cluster == -1:
+            return set()
+        row, col = divmod(pos, self.ncols)
+        ci, cj = divmod(cluster, self._ccols)
+        t, bordes = self.tamano, set()
+        if col % t == 0 and cj > 0:
+            bordes.add((cluster - 1, cluster))
+        if col % t == t - 1 and cj + 1 < self._ccols:
+            bordes.add((cluster, cluster + 1))
+        if row % t == 0 and ci > 0:
+            bordes.add((cluster - self._ccols, cluster))
+        if row % t == t - 1 and ci + 1 < self._cfilas:
+            bordes.add((cluster, cluster + self._ccols))
+        return bordes
+
+    def _cruces(self, borde):
+        # Pairs of facing cells along a border, in order
+        a, b = borde
+        ci, cj = divmod(a, self._ccols)
+        t = self.tamano
+        if b == a + 1 and b % self._ccols:  # Side by side
+            col = cj * t + t - 1
+            return [(row * self.ncols + col, row * self.ncols + col + 1)
+                    for row in range(ci * t, min((ci + 1) * t, self.nrows))]
+        row = ci * t + t - 1
+        return [(row * self.ncols + col, (row + 1) * self.ncols + col)
+                for col in range(cj * t, min((cj + 1) * t, self.ncols))]
+
+    def _calcular_entradas(self, borde):
+        transitable = self.mascara.transitable
+        entradas, tramo = [], []
+        for u, v in self._cruces(borde) + [(None, None)]:
+            abierta = u is not None and v in self.vecinos.get(u, {}) and transitable(u) and transitable(v)
+            # A run goes on while the cells along the border are connected on both sides, so that every crossing
+            # of the run can reach the one chosen as entrance
+            if tramo and not (abierta and u in self.vecinos.get(tramo[-1][0], {})
+                              and v in self.vecinos.get(tramo[-1][1], {})):
+                u_m, v_m = tramo[len(tramo) // 2]
+                entradas.append((u_m, v_m, self.vecinos[u_m][v_m]))
+                tramo = []
+            if abierta:
+                tramo.append((u, v))
+        self._entradas[borde] = entradas
+
+    def _local(self, origen: int, cluster: int, destino: int = None):
+        # Dijkstra from origen restricted to the passable cells of a cluster
+        transitable = self.mascara.transitable
+        distancias, anteriores = {origen: 0}, {origen: None}
+        cola = [(0, origen)]
+        while cola:
+            distancia_actual, nodo = heapq.heappop(cola)
+            if distancia_actual > distancias[nodo]:
+                continue
+            if nodo == destino:
+                break
+            for vecino, peso in self.vecinos.get(nodo, {}).items():
+                if self.cluster(vecino) != cluster or not transitable(vecino):
+                    continue
+                distancia = distancia_actual + peso
+                if distancia < distancias.get(vecino, INF):
+                    distancias[vecino] = distancia
+                    anteriores[vecino] = nodo
+                    heapq.heappush(cola, (distancia, vecino))
+        return distancias, anteriores
+
+    def _nodos_cluster(self, cluster: int):
+        # Entrance cells of a cluster
+        ci, cj = divmod(cluster, self._ccols)
+        bordes = []
+        if cj > 0:
+            bordes.append((cluster - 1, cluster))
+        if cj + 1 < self._ccols:
+            bordes.append((cluster, cluster + 1))
+        if ci > 0:
+            bordes.append((cluster - self._ccols, cluster))
+        if ci + 1 < self._cfilas:
+            bordes.append((cluster, cluster + self._ccols))
+        nodos = set()
+        for borde in bordes:
+            for u, v, _ in self._entradas[borde]:
+                nodos.add(u if self.cluster(u) == cluster else v)
+        return sorted(nodos)
+
+    def _preparar(self):
+        # Recompute the dirty borders, then the dirty clusters
+        if self._bordes_sucios:
+            for borde in self._bordes_sucios:
+                self._calcular_entradas(borde)
+                self._clusters_sucios.update(borde)
+            self._bordes_sucios.clear()
+            self._grafo_entradas = {}
+            for lista in self._entradas.values():
+                for u, v, costo in lista:
+                    self._grafo_entradas.setdefault(u, []).append((v, costo))
+                    self._grafo_entradas.setdefault(v, []).append((u, costo))
+        for cluster in self._clusters_sucios:
+            nodos = self._nodos_cluster(cluster)
+            tabla = {}
+            for nodo in nodos:
+                distancias, _ = self._local(nodo, cluster)
+                tabla[nodo] = {otro: distancias[otro] for otro in nodos if otro != nodo and otro in distancias}
+            self._distancias[cluster] = tabla
+            self.recalculados += 1
+        self._clusters_sucios.clear()
+
+    def aplicar(self, eventos):
+        """
+        Apply edge changes to the maze and invalidate the clusters they touch.
+
+        :param eventos: (iterable) The events as tuples (u, v, cost), with cost None for a wall
+                        (see replanificacion.diferencias).
+        :return: None
+        """
+        for u, v, costo in eventos:
+            aplicar_evento(self.vecinos, u, v, costo)
+            # An edge across a border, or along it, changes the entrances of the border
+            self._bordes_sucios.update(self._bordes_celda(u) & self._bordes_celda(v))
+            self._clusters_sucios.update(c for c in (self.cluster(u), self.cluster(v)) if c != -1)
+
+    def invalidar_celdas(self, celdas):
+        """
+        Invalidate the clusters of some cells whose passability changed in the mask.
+
+        :param celdas: (iterable) The cells.
+        :return: None
+        """
+        for celda in celdas:
+            cluster = self.cluster(celda)
+            if cluster != -1:
+                self._clusters_sucios.add(cluster)
+                self._bordes_sucios.update(self._bordes_celda(celda))
+
+    def _salidas(self, origen: int, cluster: int, objetivo: int):
+        # Distances from a cell to the entrances of its cluster, and to the target if it is in the same cluster
+        distancias, _ = self._local(origen, cluster)
+        salidas = {nodo: distancias[nodo] for nodo in self._nodos_cluster(cluster) if nodo in distancias}
+        if objetivo in distancias:
+            salidas[objetivo] = distancias[objetivo]
+        return salidas
+
+    def ruta_abstracta(self, inicio: int, objetivo: int):
+        """
+        Find the route between two cells on the abstract graph.
+
+        :param inicio: (int) The start cell.
+        :param objetivo: (int) The target cell.
+        :return: (tuple) The list of abstract nodes from inicio to objetivo, and the cost of the route. If the target
+                 is unreachable, the list is [objetivo] and the cost is infinite.
+        """
+        if inicio == objetivo:
+            return [objetivo], 0
+        self._preparar()
+        c_inicio, c_objetivo = self.cluster(inicio), self.cluster(objetivo)
+        if c_inicio == -1 or not self.mascara.transitable(objetivo):
+            return [objetivo], INF
+
+        # Temporary edges of the start and the target. The start may be a cell that cannot be entered, so its
+        # neighbours in other clusters are connected too.
+        temporales = {inicio: self._salidas(inicio, c_inicio, objetivo)}
+        for vecino, peso in self.vecinos.get(inicio, {}).items():
+            c_vecino = self.cluster(vecino)
+            if c_vecino not in (c_inicio, -1) and self.mascara.transitable(vecino):
+                temporales[inicio][vecino] = peso
+                temporales.setdefault(vecino, self._salidas(vecino, c_vecino, objetivo))
+        hasta_objetivo, _ = self._local(objetivo, c_objetivo)
+        llegadas = {nodo: hasta_objetivo[nodo] for nodo in self._nodos_cluster(c_objetivo) if nodo in hasta_objetivo}
+        entradas = self._grafo_entradas
+
+        def sucesores(nodo):
+            yield from entradas.get(nodo, ())
+            yield from temporales.get(nodo, {}).items()
+            yield from self._distancias[self.cluster(nodo)].get(nodo, {}).items()
+            if nodo in llegadas:
+                yield objetivo, llegadas[nodo]
+
+        distancias, anteriores = {inicio: 0}, {inicio: None}
+        cola = [(self._heuristica(inicio, objetivo), 0, inicio)]
+        while cola:
+            _, distancia_actual, nodo = heapq.heappop(cola)
+            if distancia_actual > distancias[nodo]:
+                continue
+            if nodo == objetivo:
+                break
+            for vecino, peso in sucesores(nodo):
+                distancia = distancia_actual + peso
+                if distancia < distancias.get(vecino, INF):
+                    distancias[vecino] = distancia
+                    anteriores[vecino] = nodo
+                    heapq.heappush(cola, (distancia + self._heuristica(vecino, objetivo), distancia, vecino))
+
+        if objetivo not in distancias:
+            return [objetivo], INF
+        abstracta = [objetivo]
+        while anteriores[abstracta[-1]] is not None:
+            abstracta.append(anteriores[abstracta[-1]])
+        return abstracta[::-1], distancias[objetivo]
+
+    def refinar(self, abstracta):
+        """
+        Refine an abstract route into cells, lazily: every abstract edge is expanded only when it is reached.
+
+        :param abstracta: (list) The abstract route, as returned by ruta_abstracta.
+        :return: (generator) The cells of the route, from the start to the target.
+        """
+        yield abstracta[0]
+        for a, b in zip(abstracta, abstracta[1:]):
+            cluster = self.cluster(a)
+            if self.cluster(b) != cluster:
+                yield b  # Entrance edge between two clusters
+                continue
+            _, anteriores = self._local(a, cluster, b)
+            tramo = [b]
+            while anteriores[tramo[-1]] != a:
+                tramo.append(anteriores[tramo[-1]])
+            yield from reversed(tramo)
+
+    def ruta(self, inicio: int, objetivo: int):
+        """
+        Find a route between two cells, refined into cells.
+
+        :param inicio: (int) The start cell.
+        :param objetivo: (int) The target cell.
+        :return: (tuple) The path as a list of cells from inicio to objetivo, and its cost. If the target is
+                 unreachable, the path is [objetivo] and the cost is infinite, like in the solvers.
+        """
+        abstracta, costo = self.ruta_abstracta(inicio, objetivo)
+        if costo == INF:
+            return abstracta, costo
+        return list(self.refinar(abstracta)), costo
@@ -0,0 +1,285 @@
+"""
+This module generates perfect mazes: grids where every pair of cells is joined by exactly one path of open edges (a
+spanning tree of the grid), like real labyrinths.
+
+Three classic algorithms are implemented, all of them iterative, so they work on boards of any size without hitting
+the recursion limit:
+
+- backtracker: the randomized depth-first search with an explicit stack. It makes long corridors with few dead ends.
+- kruskal: the randomized Kruskal algorithm with a union-find of the cells, computed in vectorized rounds. It makes
+  many short dead ends.
+- wilson: the Wilson algorithm with loop-erased random walks. The maze is drawn uniformly among all the spanning trees
+  of the grid, without bias, but it is the slowest of the three because the first walks wander until they hit the
+  tree.
+
+The generators do not build a Grafo edge by edge. They write the wall flags directly into the compact buffers of a
+Paredes (one byte per edge of the grid, two bytearrays), and the Grafo is built from the buffers once at the end with
+Paredes.grafo. All the random numbers are drawn in bulk from an explicit numpy.random.Generator, so the same seed
+always produces the same maze.
+
+Usage:
+    paredes = generar('kruskal', 1000, 1000, semilla=7)
+    grafo = paredes.grafo()
+"""
+
+import numpy as np
+
+from grafo import Grafo
+import regiones
+
+
+class Paredes:
+    """
+    Compact wall buffers of a grid of nrows x ncols cells, numbered row by row.
+
+    Every edge of the grid has one byte with the wall flag of the Grafo: 0 if there is a wall, 1 if the edge is open.
+    The horizontal edge between the cells i and i + 1 (in the row f) is at horizontales[i - f], and the vertical edge
+    between the cells i and i + ncols is at verticales[i].
+
+    Attributes:
+    ----------
+    nrows : int
+        Number of rows of the grid.
+    ncols : int
+        Number of columns of the grid.
+    horizontales : bytearray
+        The flags of the horizontal edges, nrows * (ncols - 1) bytes.
+    verticales : bytearray
+        The flags of the vertical edges, (nrows - 1) * ncols bytes.
+    """
+
+    def __init__(self, nrows: int, ncols: int):
+        """
+        Initialize the buffers with every edge closed (a wall everywhere).
+
+        :param nrows: (int) Number of rows of the grid.
+        :param ncols: (int) Number of columns of the grid.
+        """
+        if nrows < 1 or ncols < 1:
+            raise ValueError('The grid must have at least one row and one column.')
+        self.nrows, self.ncols = nrows, ncols
+        self.horizontales = bytearray(nrows * (ncols - 1))
+        self.verticales = bytearray((nrows - 1) * ncols)
+
+    def _indice(self, vertex_o: int, vertex_i: int):
+        """
+        Return the buffer and the index of the edge between two neighbouring cells.
+        """
+        a, b = min(vertex_o, vertex_i), max(vertex_o, vertex_i)
+        if b == a + 1 and b % self.ncols:
+            return self.horizontales, a - a // self.ncols
+        if b == a + self.ncols and b < self.nrows * self.ncols:
+            return self.verticales, a
+        raise ValueError(f'The cells {vertex_o} and {vertex_i} are not neighbours in the grid.')
+
+    def abierta(self, vertex_o: int, vertex_i: int):
+        """
+        Return True if the edge between two neighbouring cells is open.
+        """
+        buffer, indice = self._indice(vertex_o, vertex_i)
+        return buffer[indice] == 1
+
+    def abrir(self, vertex_o: int, vertex_i: int, abierta: bool = True):
+        """
+        Open (or close, with abierta=False) the edge between two neighbouring cells.
+        """
+        buffer, indice = self._indice(vertex_o, vertex_i)
+        buffer[indice] = 1 if abierta else 0
+
+    def n_abiertas(self):
+        """
+        Return the number of open edges. A perfect maze has exactly nrows * ncols - 1.
+        """
+        return self.horizontales.count(1) + self.verticales.count(1)
+
+    def grafo(self):
+        """
+        Build the Grafo of the maze, with every edge of the grid (walls included) in the same order as the other
+        generators of the project: cell by cell, first the edge to the right and then the edge below.
+
+        :return: (Grafo) The graph.
+        """
+        celdas = np.arange(self.nrows * self.ncols, dtype=np.int64).reshape(self.nrows, self.ncols)
+        # The buffers hold the horizontal edges and then the vertical ones, Grafo.grid takes them cell by cell
+        orden = np.argsort(np.concatenate((celdas[:, :-1].ravel() * 2, celdas[:-1, :].ravel() * 2 + 1)), kind='stable')
+        abiertas = np.frombuffer(bytes(self.horizontales + self.verticales), dtype=np.uint8)
+        return Grafo.grid(self.nrows, self.ncols, walls=abiertas[orden] == 0)
+
+
+def backtracker(nrows: int, ncols: int, semilla=None):
+    """
+    Generate a perfect maze with the randomized depth-first search (recursive backtracker), using an explicit stack.
+
+    :param nrows: (int) Number of rows of the grid.
+    :param ncols: (int) Number of columns of the grid.
+    :param semilla: (int | np.random.Generator) Seed of the maze, or a generator to draw from.
+    :return: (Paredes) The walls of the maze.
+    """
+    rng = np.random.default_rng(semilla)
+    paredes = Paredes(nrows, ncols)
+    h, v = paredes.horizontales, paredes.verticales
+    total = nrows * ncols
+    ultima = ncols - 1
+    # One draw per carved edge; 12 is a multiple of 1, 2, 3 and 4, so the choice among the neighbours is uniform
+    azar = rng.integers(0, 12, size=total).tolist()
+    k = 0
+    visitada = bytearray(total)
+    inicio = int(rng.integers(total))
+    visitada[inicio] = 1
+    pila = [inicio]
+    while pila:
+        i = pila[-1]
+        c = i % ncols
+        opciones = []
+        if c and not visitada[i - 1]:
+            opciones.append(i - 1)
+        if c != ultima and not visitada[i + 1]:
+            opciones.append(i + 1)
+        if i >= ncols and not visitada[i - ncols]:
+            opciones.append(i - ncols)
+        if i + ncols < total and not visitada[i + ncols]:
+            opciones.append(i + ncols)
+        if not opciones:
+            pila.pop()
+            continue
+        j = opciones[azar[k] % len(opciones)]
+        k += 1
+        if j - i == ncols or i - j == ncols:  # Checked first, with one column i + 1 is below
+            v[min(i, j)] = 1
+        else:
+            a = min(i, j)
+            h[a - a // ncols] = 1
+        visitada[j] = 1
+        pila.append(j)
+    return paredes
+
+
+def kruskal(nrows: int, ncols: int, semilla=None):
+    """
+    Generate a perfect maze with the randomized Kruskal algorithm: the edges of the grid are visited in a random order
+    and every edge that joins two different trees of a union-find of the cells is opened.
+
+    The edges are not visited one by one in a Python loop. The tree of Kruskal is the minimum spanning tree of the grid
+    with the position of every edge in the random order as its weight, and with distinct weights that tree is unique,
+    so it is computed with vectorized rounds of Boruvka over the union-find array: in every round each tree opens its
+    lightest edge to another tree, and the trees joined by those edges are merged (see regiones.etiquetar). The maze
+    is exactly the one of the edge by edge algorithm with the same order, in O(log n) rounds.
+
+    :param nrows: (int) Number of rows of the grid.
+    :param ncols: (int) Number of columns of the grid.
+    :param semilla: (int | np.random.Generator) Seed of the maze, or a generator to draw from.
+    :return: (Paredes) The walls of the maze.
+    """
+    rng = np.random.default_rng(semilla)
+    paredes = Paredes(nrows, ncols)
+    total = nrows * ncols
+    celdas = np.arange(total, dtype=np.int64).reshape(nrows, ncols)
+    # The edges in the order of the buffers (horizontal and then vertical), so the id of an edge is its position in
+    # horizontales + verticales
+    horizontales, verticales = celdas[:, :-1].ravel(), celdas[:-1, :].ravel()
+    origen = np.concatenate((horizontales, verticales))
+    destino = np.concatenate((horizontales + 1, verticales + ncols))
+    m = origen.size
+    peso = np.empty(m, dtype=np.int64)
+    peso[rng.permutation(m)] = np.arange(m)  # Position of every edge in the random order
+    abiertas = np.zeros(m, dtype=np.uint8)
+
+    padre = np.arange(total, dtype=np.int64)  # Root of the tree of every cell
+    ids = np.arange(m, dtype=np.int64)
+    while ids.size:
+        raiz_o, raiz_d = padre[origen[ids]], padre[destino[ids]]
+        distintas = raiz_o != raiz_d
+        ids, raiz_o, raiz_d = ids[distintas], raiz_o[distintas], raiz_d[distintas]
+        if not ids.size:
+            break
+        # The lightest edge that leaves every tree
+        minimo = np.full(total, m, dtype=np.int64)
+        np.minimum.at(minimo, raiz_o, peso[ids])
+        np.minimum.at(minimo, raiz_d, peso[ids])
+        elegidas = ids[(minimo[raiz_o] == peso[ids]) | (minimo[raiz_d] == peso[ids])]
+        abiertas[elegidas] = 1
+        # Merge the trees joined by the chosen edges
+        raices = regiones.etiquetar(total, padre[origen[elegidas]], padre[destino[elegidas]])
+        padre = raices[padre]
+    paredes.horizontales[:] = abiertas[:len(paredes.horizontales)].tobytes()
+    paredes.verticales[:] = abiertas[len(paredes.horizontales):].tobytes()
+    return paredes
+
+
+def wilson(nrows: int, ncols: int, semilla=None, bloque: int = 1 << 16):
+    """
+    Generate a perfect maze with the Wilson algorithm. The tree starts with a random cell, and every cell out of the
+    tree starts a random walk until it hits the tree; the walk remembers only the last exit of every cell, which erases
+    its loops, and the loop-erased path is added to the tree. The maze is uniform among all the spanning trees.
+
+    :param nrows: (int) Number of rows of the grid.
+    :param ncols: (int) Number of columns of the grid.
+    :param semilla: (int | np.random.Generator) Seed of the maze, or a generator to draw from.
+    :param bloque: (int) Number of random directions drawn at once for the walks.
+    :return: (Paredes) The walls of the maze.
+    """
+    rng = np.random.default_rng(semilla)
+    paredes = Paredes(nrows, ncols)
+    h, v = paredes.horizontales, paredes.verticales
+    total = nrows * ncols
+    ultima = ncols - 1
+    en_arbol = bytearray(total)
+    siguiente = [0] * total  # Last exit of every cell in the current walk
+    en_arbol[int(rng.integers(total))] = 1
+    direcciones, k = [], 0
+    for s in rng.permutation(total).tolist():
+        i = s
+        while not en_arbol[i]:
+            # A direction that leaves the grid is drawn again, so the step is uniform among the neighbours
+            while True:
+                if k == len(direcciones):
+                    direcciones, k = rng.integers(0, 4, size=bloque).tolist(), 0
+                d = direcciones[k]
+                k += 1
+                if d == 0:
+                    if i % ncols != ultima:
+                        j = i + 1
+                        break
+                elif d == 1:
+                    if i % ncols:
+                        j = i - 1
+                        break
+                elif d == 2:
+                    if i + ncols < total:
+                        j = i + ncols
+                        break
+                elif i >= ncols:
+                    j = i - ncols
+                    break
+            siguiente[i] = j
+            i = j
+        # Add the loop-erased path to the tree
+        i = s
+        while not en_arbol[i]:
+            en_arbol[i] = 1
+            j = siguiente[i]
+            if j - i == ncols or i - j == ncols:  # Checked first, with one column i + 1 is below
+                v[min(i, j)] = 1
+            else:
+                a = min(i, j)
+                h[a - a // ncols] = 1
+            i = j
+    return paredes
+
+
+ALGORITMOS = {'backtracker': backtracker, 'kruskal': kruskal, 'wilson': wilson}
+
+
+def generar(algoritmo: str, nrows: int, ncols: int, semilla=None):
+    """
+    Generate a perfect maze with one of the algorithms of ALGORITMOS.
+
+    :param algoritmo: (str) 'backtracker', 'kruskal' or 'wilson'.
+    :param nrows: (int) Number of rows of the grid.
+    :param ncols: (int) Number of columns of the grid.
+    :param semilla: (int | np.random.Generator) Seed of the maze, or a generator to draw from.
+    :return: (Paredes) The walls of the maze.
+    """
+    if algoritmo not in ALGORITMOS:
+        raise ValueError(f"Unknown algorithm '{algoritmo}', use one of {', '.join(ALGORITMOS)}.")
+    return ALGORITMOS[algoritmo](nrows, ncols, semilla)
@@ -22,6 +22,10 @@ import tkinter as tk
 import os
 import json
 from globales import candado, cola
+import instrumentacion
+import formato_rutas
+import cuadros_empaquetados
+from grafo import GrafoSnapshot
 
 
 class Labyrinth:
@@ -35,6 +39,8 @@ class Labyrinth:
     ----------
     path : str
         The path to the JSON file that contains the labyrinth data.
+    queue : queue.Queue
+        The Queue the graphs are read from.
     list_tiles : list
         List to store the tiles.
     _list_edges : list
@@ -51,6 +57,10 @@ class Labyrinth:
         The length of each tile in pixels.
     canvas_sz : tuple
         The size of the canvas.
+    shade_costs : bool
+        If True, the background of each tile is shaded according to the traversal cost of its edges.
+    recorder : grabacion.Grabadora
+        If not None, every graph drawn from the Queue or the JSON file is recorded.
     window : tk.Tk
         The Tkinter window.
     canvas : tk.Canvas
@@ -58,7 +68,7 @@ class Labyrinth:
 
     Methods:
     -------
-    __init__(self, rows: int, columns: int, path=''):
+    __init__(self, rows: int, columns: int, path='', shade_costs=False):
         Initializes the Labyrinth object with the specified number of rows and columns.
     start(self):
         Start the Tkinter event loop.
@@ -70,10 +80,16 @@ class Labyrinth:
         Calculate the size of the canvas.
     update_maze(self, imprimir=True):
         Update the labyrinth based on the graph structure.
+    apply_graph(self, graph: dict):
+        Draw one graph: walls, cost shading, turtles and colored points.
     _check_walls(self, graph: dict):
         Check and update the walls of the labyrinth based on the graph structure.
+    _check_packed_walls(self, graph: dict):
+        Update the walls of the labyrinth from a packed frame, redrawing only the edges that changed.
     _update_border(self, vertex_o: int, vertex_i: int, state=False):
         Update the border of a tile in the labyrinth.
+    _shade_costs(self, graph: dict):
+        Shade the background of the tiles according to the traversal costs of the graph.
     get_tile(self, row, column):
         Get a specific tile from the list_tiles list.
     _mark_turtle(self, turtle_positions: dict):
@@ -88,7 +104,7 @@ class Labyrinth:
         Draw an edge (line) on the canvas.
     """
 
-    def __init__(self, rows: int, columns: int, path=''):
+    def __init__(self, rows: int, columns: int, path='', shade_costs=False, queue=None, recorder=None):
         """
         This method initializes the Labyrinth object with the specified number of rows and columns. It also sets up
         the Tkinter window and canvas for drawing the labyrinth, and schedules the update_maze method to be called
@@ -97,8 +113,16 @@ class Labyrinth:
         :param rows: (int) The number of rows in the labyrinth.
         :param columns: (int) The number of columns in the labyrinth.
         :param path: (str) The path to the JSON file that contains the labyrinth data. Default is an empty string.
+        :param shade_costs: (bool) If True, the background of each tile is shaded according to the traversal cost of
+                            its edges (graph key 'C'). Default is False.
+        :param queue: (queue.Queue) The Queue the graphs are read from. Default is the global queue 'cola'.
+        :param recorder: (grabacion.Grabadora) If given, every graph drawn from the Queue or the JSON file is recorded
+                         with the time it arrived, so the run can be replayed (see grabacion.Reproductor).
         """
         self.path = path  # Path to the JSON file
+        self.queue = cola if queue is None else queue  # Queue of graphs to draw
+        self.shade_costs = shade_costs  # Cost-shaded rendering mode
+        self.recorder = recorder  # Recorder of the graphs drawn
 
         self.list_tiles = list()  # List to store the tiles
         self._list_edges = list()  # List to store the edges IDs
@@ -110,6 +134,8 @@ class Labyrinth:
         self.tile_length = 50  # Length of each tile in pixels
         self.tiles_centers = list()  # List to store the center point of each tile
         self._tiles_marks = list()  # List to store the marks IDs of the tiles
+        self._packed_walls = None  # Wall bits of the last packed frame drawn
+        self._file_error = None  # Last error reading the JSON file, so it is only reported once
 
         self.canvas_sz = self._get_canvas_sz()  # Size of the canvas
         self.window = tk.Tk()  # Create a new Tkinter window
@@ -187,7 +213,10 @@ class Labyrinth:
         from the Queue, updates the walls of the labyrinth based on the graph, and marks the turtle's position.
 
         If the Queue is empty, it checks the JSON file for updates. If the JSON file exists, it reads the graph structure
-        from the file, updates the walls of the labyrinth based on the graph, and marks the turtle's position.
+        from the file, updates the walls of the labyrinth based on the graph, and marks the turtle's position. The file
+        is deleted once it has been decoded. If it cannot be decoded (a broken file, or a compact solution whose maze
+        is missing or does not match its hash), the error is reported, the frame is skipped and the file is kept, so it
+        is read again on the next call.
 
         If there are no updates in the Queue or the JSON file, it prints "Nothing to update.".
 
@@ -196,31 +225,45 @@ class Labyrinth:
         :param imprimir: (bool) A flag used to control the printing of the "Nothing to update." message. Default is True.
         :return: None
         """
+        if instrumentacion.activo:
+            instrumentacion.registrar('profundidad_cola', self.queue.qsize())
         # First check the pipe, if there's nothing there, check the file.
-        if not cola.empty():
+        if not self.queue.empty():
             with candado:
-                graph = cola.get()
+                graph = self.queue.get()
             imprimir = True
             if __name__ == '__main__':
                 print('The graph structure has been updated from Queue.')
-            self._check_walls(graph)
-            self._mark_turtle(graph['turtle'])
-            self._mark_tiles(graph['colors'])
+            if self.recorder is not None:
+                self.recorder.registrar(graph)
+            self.apply_graph(graph)
 
         else:
             # read json file, if it does not exist, do nothing
+            graph = None
             if os.path.exists(self.path):
                 with candado:
-                    with open(self.path, 'r') as f:
-                        graph = json.load(f)
-                    f.close()
-                    os.remove(self.path)
+                    try:
+                        with open(self.path, 'r') as f:
+                            graph = json.load(f)
+                        instrumentacion.bytes_archivo('bytes_leidos', self.path)
+                        if formato_rutas.es_compacta(graph):  # Compact solution file, the maze is referenced by hash
+                            graph = formato_rutas.expandir(graph)
+                    except (OSError, ValueError) as error:
+                        graph = None
+                        if str(error) != self._file_error:
+                            print(f'The graph structure in {self.path} could not be read: {error}')
+                            self._file_error = str(error)
+                    else:
+                        os.remove(self.path)
+                        self._file_error = None
+            if graph is not None:
                 imprimir = True
                 if __name__ == '__main__':
                     print('The graph structure has been updated from file.')
-                self._check_walls(graph)
-                self._mark_turtle(graph['turtle'])
-                self._mark_tiles(graph['colors'])
+                if self.recorder is not None:
+                    self.recorder.registrar(graph)
+                self.apply_graph(graph)
 
         if imprimir:
             if __name__ == '__main__':
@@ -229,6 +272,23 @@ class Labyrinth:
 
         self.canvas.after(10, self.update_maze, imprimir)
 
+    def apply_graph(self, graph: dict):
+        """
+        Draw one graph on the labyrinth: the walls, the shading of the costs (if enabled), the turtles and the colored
+        points. It is used by update_maze for the graphs of the Queue and the JSON file, and it can be called directly
+        to draw a graph that does not come through them (see grabacion.Reproductor.en_laberinto).
+
+        :param graph: (dict) The graph, a snapshot of a Grafo or a packed frame.
+        :return: None
+        """
+        with instrumentacion.temporizador('redibujo'):
+            self._check_walls(graph)
+            if self.shade_costs:
+                self._shade_costs(graph)
+            self._mark_turtle(graph['turtle'])
+            self._mark_tiles(graph['colors'])
+        instrumentacion.contar('cuadros_aplicados')
+
     def _mark_tiles(self, colors: dict):
         """
         Draw a node (circle) on the canvas for each tile in the labyrinth.
@@ -253,12 +313,14 @@ class Labyrinth:
         """
          Check and update the walls of the labyrinth based on the graph structure.
 
-         This method iterates over the vertices in the graph. For each pair of vertices, it checks if there is an edge
-         between them in the graph. If there is an edge and its value is 0, it means there is a wall between the
-         vertices in the labyrinth, so it calls the _update_border method to update the border of the tile at the
-         position of the first vertex to exist. If the value of the edge is not 0, it means there is no wall between the
-         vertices in the labyrinth, so it calls the _update_border method to update the border of the tile at the
-         position of the first vertex to not exist.
+         This method iterates once over the edges in the graph, parsing only the vertices of every key of 'E'. If the
+         value of an edge is not 0, it means there is no wall between the vertices in the labyrinth, so it calls the
+         _update_border method to update the borders of the tiles at the positions of both vertices to not exist. The
+         edges whose value is 0 are walls, and their borders are set to exist after the open ones, so an edge given in
+         both directions is a wall if either of them is 0.
+
+         A packed frame (see cuadros_empaquetados) has no 'V' and 'E', only the wall bits; it is drawn by
+         _check_packed_walls.
 
          :param graph: (dict) The graph structure of the labyrinth. It is a dictionary with two keys: 'V' and 'E'.
                        'V' maps to a dictionary where each key is a vertex and the value is a list of vertices adjacent to the key.
@@ -266,15 +328,50 @@ class Labyrinth:
                        between the vertices.
          :return: None
          """
-        vertex_list = graph['V']
-        edges_list = graph['E']
+        if cuadros_empaquetados.es_empaquetado(graph):
+            self._check_packed_walls(graph)
+            return
+        self._packed_walls = None  # The next packed frame is drawn whole
         # vertex_o is the origin vertex, vertex_i is the destination vertex
-        for vertex_o in vertex_list:
-            for vertex_i in vertex_list[vertex_o]:
-                if edges_list.get(f"({vertex_o}, {vertex_i})") == 0 or edges_list.get(f"({vertex_i}, {vertex_o})") == 0:
-                    self._update_border(int(vertex_o), int(vertex_i), state=True)
-                else:
-                    self._update_border(int(vertex_o), int(vertex_i))
+        if isinstance(graph, GrafoSnapshot):
+            # A snapshot of a Grafo (see Grafo.send_graph) gives its edges without building E
+            for vertex_o, vertex_i, open_edge in zip(*graph.edge_arrays()):
+                self._update_border(vertex_o, vertex_i, state=not open_edge)
+                self._update_border(vertex_i, vertex_o, state=not open_edge)
+            return
+        walls = []
+        for edge, weight in graph['E'].items():
+            if weight == 0:
+                walls.append(edge)
+                continue
+            vertex_o, vertex_i = edge[1:-1].split(', ')
+            vertex_o, vertex_i = int(vertex_o), int(vertex_i)
+            self._update_border(vertex_o, vertex_i)
+            self._update_border(vertex_i, vertex_o)
+        for edge in walls:
+            vertex_o, vertex_i = edge[1:-1].split(', ')
+            vertex_o, vertex_i = int(vertex_o), int(vertex_i)
+            self._update_border(vertex_o, vertex_i, state=True)
+            self._update_border(vertex_i, vertex_o, state=True)
+
+    def _check_packed_walls(self, graph: dict):
+        """
+        Update the walls of the labyrinth from a packed frame.
+
+        Only the edges whose wall bit changed since the last packed frame are redrawn. The first packed frame, or the
+        first one after a graph, is drawn whole.
+
+        :param graph: (dict) The packed frame.
+        :return: None
+        """
+        if (graph['filas'], graph['columnas']) != (self.rows, self.columns):
+            raise ValueError(f"The packed frame is {graph['filas']}x{graph['columnas']}, "
+                             f"the labyrinth is {self.rows}x{self.columns}.")
+        for vertex_o, vertex_i, open_edge in cuadros_empaquetados.cambios(self._packed_walls, graph['paredes'],
+                                                                           self.rows, self.columns):
+            self._update_border(vertex_o, vertex_i, state=not open_edge)
+            self._update_border(vertex_i, vertex_o, state=not open_edge)
+        self._packed_walls = graph['paredes']
 
     def _update_border(self, vertex_o: int, vertex_i: int, state=False):
         """
@@ -303,6 +400,30 @@ class Labyrinth:
         tile = self.get_tile(row_o, col_o)
         tile.update_border_visualization(border_id, state=state)
 
+    def _shade_costs(self, graph: dict):
+        """
+        Shade the background of the tiles according to the traversal costs of the graph.
+
+        The cost of a tile is the highest traversal cost of its edges (graph key 'C', 1 for the edges not listed).
+        Tiles with cost 1 keep the default light blue background and the most expensive tiles of the graph are drawn
+        in brown, with a linear gradient in between.
+
+        :param graph: (dict) The graph structure of the labyrinth.
+        :return: None
+        """
+        costs = [1] * len(self.list_tiles)
+        for edge, cost in graph.get('C', {}).items():
+            vertex_o, vertex_i = edge[1:-1].split(', ')
+            for vertex in (int(vertex_o), int(vertex_i)):
+                if vertex < len(costs) and cost > costs[vertex]:
+                    costs[vertex] = cost
+        max_cost = max(costs, default=1)
+        light, dark = (173, 216, 230), (139, 69, 19)  # lightblue and saddlebrown
+        for tile, cost in zip(self.list_tiles, costs):
+            t = (cost - 1) / (max_cost - 1) if max_cost > 1 else 0
+            color = tuple(round(a + (b - a) * t) for a, b in zip(light, dark))
+            tile.update_background('#%02x%02x%02x' % color)
+
     def get_tile(self, row, column):
         """
         Get a specific tile from the list_tiles list.
@@ -326,13 +447,22 @@ class Labyrinth:
 
         :param turtle_positions: (dict) A dictionary where each key is a vertex and the value is the vertex that the turtle
                                   is facing towards. If the value is 'f', it means the turtle is in the last node
-                                  and facing up.
+                                  and facing up. It can also be the list of routes of a compact solution file (see
+                                  formato_rutas), which is decoded cell by cell.
 
          :return: None
          """
         for tile in self.list_tiles:
             tile.change_turtle_state(erase=True)
 
+        if isinstance(turtle_positions, list):
+            # Compact routes: every cell of every route, with the direction towards the next cell
+            for vertex, direction in formato_rutas.pasos(turtle_positions, self.columns):
+                tile = self.get_tile(*divmod(vertex, self.columns))
+                tile.rotate_turtle(direction)
+                tile.change_turtle_state(erase=False)
+            return
+
         for vertex_o, vertex_i in turtle_positions.items():
             if __name__ == '__main__':
                 print(f"Path: {vertex_o} -> {vertex_i}")
@@ -378,23 +508,24 @@ class Labyrinth:
         # Delete the previous graph drawn on the canvas
         self.delete_graph()
         radius = self.tile_length // 2 - self.tile_length // 4
-        # Iterate over the edges in the graph
-        for edge in graph['E']:
-            # Check if the edge exists
-            if graph['E'][edge] != 0:
-                vertex_o, vertex_i = edge[1:-1].split(', ')  # Split the edge into origin and destination vertices
-                vertex_o, vertex_i = int(vertex_o), int(vertex_i)
-                center_o = self.tiles_centers[vertex_o]
-                center_i = self.tiles_centers[vertex_i]
-
-                # Draw the edge on the canvas
-                self._list_edges.append(self._draw_edge(center_o, center_i))
-                # Check if the origin and destination vertices have a specified color
-                color_o = graph['colors'][str(vertex_o)] if graph['colors'].get(str(vertex_o)) else 'coral'
-
-                self._list_nodes.append(self._draw_node(center_o, radius, color=color_o))
-                color_i = graph['colors'][str(vertex_i)] if graph['colors'].get(str(vertex_i)) else 'coral'
-                self._list_nodes.append(self._draw_node(center_i, radius, color=color_i))
+        # Iterate over the edges in the graph that exist (without a wall). A snapshot of a Grafo gives them without
+        # building E; the keys of a plain graph are parsed as they are walked
+        if isinstance(graph, GrafoSnapshot):
+            edges = zip(*graph.open_edges())
+        else:
+            edges = (map(int, edge[1:-1].split(', ')) for edge, weight in graph['E'].items() if weight != 0)
+        for vertex_o, vertex_i in edges:
+            center_o = self.tiles_centers[vertex_o]
+            center_i = self.tiles_centers[vertex_i]
+
+            # Draw the edge on the canvas
+            self._list_edges.append(self._draw_edge(center_o, center_i))
+            # Check if the origin and destination vertices have a specified color
+            color_o = graph['colors'][str(vertex_o)] if graph['colors'].get(str(vertex_o)) else 'coral'
+
+            self._list_nodes.append(self._draw_node(center_o, radius, color=color_o))
+            color_i = graph['colors'][str(vertex_i)] if graph['colors'].get(str(vertex_i)) else 'coral'
+            self._list_nodes.append(self._draw_node(center_i, radius, color=color_i))
 
     def delete_graph(self):
         """
@@ -451,6 +582,8 @@ class Labyrinth:
         This method stops the Tkinter event loop and destroys the window. It should be called to close the application
         properly and release all the resources.
         """
+        # The graphs still waiting in the Queue are never drawn
+        instrumentacion.contar('cuadros_descartados', self.queue.qsize())
         self.window.quit()  # Stop the Tkinter event loop
         self.window.destroy()  # Destroy the Tkinter window
 
@@ -0,0 +1,291 @@
+"""
+This module implements the engine used to generate the scenarios of the labyrinth project.
+
+A scenario is a grid graph (a Grafo, 15x20 by default) with a few pieces ('O', 'I' and 'T' shapes enclosed by walls),
+a set of turtles, an exit position marked with 'f' and a set of colored points the turtles have to visit.
+
+The pieces are described by (row, column) offset templates, so they do not depend on the size of the board. Whether a
+piece fits at an anchor is checked with a bitmap of the cells already touched by other pieces, at a cost proportional
+to the size of the piece.
+
+All the random decisions are taken with an explicit numpy.random.Generator, so the same seed always produces the same
+scenario, byte by byte once it is saved as JSON. This allows caching and benchmarking the scenarios reproducibly.
+
+The anchor of each piece is first searched among a bounded batch of random anchors. If none of them fits, the valid
+anchors are computed exactly with vectorized masks of the free cells and sampled from: when a piece type does not fit
+anywhere, the other types are tried, and when no type fits, the placement stops. There is no unbounded rejection loop.
+
+The connected regions of the grid are labeled once, when the pieces are placed (see regiones). The turtles, the exit
+and the colored points are then sampled at once, without replacement, among the free interior cells of the main
+region (see muestrear_alcanzables), so every one of them can reach every other one and the solvers never search for an
+unreachable target. The enclosed cells of the scenario are the cells out of the main region, from the same labels.
+"""
+
+import numpy as np
+from grafo import Grafo
+import regiones
+
+NROWS, NCOLS = 15, 20  # Default size of the board
+TIPOS = ('O', 'I', 'T')  # Types of pieces
+COLORES_PRIORIDAD = ('red', 'blue', 'green')  # Colors of the points, in priority order
+
+# Cells of each piece as (row, column) offsets from its anchor (its top-left cell)
+PLANTILLAS = {
+    'O': ((0, 0), (0, 1), (1, 0), (1, 1)),  # 2x2 square
+    'I': ((0, 0), (1, 0), (2, 0), (3, 0)),  # 4x1 vertical bar
+    'T': ((0, 0), (1, 0), (2, 0), (1, 1)),  # Vertical bar with a tooth on the right
+}
+_VECINOS = ((0, -1), (0, 1), (-1, 0), (1, 0))  # Left, right, up, down
+
+
+class Plantilla:
+    """
+    Offset template of a piece, independent of the size of the board.
+
+    The walls of a piece are all the edges between one of its cells and a neighbouring cell outside the piece. The
+    cells touched by a piece are its own cells and those outside neighbours.
+
+    Attributes:
+    ----------
+    celdas : tuple
+        The cells of the piece as (row, column) offsets from the anchor.
+    paredes : tuple
+        The walls of the piece as pairs of (row, column) offsets: (inside cell, outside cell).
+    tocadas : tuple
+        The (row, column) offsets of every cell touched by the piece.
+    extension : tuple
+        The minimum and maximum row and column offsets of the touched cells: (min_row, max_row, min_col, max_col).
+    """
+
+    def __init__(self, celdas: tuple):
+        self.celdas = tuple(celdas)
+        propias = set(self.celdas)
+        self.paredes = tuple(((r, c), (r + dr, c + dc)) for r, c in self.celdas for dr, dc in _VECINOS
+                             if (r + dr, c + dc) not in propias)
+        self.tocadas = tuple(sorted(propias | {b for _, b in self.paredes}))
+        filas = [r for r, _ in self.tocadas]
+        columnas = [c for _, c in self.tocadas]
+        self.extension = (min(filas), max(filas), min(columnas), max(columnas))
+
+    def cabe(self, fila: int, columna: int, nrows: int, ncols: int):
+        """
+        Return True if every cell touched by the piece anchored at (fila, columna) is inside the board.
+        """
+        fmin, fmax, cmin, cmax = self.extension
+        return 0 <= fila + fmin and fila + fmax < nrows and 0 <= columna + cmin and columna + cmax < ncols
+
+
+_PLANTILLAS = {tipo: Plantilla(celdas) for tipo, celdas in PLANTILLAS.items()}
+
+
+def aristas_pieza(tipo: str, i: int, ncols: int = NCOLS):
+    """
+    Return the walls that enclose a piece anchored at the cell i.
+
+    :param tipo: (str) Type of the piece: 'O' (2x2 square), 'I' (4x1 vertical bar) or 'T'.
+    :param i: (int) The anchor cell of the piece (its top-left cell).
+    :param ncols: (int) Number of columns of the board.
+    :return: (list) The walls of the piece as pairs of adjacent cells.
+    """
+    if tipo not in _PLANTILLAS:
+        raise ValueError(f"Unknown piece type '{tipo}'. It must be one of {TIPOS}.")
+    return [(i + a[0] * ncols + a[1], i + b[0] * ncols + b[1]) for a, b in _PLANTILLAS[tipo].paredes]
+
+
+def mascara_interior(nrows: int = NROWS, ncols: int = NCOLS):
+    """
+    Return the interior cells of the board, where the turtles and the points are placed: every cell except the first
+    and last rows, the first column and the two last columns.
+
+    :return: (np.ndarray) A boolean mask with one element per cell.
+    """
+    interior = np.ones((nrows, ncols), dtype=bool)
+    interior[0, :] = interior[-1, :] = False
+    interior[:, 0] = interior[:, -2:] = False
+    return interior.ravel()
+
+
+def anclas_validas(libre: np.ndarray, tipo: str, nrows: int = NROWS, ncols: int = NCOLS):
+    """
+    Compute, for every cell at once, if a piece of the given type can be anchored there.
+
+    A piece fits at an anchor if every cell touched by the piece is inside the board and free.
+
+    :param libre: (np.ndarray) Boolean mask of the free cells.
+    :param tipo: (str) Type of the piece.
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :return: (np.ndarray) Boolean mask of the valid anchors.
+    """
+    plantilla = _PLANTILLAS[tipo]
+    libre = libre.reshape(nrows, ncols)
+    fmin, fmax, cmin, cmax = plantilla.extension
+    validas = np.zeros((nrows, ncols), dtype=bool)
+    # Anchors for which the whole piece is inside the board
+    filas = slice(-fmin, nrows - fmax)
+    columnas = slice(-cmin, ncols - cmax)
+    validas[filas, columnas] = True
+    for dr, dc in plantilla.tocadas:
+        validas[filas, columnas] &= libre[filas.start + dr:filas.stop + dr, columnas.start + dc:columnas.stop + dc]
+    return validas.ravel()
+
+
+def _colocar(ocupado: bytearray, tipo: str, fila: int, columna: int, nrows: int, ncols: int):
+    """
+    Return True if a piece fits at the given anchor. Only the cells touched by the piece are checked, so the cost
+    is proportional to the size of the piece.
+    """
+    plantilla = _PLANTILLAS[tipo]
+    if not plantilla.cabe(fila, columna, nrows, ncols):
+        return False
+    base = fila * ncols + columna
+    for dr, dc in plantilla.tocadas:
+        if ocupado[base + dr * ncols + dc]:
+            return False
+    return True
+
+
+def _asignar_terreno(grafo: Grafo, rng: np.random.Generator, terreno: float, costo_maximo: int, total: int):
+    """
+    Mark a random fraction of the cells as slow terrain and set the traversal cost of their open edges.
+    """
+    costos = np.ones(total, dtype=np.int64)
+    lentas = np.flatnonzero(rng.random(total) < terreno)
+    costos[lentas] = rng.integers(2, costo_maximo + 1, size=lentas.size)
+    indice = grafo.index()  # The open edges of every cell, without formatting their keys
+    for celda in lentas.tolist():
+        for vecino, arista in indice.incident.get(celda, ()):
+            if indice.flags[arista]:
+                grafo.C[indice.keys[arista]] = int(max(costos[celda], costos[vecino]))
+
+
+def etiquetas_rejilla(paredes: set, nrows: int, ncols: int):
+    """
+    Label the connected regions of a grid whose only walls are the given ones.
+
+    :param paredes: (set) The walls as pairs (lower cell, higher cell).
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :return: (np.ndarray) The label of every cell (see regiones.etiquetar).
+    """
+    total = nrows * ncols
+    celdas = np.arange(total, dtype=np.int64).reshape(nrows, ncols)
+    horizontales, verticales = celdas[:, :-1].ravel(), celdas[:-1, :].ravel()
+    origen = np.concatenate((horizontales, verticales))
+    destino = np.concatenate((horizontales + 1, verticales + ncols))
+    if paredes:
+        cerradas = np.array(sorted(paredes), dtype=np.int64)
+        abiertas = ~np.isin(origen * total + destino, cerradas[:, 0] * total + cerradas[:, 1])
+        origen, destino = origen[abiertas], destino[abiertas]
+    return regiones.etiquetar(total, origen, destino)
+
+
+def muestrear_alcanzables(etiquetas: np.ndarray, n: int, rng: np.random.Generator, permitidas: np.ndarray = None):
+    """
+    Sample distinct cells of the main region of a grid, all reachable from each other.
+
+    The candidates are computed once with a vectorized mask of the labels, and the cells are drawn without replacement
+    in a single call, so there is no rejection loop and the cost of the draw grows with n, not with the number of
+    attempts (thousands of agents are placed as fast as a few).
+
+    :param etiquetas: (np.ndarray) The labels of the cells (see regiones.etiquetar).
+    :param n: (int) Number of cells. If the main region has fewer candidates, all of them are returned.
+    :param rng: (np.random.Generator) The generator to draw from.
+    :param permitidas: (np.ndarray) Optional boolean mask of the cells that can be chosen.
+    :return: (list) The cells, in random order.
+    """
+    mascara = etiquetas == regiones.componente_principal(etiquetas)
+    if permitidas is not None:
+        mascara &= permitidas
+    candidatas = np.flatnonzero(mascara)
+    return rng.choice(candidatas, size=min(n, candidatas.size), replace=False).tolist()
+
+
+def generar_escenario(n_tortugas: int, semilla=None, prioridad=False, n_piezas=7, nrows=NROWS, ncols=NCOLS,
+                      intentos=64, terreno=0.0, costo_maximo=5):
+    """
+    Generate a scenario.
+
+    :param n_tortugas: (int) Number of turtles.
+    :param semilla: (int | np.random.Generator) Seed of the scenario, or a generator to draw from. If None, the
+                    scenario is not reproducible.
+    :param prioridad: (bool) If True, n_tortugas + 1 points of each priority color (red, blue and green) are placed
+                      in random order. If False, only n_tortugas + 1 red points are placed.
+    :param n_piezas: (int) Maximum number of pieces.
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :param intentos: (int) Number of random anchors checked for each piece before computing the exact mask of valid
+                     anchors. On sparse boards a random anchor almost always fits, so the mask is rarely needed.
+    :param terreno: (float) Fraction of slow cells. Each slow cell gets a random cost between 2 and costo_maximo, and
+                    every open edge gets the highest cost of its two cells as traversal cost. Default is 0 (every
+                    edge costs 1, and no random numbers are drawn for the terrain).
+    :param costo_maximo: (int) The highest cost of a slow cell.
+    :return: (tuple) The graph of the scenario (Grafo) and the list of enclosed cells.
+    """
+    rng = np.random.default_rng(semilla)
+    grafo = Grafo()
+    total = nrows * ncols
+
+    ocupado = bytearray(total)  # Cells touched by any piece
+    paredes = set()  # Walls of the pieces as (lower cell, higher cell)
+    origen, destino = [], []  # Walls of the pieces in the order they are placed
+
+    # Place the pieces. A batch of random anchors is checked first, in O(piece size) each, and only if none of them
+    # fits the valid anchors are computed exactly with a vectorized mask
+    for _ in range(n_piezas):
+        tipos_lote = rng.integers(len(TIPOS), size=intentos).tolist()
+        anclas_lote = rng.integers(total, size=intentos).tolist()
+        for t, i in zip(tipos_lote, anclas_lote):
+            tipo = TIPOS[t]
+            if _colocar(ocupado, tipo, i // ncols, i % ncols, nrows, ncols):
+                break
+        else:
+            libre = np.frombuffer(bytes(ocupado), dtype=np.uint8) == 0
+            tipos = list(TIPOS)
+            while tipos:
+                tipo = tipos.pop(rng.integers(len(tipos)))
+                candidatas = np.flatnonzero(anclas_validas(libre, tipo, nrows, ncols))
+                if candidatas.size:
+                    break
+            else:
+                break  # No piece fits anywhere
+            i = int(rng.choice(candidatas))
+        for a, b in aristas_pieza(tipo, i, ncols):
+            origen.append(a)
+            destino.append(b)
+            paredes.add((a, b) if a < b else (b, a))
+        for dr, dc in _PLANTILLAS[tipo].tocadas:
+            ocupado[i + dr * ncols + dc] = 1
+
+    # The walls of the pieces go first, and every other edge of the grid is added as an open edge (add_edges skips the
+    # edges that already exist)
+    grafo.add_edges(origen, destino, 0)
+    grafo.add_edges(*Grafo.grid_edges(nrows, ncols), 1)
+
+    # Label the regions once, and sample the turtles, the exit and the colored points at once, without replacement,
+    # among the free interior cells of the main region
+    etiquetas = etiquetas_rejilla(paredes, nrows, ncols)
+    n_puntos = (n_tortugas + 1) * (len(COLORES_PRIORIDAD) if prioridad else 1)
+    libre = np.frombuffer(bytes(ocupado), dtype=np.uint8) == 0
+    posiciones = muestrear_alcanzables(etiquetas, n_tortugas + 1 + n_puntos, rng, mascara_interior(nrows, ncols) & libre)
+    tortugas, salida, puntos = posiciones[:n_tortugas], posiciones[n_tortugas:n_tortugas + 1], posiciones[n_tortugas + 1:]
+
+    # Every turtle faces one of its four neighbours
+    pasos = (-1, 1, ncols, -ncols)
+    direcciones = rng.integers(len(pasos), size=len(tortugas)).tolist()
+    turtle_list = {pos: pos + pasos[d] for pos, d in zip(tortugas, direcciones)}
+    for pos in salida:
+        turtle_list[pos] = 'f'
+    grafo.turtle = turtle_list
+
+    if prioridad:
+        colores = rng.permutation(np.repeat(COLORES_PRIORIDAD, n_tortugas + 1)).tolist()
+    else:
+        colores = ['red'] * n_puntos
+    grafo.colors = dict(zip(puntos, colores))
+
+    if terreno > 0:
+        _asignar_terreno(grafo, rng, terreno, costo_maximo, total)
+
+    # The enclosed cells are exactly the cells outside the main region
+    return grafo, regiones.cuadros_encerrados(etiquetas)
@@ -0,0 +1,444 @@
+"""
+This module implements the routing core shared by the solvers of the labyrinth project.
+
+The solvers search paths on the adjacency dictionary returned by cargar_grafo ({node: [(neighbour, weight), ...]},
+open edges only). Before, every relaxation checked if the neighbour was in the list of forbidden positions (a linear
+search) and validated it against the borders of the board with a divmod. Here those rules are compiled once per maze
+in a passability mask, a bytearray with one byte per cell, so the inner loop of the search does a single indexed read.
+
+The positions blocked by other turtles change between searches, so they are applied as an overlay on top of the mask:
+only the cells blocked by the previous search and by the current one are touched.
+
+The distance and predecessor arrays of the searches live in a workspace (EspacioTrabajo) that is allocated once per
+maze and reset in O(1) with generation stamps, so the T x P searches of a scenario do not allocate per search.
+
+Besides the heap based dijkstra, there are two engines for small integer edge weights where every expansion is O(1):
+bfs_01, a deque based 0-1 BFS for weights 0 and 1 (the open corridors of the generated mazes), and dial, a bucket
+queue for weights up to LIMITE_DIAL. elegir_motor picks one of them from the largest weight of the maze. All the
+engines break ties between paths of the same length in the same way as the heap (by the distance and then the number
+of the predecessor), so with positive weights they return the very same paths.
+
+The weights of the adjacency dictionary are traversal costs (walls are not edges at all), so weighted terrain is
+handled by the same engines. For long queries on weighted terrain there is also a_estrella, guided by a cost aware
+Manhattan heuristic.
+"""
+
+from collections import deque
+from functools import partial
+import instrumentacion
+
+LIMITE_DIAL = 64  # Largest integer edge weight for which the bucket queue (Dial) is used instead of the heap
+
+
+class Transitabilidad:
+    """
+    Passability mask of a maze.
+
+    A cell is passable if it is inside the board, it is not in the first or last column (except the last cell of the
+    board, which is the exit corner) and it is not forbidden (enclosed). These are the same rules as es_valida and
+    the forbidden positions of the solvers.
+
+    Attributes:
+    ----------
+    nrows : int
+        Number of rows of the board.
+    ncols : int
+        Number of columns of the board.
+    base : bytearray
+        The static mask: 1 for the passable cells, 0 otherwise.
+    paso : bytearray
+        The static mask with the overlay of the blocked positions applied.
+    """
+
+    def __init__(self, nrows: int, ncols: int, posiciones_prohibidas=(), n: int = 0):
+        """
+        Compile the passability mask of a maze.
+
+        :param nrows: (int) Number of rows of the board.
+        :param ncols: (int) Number of columns of the board.
+        :param posiciones_prohibidas: (iterable) The forbidden (enclosed) positions.
+        :param n: (int) Number of nodes of the graph, if it has nodes beyond the board. These are never passable.
+        """
+        self.nrows, self.ncols = nrows, ncols
+        total = nrows * ncols
+        base = bytearray(b'\x01') * total + bytearray(max(n - total, 0))
+        # First and last columns (the last cell of the board stays passable)
+        base[0:total:ncols] = bytes(nrows)
+        base[ncols - 1:total:ncols] = bytes(nrows)
+        if total:
+            base[total - 1] = 1
+        for pos in posiciones_prohibidas:
+            if 0 <= pos < len(base):
+                base[pos] = 0
+        self.base = base
+        self.paso = bytearray(base)
+        self._superpuestas = []  # Cells cleared in 'paso' by the current overlay
+
+    def __len__(self):
+        return len(self.base)
+
+    def transitable(self, pos: int):
+        """
+        Return True if the cell is passable according to the static mask.
+        """
+        return 0 <= pos < len(self.base) and self.base[pos] == 1
+
+    def superponer(self, posiciones_bloqueadas, objetivo=None):
+        """
+        Apply the blocked positions as an overlay and return the combined mask.
+
+        The overlay of the previous call is removed first. The target of the search is never blocked.
+
+        :param posiciones_bloqueadas: (iterable) The positions blocked by other turtles.
+        :param objetivo: (int) The target of the search.
+        :return: (bytearray) The combined mask: 1 for the cells a path can enter, 0 otherwise.
+        """
+        paso, base = self.paso, self.base
+        for pos in self._superpuestas:
+            paso[pos] = base[pos]
+        n = len(paso)
+        self._superpuestas = [pos for pos in posiciones_bloqueadas if pos != objetivo and 0 <= pos < n]
+        for pos in self._superpuestas:
+            paso[pos] = 0
+        return paso
+
+
+def como_transitabilidad(posiciones_prohibidas, nrows: int, ncols: int, grafo: dict = None):
+    """
+    Return the passability mask for the given forbidden positions. If they already are a Transitabilidad, it is
+    returned as is, so the mask is only compiled once per maze.
+    """
+    if isinstance(posiciones_prohibidas, Transitabilidad):
+        return posiciones_prohibidas
+    n = max(grafo, default=-1) + 1 if grafo else 0
+    return Transitabilidad(nrows, ncols, posiciones_prohibidas, n)
+
+
+class EspacioTrabajo:
+    """
+    Reusable workspace for the searches on a maze.
+
+    It owns the distance and predecessor arrays and the heap of the searches, preallocated once per maze. Instead of
+    clearing the arrays before every search, each search gets a new generation number and an entry is only valid if
+    its stamp is the current generation, so starting a search costs O(1) and repeated queries on the same maze
+    allocate nothing proportional to its size.
+
+    Attributes:
+    ----------
+    n : int
+        Number of cells the workspace can hold.
+    distancias : list
+        The distance of every cell in the search of its stamp.
+    anteriores : list
+        The predecessor of every cell in the search of its stamp (-1 for the start).
+    sellos : list
+        The generation in which the entry of every cell was written.
+    generacion : int
+        The generation of the current search.
+    cola : list
+        The heap of the current search.
+    """
+
+    def __init__(self, n: int):
+        """
+        :param n: (int) Number of cells of the maze (the largest cell plus one).
+        """
+        self.n = n
+        self.distancias = [0] * n
+        self.anteriores = [-1] * n
+        self.sellos = [0] * n
+        self.generacion = 0
+        self.cola = []
+
+    def reiniciar(self):
+        """
+        Start a new search: every entry becomes stale and the heap is emptied.
+
+        :return: (int) The generation of the new search.
+        """
+        self.generacion += 1
+        self.cola.clear()
+        return self.generacion
+
+    def camino(self, objetivo: int):
+        """
+        Return the path of the current search from its start to the given cell, and its length. If the cell was not
+        reached, the path is [objetivo] and the length is infinite.
+        """
+        if self.sellos[objetivo] != self.generacion:
+            return [objetivo], float('inf')
+        anteriores = self.anteriores
+        camino = []
+        nodo = objetivo
+        while nodo != -1:
+            camino.append(nodo)
+            nodo = anteriores[nodo]
+        camino.reverse()
+        return camino, self.distancias[objetivo]
+
+
+def dijkstra(grafo: dict, inicio: int, objetivo: int, mascara: Transitabilidad, posiciones_bloqueadas=(),
+             etiquetas=None, espacio: EspacioTrabajo = None):
+    """
+    Find the shortest path between two cells.
+
+    :param grafo: (dict) The adjacency dictionary of the maze.
+    :param inicio: (int) The start cell.
+    :param objetivo: (int) The target cell.
+    :param mascara: (Transitabilidad) The passability mask of the maze.
+    :param posiciones_bloqueadas: (iterable) The positions blocked by other turtles. The target is never blocked.
+    :param etiquetas: (np.ndarray) Optional labels of the regions of the passable cells (see regiones). If the start
+                      is passable and the labels differ, the target is unreachable and no search is done.
+    :param espacio: (EspacioTrabajo) The workspace of the maze. If None, a new one is allocated for this search.
+    :return: (tuple) The path as a list of cells from inicio to objetivo, and its length. If the target is
+             unreachable, the path is [objetivo] and the length is infinite.
+    """
+    if etiquetas is not None and etiquetas[inicio] != etiquetas[objetivo] and mascara.transitable(inicio):
+        return [objetivo], float('inf')
+    if espacio is None:
+        espacio = EspacioTrabajo(len(mascara))
+
+    paso = mascara.superponer(posiciones_bloqueadas, objetivo)
+    heappush, heappop = instrumentacion.operaciones_heap()
+    generacion = espacio.reiniciar()
+    distancias, anteriores, sellos, cola = espacio.distancias, espacio.anteriores, espacio.sellos, espacio.cola
+    distancias[inicio], anteriores[inicio], sellos[inicio] = 0, -1, generacion
+    cola.append((0, inicio))
+
+    while cola:
+        distancia_actual, nodo_actual = heappop(cola)
+
+        if nodo_actual == objetivo:
+            break
+
+        for vecino, peso in grafo[nodo_actual]:
+            if not paso[vecino]:
+                continue
+            distancia = distancia_actual + peso
+            if sellos[vecino] != generacion:
+                sellos[vecino] = generacion
+            elif distancia >= distancias[vecino]:
+                continue
+            distancias[vecino] = distancia
+            anteriores[vecino] = nodo_actual
+            heappush(cola, (distancia, vecino))
+
+    return espacio.camino(objetivo)
+
+
+def _desempatar(distancias, anteriores, vecino, distancia_actual, nodo_actual):
+    """
+    Called when a cell is reached again with the same distance through an edge of positive weight. Keep as
+    predecessor the one the heap based dijkstra would have expanded first: the one with the smallest distance and then
+    the smallest number. Edges of weight 0 never replace the predecessor, which could otherwise close a cycle.
+    """
+    anterior = anteriores[vecino]
+    if (distancia_actual, nodo_actual) < (distancias[anterior], anterior):
+        anteriores[vecino] = nodo_actual
+
+
+def bfs_01(grafo: dict, inicio: int, objetivo: int, mascara: Transitabilidad, posiciones_bloqueadas=(),
+           etiquetas=None, espacio: EspacioTrabajo = None):
+    """
+    Find the shortest path between two cells of a maze whose edge weights are 0 or 1, with a deque: the cells reached
+    through an edge of weight 0 are pushed at the front and the others at the back, so the deque is always sorted by
+    distance. The parameters and the result are the same as in dijkstra.
+    """
+    if etiquetas is not None and etiquetas[inicio] != etiquetas[objetivo] and mascara.transitable(inicio):
+        return [objetivo], float('inf')
+    if espacio is None:
+        espacio = EspacioTrabajo(len(mascara))
+
+    paso = mascara.superponer(posiciones_bloqueadas, objetivo)
+    append, appendleft, popleft = instrumentacion.operaciones_cola()
+    generacion = espacio.reiniciar()
+    distancias, anteriores, sellos = espacio.distancias, espacio.anteriores, espacio.sellos
+    distancias[inicio], anteriores[inicio], sellos[inicio] = 0, -1, generacion
+    cola = deque()
+    append(cola, inicio)
+
+    while cola:
+        # A cell may be queued twice (through a 0 edge after a 1 edge). Expanding it again finds no shorter paths,
+        # so there is no need to store the distance with the cell to detect stale entries
+        nodo_actual = popleft(cola)
+        distancia_actual = distancias[nodo_actual]
+
+        if nodo_actual == objetivo:
+            break
+
+        for vecino, peso in grafo[nodo_actual]:
+            if not paso[vecino]:
+                continue
+            distancia = distancia_actual + peso
+            if sellos[vecino] != generacion:
+                sellos[vecino] = generacion
+            elif distancia > distancias[vecino]:
+                continue
+            elif distancia == distancias[vecino]:
+                if peso:
+                    _desempatar(distancias, anteriores, vecino, distancia_actual, nodo_actual)
+                continue
+            distancias[vecino] = distancia
+            anteriores[vecino] = nodo_actual
+            if peso:
+                append(cola, vecino)
+            else:
+                appendleft(cola, vecino)
+
+    return espacio.camino(objetivo)
+
+
+def dial(grafo: dict, inicio: int, objetivo: int, mascara: Transitabilidad, posiciones_bloqueadas=(),
+         etiquetas=None, espacio: EspacioTrabajo = None, peso_maximo: int = LIMITE_DIAL):
+    """
+    Find the shortest path between two cells of a maze whose edge weights are small non-negative integers, with a
+    bucket queue (Dial's algorithm): a circular array of peso_maximo + 1 buckets, one per pending distance. The
+    parameters and the result are the same as in dijkstra.
+
+    :param peso_maximo: (int) The largest edge weight of the maze.
+    """
+    if etiquetas is not None and etiquetas[inicio] != etiquetas[objetivo] and mascara.transitable(inicio):
+        return [objetivo], float('inf')
+    if espacio is None:
+        espacio = EspacioTrabajo(len(mascara))
+
+    paso = mascara.superponer(posiciones_bloqueadas, objetivo)
+    append, pop = instrumentacion.operaciones_cubetas()
+    generacion = espacio.reiniciar()
+    distancias, anteriores, sellos = espacio.distancias, espacio.anteriores, espacio.sellos
+    distancias[inicio], anteriores[inicio], sellos[inicio] = 0, -1, generacion
+    n_cubetas = peso_maximo + 1
+    cubetas = [[] for _ in range(n_cubetas)]
+    append(cubetas[0], inicio)
+    pendientes = 1
+    distancia_actual = 0
+
+    while pendientes:
+        cubeta = cubetas[distancia_actual % n_cubetas]
+        if not cubeta:
+            distancia_actual += 1
+            continue
+        nodo_actual = pop(cubeta)
+        pendientes -= 1
+        if distancias[nodo_actual] != distancia_actual:
+            continue  # Stale entry
+
+        if nodo_actual == objetivo:
+            break
+
+        for vecino, peso in grafo[nodo_actual]:
+            if not paso[vecino]:
+                continue
+            distancia = distancia_actual + peso
+            if sellos[vecino] != generacion:
+                sellos[vecino] = generacion
+            elif distancia > distancias[vecino]:
+                continue
+            elif distancia == distancias[vecino]:
+                if peso:
+                    _desempatar(distancias, anteriores, vecino, distancia_actual, nodo_actual)
+                continue
+            distancias[vecino] = distancia
+            anteriores[vecino] = nodo_actual
+            append(cubetas[distancia % n_cubetas], vecino)
+            pendientes += 1
+
+    return espacio.camino(objetivo)
+
+
+def costo_minimo(grafo: dict):
+    """
+    Return the smallest edge weight (traversal cost) of the maze, or 1 if it has no edges.
+    """
+    return min((peso for vecinos in grafo.values() for _, peso in vecinos), default=1)
+
+
+def heuristica_manhattan(ncols: int, costo: float = 1):
+    """
+    Return a cost aware heuristic for A*: the Manhattan distance between two cells times the smallest traversal cost
+    of the maze. It never overestimates the cost of a path, so A* still finds the shortest one.
+
+    :param ncols: (int) Number of columns of the board.
+    :param costo: (float) The smallest traversal cost of the maze (see costo_minimo).
+    :return: (callable) The heuristic h(cell, target).
+    """
+    def heuristica(pos1, pos2):
+        row1, col1 = divmod(pos1, ncols)
+        row2, col2 = divmod(pos2, ncols)
+        return (abs(row1 - row2) + abs(col1 - col2)) * costo
+    return heuristica
+
+
+def a_estrella(grafo: dict, inicio: int, objetivo: int, mascara: Transitabilidad, posiciones_bloqueadas=(),
+               etiquetas=None, espacio: EspacioTrabajo = None, heuristica=None):
+    """
+    Find the shortest path between two cells with A*. The parameters and the result are the same as in dijkstra.
+
+    :param heuristica: (callable) The heuristic h(cell, target). If None, the Manhattan distance times the smallest
+                       traversal cost of the maze is used (see heuristica_manhattan).
+    """
+    if etiquetas is not None and etiquetas[inicio] != etiquetas[objetivo] and mascara.transitable(inicio):
+        return [objetivo], float('inf')
+    if espacio is None:
+        espacio = EspacioTrabajo(len(mascara))
+    if heuristica is None:
+        heuristica = heuristica_manhattan(mascara.ncols, costo_minimo(grafo))
+
+    paso = mascara.superponer(posiciones_bloqueadas, objetivo)
+    heappush, heappop = instrumentacion.operaciones_heap()
+    generacion = espacio.reiniciar()
+    distancias, anteriores, sellos, cola = espacio.distancias, espacio.anteriores, espacio.sellos, espacio.cola
+    distancias[inicio], anteriores[inicio], sellos[inicio] = 0, -1, generacion
+    cola.append((heuristica(inicio, objetivo), 0, inicio))
+
+    while cola:
+        _, distancia_actual, nodo_actual = heappop(cola)
+        if distancia_actual != distancias[nodo_actual]:
+            continue  # Stale entry
+
+        if nodo_actual == objetivo:
+            break
+
+        for vecino, peso in grafo[nodo_actual]:
+            if not paso[vecino]:
+                continue
+            distancia = distancia_actual + peso
+            if sellos[vecino] != generacion:
+                sellos[vecino] = generacion
+            elif distancia >= distancias[vecino]:
+                continue
+            distancias[vecino] = distancia
+            anteriores[vecino] = nodo_actual
+            heappush(cola, (distancia + heuristica(vecino, objetivo), distancia, vecino))
+
+    return espacio.camino(objetivo)
+
+
+def peso_maximo(grafo: dict):
+    """
+    Return the largest edge weight of the maze, or None if some weight is not a non-negative integer.
+    """
+    maximo = 0
+    for vecinos in grafo.values():
+        for _, peso in vecinos:
+            if not isinstance(peso, int) or peso < 0:
+                return None
+            if peso > maximo:
+                maximo = peso
+    return maximo
+
+
+def elegir_motor(grafo: dict):
+    """
+    Choose the search engine for a maze from its largest edge weight: bfs_01 for weights 0 and 1, dial for integer
+    weights up to LIMITE_DIAL and the heap based dijkstra otherwise.
+
+    :param grafo: (dict) The adjacency dictionary of the maze.
+    :return: (callable) The engine, with the same parameters as dijkstra.
+    """
+    maximo = peso_maximo(grafo)
+    if maximo is None or maximo > LIMITE_DIAL:
+        return dijkstra
+    if maximo <= 1:
+        return bfs_01
+    return partial(dial, peso_maximo=maximo)
@@ -0,0 +1,181 @@
+"""
+This module orchestrates the generation, the solving and the drawing of scenarios with asyncio.
+
+The scripts used to wire the stages with raw threads: every thread built its own Labyrinth (a Tk window) off the main
+thread, and the only synchronization was the order of the joins. Here:
+
+- the generation and the solving run in an executor (a pool of processes by default), so they do not block the event
+  loop and they can overlap: while scenario N is being solved, scenario N + 1 is already being generated;
+- the stages are connected by bounded asyncio queues, so a fast stage waits for a slow one instead of piling up
+  scenarios (backpressure);
+- the results are streamed to a single viewer that lives in the Tk main thread, through a bridge with a bounded
+  thread-safe queue that the Labyrinth polls;
+- the whole pipeline can be cancelled, for example when the window of the viewer is closed.
+
+Usage:
+    # Headless
+    resultados = asyncio.run(pipeline([(3, 1), (4, 2, True)]))
+
+    # With the viewer in the main thread
+    resultados = ejecutar_con_visor(lambda puente: pipeline([(3, 1), (4, 2, True)], puente), 15, 20)
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import flujo_escenario
+
+
+class PuenteVisor:
+    """
+    Async-safe bridge between the event loop and a viewer in the Tk main thread.
+
+    The coroutines publish graphs with publicar, which waits while the queue is full (backpressure), and the
+    Labyrinth reads them from the queue in its update loop (Labyrinth(..., queue=puente.cola)).
+
+    Attributes:
+    ----------
+    cola : queue.Queue
+        The bounded queue of graphs read by the viewer.
+    """
+
+    def __init__(self, maxsize: int = 2, intervalo: float = 0.01):
+        """
+        :param maxsize: (int) Number of graphs that can wait for the viewer.
+        :param intervalo: (float) Seconds between two attempts to publish while the queue is full.
+        """
+        self.cola = queue.Queue(maxsize)
+        self.intervalo = intervalo
+
+    async def publicar(self, graph: dict):
+        """
+        Publish a graph for the viewer, waiting while the queue is full. It can be cancelled while it waits.
+        """
+        while True:
+            try:
+                self.cola.put_nowait(graph)
+                return
+            except queue.Full:
+                await asyncio.sleep(self.intervalo)
+
+
+def _resolver(escenario):
+    # Solve a scenario in a worker; only the routes travel back
+    return flujo_escenario.resolver(escenario)
+
+
+async def pipeline(escenarios, puente: PuenteVisor = None, nrows: int = 15, ncols: int = 20, executor=None,
+                   en_vuelo: int = 1):
+    """
+    Generate and solve several scenarios, overlapping the generation of a scenario with the solving of the previous
+    one, and stream every scenario (first unsolved, then solved) to the viewer if there is one.
+
+    :param escenarios: (iterable) The scenarios as tuples (n_tortugas, semilla) or (n_tortugas, semilla, prioridad).
+    :param puente: (PuenteVisor) The bridge to the viewer. If None, nothing is drawn.
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :param executor: (concurrent.futures.Executor) The executor of the stages. If None, a pool of two processes is
+                     used (one per stage).
+    :param en_vuelo: (int) Number of generated scenarios that can wait for the solver.
+    :return: (list) The solved scenarios (flujo_escenario.Escenario), in order.
+    """
+    loop = asyncio.get_running_loop()
+    propio = executor is None
+    if propio:
+        executor = ProcessPoolExecutor(max_workers=2)
+    generados = asyncio.Queue(en_vuelo)
+    fin = object()
+
+    async def generacion():
+        for escenario in escenarios:
+            n_tortugas, semilla, *resto = escenario
+            prioridad = resto[0] if resto else False
+            escenario = await loop.run_in_executor(executor, flujo_escenario.generar, n_tortugas, semilla, prioridad,
+                                                   nrows, ncols)
+            await generados.put(escenario)  # Waits while the solver is behind
+        await generados.put(fin)
+
+    async def solucion():
+        resultados = []
+        while True:
+            escenario = await generados.get()
+            if escenario is fin:
+                return resultados
+            if puente is not None:
+                await puente.publicar(escenario.solucion())
+            escenario.caminos = await loop.run_in_executor(executor, _resolver, escenario)
+            if puente is not None:
+                await puente.publicar(escenario.solucion())
+            resultados.append(escenario)
+
+    productor = asyncio.ensure_future(generacion())
+    try:
+        resultados = await solucion()
+        await productor
+        return resultados
+    finally:
+        productor.cancel()
+        if propio:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _cancelar_tareas():
+    tareas = [tarea for tarea in asyncio.all_tasks() if tarea is not asyncio.current_task()]
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+
+def ejecutar_con_visor(corrutina, nrows: int = 15, ncols: int = 20, maxsize: int = 2, tiempo: int = 0):
+    """
+    Run a coroutine in an event loop in a background thread while the viewer runs in the main thread.
+
+    Closing the window cancels the coroutine. When the coroutine ends, the window is closed after `tiempo`
+    milliseconds (0 keeps it open until the user closes it). If the coroutine raises, the window is closed at once and
+    the exception is raised again here.
+
+    :param corrutina: (callable) Function that receives the PuenteVisor and returns the coroutine to run.
+    :param nrows: (int) Number of rows of the board.
+    :param ncols: (int) Number of columns of the board.
+    :param maxsize: (int) Number of graphs that can wait for the viewer.
+    :param tiempo: (int) Milliseconds the window stays open after the coroutine ends.
+    :return: The result of the coroutine, or None if it was cancelled.
+    """
+    from labyrinth import Labyrinth
+
+    puente = PuenteVisor(maxsize)
+    laberinto = Labyrinth(nrows, ncols, queue=puente.cola)
+    loop = asyncio.new_event_loop()
+    hilo = threading.Thread(target=loop.run_forever, daemon=True)
+    hilo.start()
+    futuro = asyncio.run_coroutine_threadsafe(corrutina(puente), loop)
+
+    def cerrar():
+        futuro.cancel()
+        laberinto.stop()
+
+    def vigilar():
+        # The Tk objects are only touched from the main thread, so the end of the coroutine is polled from here
+        if futuro.done() and not futuro.cancelled() and futuro.exception() is not None:
+            cerrar()
+        elif futuro.done() and puente.cola.empty():
+            if tiempo:
+                laberinto.window.after(tiempo, cerrar)
+        else:
+            laberinto.window.after(50, vigilar)
+
+    laberinto.window.protocol('WM_DELETE_WINDOW', cerrar)
+    laberinto.window.after(50, vigilar)
+    laberinto.start()
+
+    # Cancel whatever is still running (the window was closed) and let it clean up before stopping the loop
+    futuro.cancel()
+    asyncio.run_coroutine_threadsafe(_cancelar_tareas(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    hilo.join()
+    loop.close()
+    if futuro.cancelled():
+        return None
+    return futuro.result()  # Raises the exception of the coroutine, if any
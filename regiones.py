@@ -0,0 +1,129 @@
+"""
+This module labels the connected regions of a labyrinth.
+
+Two cells belong to the same region if there is a path of open edges (edges without a wall) between them. The labels
+are computed with a vectorized union-find over the arrays of open edges: every round hooks the root of each edge
+endpoint to the smaller root of the edge, and then the parent pointers are shortcut until every cell points directly
+to its root. The label of a cell is the smallest cell of its region, so the labels do not depend on the order of the
+edges.
+
+With the labels, the enclosed regions are all the regions except the main one (the largest one), and two cells are
+reachable from each other if and only if they have the same label, which lets the solvers reject an unreachable
+target in O(1) instead of running a full search that fails.
+"""
+
+import numpy as np
+
+
+def etiquetar(n: int, origen, destino):
+    """
+    Label the connected regions of a graph given as arrays of open edges.
+
+    :param n: (int) Number of cells. The cells are the integers in [0, n).
+    :param origen: (array-like) The first cell of every open edge.
+    :param destino: (array-like) The second cell of every open edge.
+    :return: (np.ndarray) The label of every cell: the smallest cell of its region.
+    """
+    padre = np.arange(n, dtype=np.int64)
+    origen = np.asarray(origen, dtype=np.int64)
+    destino = np.asarray(destino, dtype=np.int64)
+    while origen.size:
+        raiz_o, raiz_d = padre[origen], padre[destino]
+        distintas = raiz_o != raiz_d
+        if not distintas.any():
+            break
+        # Hook the larger root of every edge to the smaller one
+        raiz_o, raiz_d = raiz_o[distintas], raiz_d[distintas]
+        np.minimum.at(padre, np.maximum(raiz_o, raiz_d), np.minimum(raiz_o, raiz_d))
+        # Shortcut the pointers until every cell points to a root
+        while True:
+            abuelo = padre[padre]
+            if np.array_equal(abuelo, padre):
+                break
+            padre = abuelo
+        # Only the edges that still join different regions matter in the next round
+        origen, destino = origen[distintas], destino[distintas]
+    return padre
+
+
+def aristas_abiertas(graph: dict):
+    """
+    Extract the open edges of a graph given as a dictionary with the keys 'V' and 'E' (as saved in the JSON files or
+    returned by Grafo.get_graph), or as a Grafo, whose index of the edges gives them without parsing the keys.
+
+    :param graph: (dict | Grafo) The graph.
+    :return: (tuple) The number of cells and the arrays with the first and second cells of the open edges.
+    """
+    if hasattr(graph, 'open_edges'):
+        origen, destino = graph.open_edges()
+        return max((int(v) for v in graph.V), default=-1) + 1, origen, destino
+    origen, destino = [], []
+    for arista, peso in graph['E'].items():
+        if peso != 0:
+            vertex_o, vertex_i = arista[1:-1].split(', ')
+            origen.append(int(vertex_o))
+            destino.append(int(vertex_i))
+    n = max((int(v) for v in graph['V']), default=-1) + 1
+    return n, origen, destino
+
+
+def etiquetar_grafo(graph: dict):
+    """
+    Label the connected regions of a graph given as a dictionary with the keys 'V' and 'E', or as a Grafo.
+
+    :param graph: (dict | Grafo) The graph.
+    :return: (np.ndarray) The label of every cell.
+    """
+    return etiquetar(*aristas_abiertas(graph))
+
+
+def etiquetar_adyacencia(grafo: dict, transitable=None):
+    """
+    Label the connected regions of a graph given as the adjacency dictionary used by the solvers
+    ({node: [(neighbour, weight), ...]}, open edges only).
+
+    :param grafo: (dict) The adjacency dictionary.
+    :param transitable: (callable) Optional predicate on the cells. Only the edges between two cells for which it is
+                        True are taken into account.
+    :return: (np.ndarray) The label of every cell.
+    """
+    origen, destino = [], []
+    for nodo, vecinos in grafo.items():
+        if transitable is not None and not transitable(nodo):
+            continue
+        for vecino, _ in vecinos:
+            if nodo < vecino and (transitable is None or transitable(vecino)):
+                origen.append(nodo)
+                destino.append(vecino)
+    n = max(grafo, default=-1) + 1
+    return etiquetar(n, origen, destino)
+
+
+def componente_principal(etiquetas: np.ndarray):
+    """
+    Return the label of the largest region.
+    """
+    regiones, tamanos = np.unique(etiquetas, return_counts=True)
+    return int(regiones[np.argmax(tamanos)])
+
+
+def regiones_encerradas(etiquetas: np.ndarray):
+    """
+    Return the enclosed regions: every region except the main one.
+
+    :param etiquetas: (np.ndarray) The labels of the cells.
+    :return: (dict) For every enclosed region, its label and the sorted list of its cells.
+    """
+    principal = componente_principal(etiquetas)
+    celdas = np.flatnonzero(etiquetas != principal)
+    orden = np.argsort(etiquetas[celdas], kind='stable')
+    celdas = celdas[orden]
+    regiones, inicios = np.unique(etiquetas[celdas], return_index=True)
+    return {int(r): c.tolist() for r, c in zip(regiones, np.split(celdas, inicios[1:]))}
+
+
+def cuadros_encerrados(etiquetas: np.ndarray):
+    """
+    Return the sorted list of the cells that are not in the main region.
+    """
+    return np.flatnonzero(etiquetas != componente_principal(etiquetas)).tolist()
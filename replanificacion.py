@@ -0,0 +1,319 @@
+"""
+This module implements incremental replanning of the turtle routes when the walls of the labyrinth change.
+
+When a wall appears or disappears (an edge change, like the ones produced by Grafo.add_edge or by comparing two
+consecutive graphs of a live feed), the routes shown in the Labyrinth do not need a full re-solve. Each route is kept
+by a D* Lite planner, which searches backwards from the target and keeps the distance of every cell to it (g) together
+with a one step lookahead (rhs). After an edge change only the cells whose distance actually changes are processed
+again, so the cost of the repair is proportional to the affected region. D* Lite also lets the start move along the
+route (the turtle advancing) without starting over.
+
+All the planners of a Replanificador share the same adjacency (a dictionary of dictionaries {u: {v: cost}}), so an
+event is applied once to the maze and then notified to every planner.
+
+Usage:
+    replanificador = Replanificador(grafo, ncols)  # grafo as returned by cargar_grafo
+    replanificador.agregar_ruta('t1', inicio, objetivo)
+    replanificador.aplicar(diferencias(graph_anterior, graph_nuevo))
+    camino, costo = replanificador.ruta('t1')
+"""
+
+import heapq
+
+INF = float('inf')
+
+
+def adyacencia_mutable(grafo: dict):
+    """
+    Convert the adjacency dictionary of the solvers ({node: [(neighbour, cost), ...]}) into a dictionary of
+    dictionaries ({node: {neighbour: cost}}) that can be updated edge by edge.
+    """
+    return {nodo: dict(vecinos) for nodo, vecinos in grafo.items()}
+
+
+def _arista(clave: str):
+    vertex_o, vertex_i = clave[1:-1].split(', ')
+    return int(vertex_o), int(vertex_i)
+
+
+def diferencias(anterior: dict, nuevo: dict):
+    """
+    Compute the edge changes between two graphs given as dictionaries with the keys 'V', 'E' and optionally 'C'
+    (as sent through the Queue or saved in the JSON files).
+
+    :param anterior: (dict) The previous graph.
+    :param nuevo: (dict) The new graph.
+    :return: (list) The events as tuples (u, v, cost) with u < v, one per edge that changed. The cost is None if the
+             edge is now a wall or does not exist.
+    """
+    aristas_a, aristas_n = _por_arista(anterior), _por_arista(nuevo)
+    eventos = []
+    for arista in aristas_a.keys() | aristas_n.keys():
+        costo_n = aristas_n.get(arista)
+        if aristas_a.get(arista) != costo_n:
+            eventos.append((*arista, costo_n))
+    eventos.sort(key=lambda evento: (evento[0], evento[1]))  # Deterministic order
+    return eventos
+
+
+def _por_arista(graph: dict):
+    # The cost of every open edge by its pair (lower vertex, higher vertex), whatever the order of its key in E
+    costos = graph.get('C', {})
+    abiertas = {}
+    for clave, peso in graph['E'].items():
+        if peso != 0:
+            u, v = _arista(clave)
+            abiertas[(u, v) if u < v else (v, u)] = costos.get(clave, 1)
+    return abiertas
+
+
+def aplicar_evento(vecinos: dict, u: int, v: int, costo):
+    """
+    Apply an edge change to a dictionary of dictionaries adjacency. A cost of None removes the edge (a wall).
+    """
+    if costo is None:
+        vecinos.get(u, {}).pop(v, None)
+        vecinos.get(v, {}).pop(u, None)
+    else:
+        vecinos.setdefault(u, {})[v] = costo
+        vecinos.setdefault(v, {})[u] = costo
+
+
+class DStarLite:
+    """
+    D* Lite planner of one route.
+
+    The search goes backwards, from the target to the start. A cell can only be entered if it is passable, like in
+    the solvers. The cost of the edges is read from the shared adjacency, which must be updated before notifying
+    the planner with aristas_cambiadas.
+
+    Attributes:
+    ----------
+    vecinos : dict
+        The shared adjacency {u: {v: cost}}.
+    inicio : int
+        The current start of the route.
+    objetivo : int
+        The target of the route.
+    g : dict
+        The distance of every cell to the target (infinite if missing).
+    rhs : dict
+        The one step lookahead of the distance of every cell (infinite if missing).
+    """
+
+    def __init__(self, vecinos: dict, inicio: int, objetivo: int, heuristica=None, transitable=None):
+        """
+        :param vecinos: (dict) The shared adjacency {u: {v: cost}}.
+        :param inicio: (int) The start of the route.
+        :param objetivo: (int) The target of the route.
+        :param heuristica: (callable) A consistent heuristic h(a, b). If None, 0 is used (plain incremental Dijkstra).
+        :param transitable: (callable) Predicate telling if a cell can be entered. If None, every cell can.
+        """
+        self.vecinos = vecinos
+        self.inicio, self.objetivo = inicio, objetivo
+        self._h = heuristica or (lambda a, b: 0)
+        self._transitable = transitable or (lambda pos: True)
+        self._ultimo = inicio  # Start at the time of the last repair
+        self._km = 0
+        self.g, self.rhs = {}, {objetivo: 0}
+        self._cola = []
+        self._claves = {}  # Current key of every cell in the queue (lazy deletion in the heap)
+        self._insertar(objetivo)
+        self.expandidos = 0  # Cells expanded by the last repair
+        self._calcular()
+
+    def _costo(self, u: int, v: int):
+        # Cost of moving from u to v: the cost of the edge, if v can be entered
+        costo = self.vecinos.get(u, {}).get(v)
+        if costo is None or not self._transitable(v):
+            return INF
+        return costo
+
+    def _clave(self, s: int):
+        m = min(self.g.get(s, INF), self.rhs.get(s, INF))
+        return m + self._h(self.inicio, s) + self._km, m
+
+    def _insertar(self, s: int):
+        clave = self._clave(s)
+        self._claves[s] = clave
+        heapq.heappush(self._cola, (clave, s))
+
+    def _tope(self):
+        # Drop the stale entries at the top of the heap and return the top key
+        cola, claves = self._cola, self._claves
+        while cola and claves.get(cola[0][1]) != cola[0][0]:
+            heapq.heappop(cola)
+        return cola[0][0] if cola else (INF, INF)
+
+    def _actualizar_vertice(self, u: int):
+        if u != self.objetivo:
+            self.rhs[u] = min((self._costo(u, s) + self.g.get(s, INF) for s in self.vecinos.get(u, ())),
+                              default=INF)
+        self._claves.pop(u, None)
+        if self.g.get(u, INF) != self.rhs.get(u, INF):
+            self._insertar(u)
+
+    def _calcular(self):
+        self.expandidos = 0
+        while (self._tope() < self._clave(self.inicio)
+               or self.rhs.get(self.inicio, INF) != self.g.get(self.inicio, INF)):
+            if not self._cola:
+                break
+            clave_vieja, u = heapq.heappop(self._cola)
+            del self._claves[u]
+            self.expandidos += 1
+            clave_nueva = self._clave(u)
+            if clave_vieja < clave_nueva:
+                self._insertar(u)
+            elif self.g.get(u, INF) > self.rhs.get(u, INF):
+                self.g[u] = self.rhs[u]
+                for p in self.vecinos.get(u, ()):
+                    self._actualizar_vertice(p)
+            else:
+                self.g[u] = INF
+                self._actualizar_vertice(u)
+                for p in self.vecinos.get(u, ()):
+                    self._actualizar_vertice(p)
+
+    def mover(self, inicio: int):
+        """
+        Move the start of the route (for example, when the turtle advances) and repair the route from the new start.
+        The keys already in the queue stay valid because the heuristic offset km grows by h(last start, new start).
+        """
+        self._km += self._h(self._ultimo, inicio)
+        self._ultimo = self.inicio = inicio
+        self._calcular()
+
+    def aristas_cambiadas(self, pares):
+        """
+        Repair the route after some edges of the shared adjacency changed.
+
+        :param pares: (iterable) The changed edges as pairs (u, v).
+        :return: None
+        """
+        self._km += self._h(self._ultimo, self.inicio)
+        self._ultimo = self.inicio
+        for u, v in pares:
+            self._actualizar_vertice(u)
+            self._actualizar_vertice(v)
+        self._calcular()
+
+    def celdas_cambiadas(self, celdas):
+        """
+        Repair the route after the passability of some cells changed (for example, cells blocked by other turtles).
+
+        :param celdas: (iterable) The cells whose passability changed.
+        :return: None
+        """
+        self.aristas_cambiadas((p, c) for c in celdas for p in self.vecinos.get(c, ()))
+
+    def ruta(self):
+        """
+        Return the current route from the start to the target and its cost. If the target is unreachable, the route
+        is [objetivo] and the cost is infinite, like in the solvers.
+        """
+        costo = self.g.get(self.inicio, INF)
+        if costo == INF:
+            return [self.objetivo], INF
+        camino = [self.inicio]
+        actual = self.inicio
+        while actual != self.objetivo and len(camino) <= len(self.vecinos):
+            # Follow the best successor, breaking ties by the number of the cell
+            actual = min(self.vecinos[actual], key=lambda s: (self._costo(actual, s) + self.g.get(s, INF), s))
+            camino.append(actual)
+        return camino, costo
+
+
+class Replanificador:
+    """
+    Keeps the routes of several turtles up to date while the walls of the labyrinth change.
+
+    Attributes:
+    ----------
+    vecinos : dict
+        The adjacency {u: {v: cost}} shared by all the planners.
+    planificadores : dict
+        The D* Lite planner of every route, by name.
+    """
+
+    def __init__(self, grafo: dict, ncols: int, transitable=None, costo_minimo: float = 1):
+        """
+        :param grafo: (dict) The adjacency dictionary of the maze, as returned by cargar_grafo.
+        :param ncols: (int) Number of columns of the board, for the Manhattan heuristic.
+        :param transitable: (callable) Predicate telling if a cell can be entered (for example
+                            Transitabilidad.transitable). If None, every cell can.
+        :param costo_minimo: (float) The smallest traversal cost the maze can have, to keep the heuristic admissible.
+        """
+        self.vecinos = adyacencia_mutable(grafo)
+        self.planificadores = {}
+        self._transitable = transitable
+
+        def heuristica(a, b):
+            row1, col1 = divmod(a, ncols)
+            row2, col2 = divmod(b, ncols)
+            return (abs(row1 - row2) + abs(col1 - col2)) * costo_minimo
+        self._heuristica = heuristica
+
+    def agregar_ruta(self, nombre, inicio: int, objetivo: int):
+        """
+        Plan a new route and keep it up to date.
+
+        :param nombre: The name of the route (for example the turtle).
+        :param inicio: (int) The start of the route.
+        :param objetivo: (int) The target of the route.
+        :return: (tuple) The route and its cost.
+        """
+        planificador = DStarLite(self.vecinos, inicio, objetivo, self._heuristica, self._transitable)
+        self.planificadores[nombre] = planificador
+        return planificador.ruta()
+
+    def aplicar(self, eventos):
+        """
+        Apply edge changes to the maze and repair every route.
+
+        :param eventos: (iterable) The events as tuples (u, v, cost), with cost None for a wall (see diferencias).
+        :return: (int) The total number of cells expanded by the repairs.
+        """
+        pares = []
+        for u, v, costo in eventos:
+            aplicar_evento(self.vecinos, u, v, costo)
+            pares.append((u, v))
+        expandidos = 0
+        if pares:
+            for planificador in self.planificadores.values():
+                planificador.aristas_cambiadas(pares)
+                expandidos += planificador.expandidos
+        return expandidos
+
+    def mover(self, nombre, inicio: int):
+        """
+        Move the start of a route (the turtle advanced) and repair it.
+
+        :param nombre: The name of the route.
+        :param inicio: (int) The new start of the route.
+        :return: (tuple) The route and its cost.
+        """
+        planificador = self.planificadores[nombre]
+        planificador.mover(inicio)
+        return planificador.ruta()
+
+    def ruta(self, nombre):
+        """
+        Return the current route with the given name and its cost.
+        """
+        return self.planificadores[nombre].ruta()
+
+    def rutas_tortugas(self):
+        """
+        Return all the routes in the format of the 'turtle' key of the graph ({cell: next cell}, 'f' at the end),
+        ready to be drawn by the Labyrinth.
+        """
+        rutas = {}
+        for planificador in self.planificadores.values():
+            camino, costo = planificador.ruta()
+            if costo == INF:
+                continue
+            for a, b in zip(camino, camino[1:]):
+                rutas[a] = b
+            rutas[camino[-1]] = 'f'
+        return rutas
@@ -0,0 +1,211 @@
+"""
+This module computes the routes of the turtles with a pool of processes.
+
+The solvers process the turtles in order. Every turtle runs several searches (legs) one after the other, and the only
+thing that ties the turtles together is the set of blocked positions: the targets reached by the previous turtles.
+Here the legs of all the turtles are computed concurrently, each turtle blocking only its own targets (speculation),
+and then a deterministic merge walks the turtles in the sequential order with the real blocked positions:
+
+- a speculative leg whose path does not touch any blocked position is exactly the leg of the sequential mode (more
+  blocked cells can only make other paths longer, so the shortest path and its tie-breaks do not change), and an
+  unreachable target stays unreachable;
+- any other leg, and every leg after it in the same task, is computed again in the merge.
+
+So the routes are identical to the ones of the sequential mode. The maze is shipped once to the workers in shared
+memory as a compact read-only copy (the adjacency in CSR form, the passability mask and the region labels), which
+every worker turns back into the structures of motor_rutas when it starts.
+
+Usage:
+    tareas = [(inicio, [objetivo1, objetivo2, ...]), ...]  # In the sequential order
+    rutas = calcular_rutas(grafo, mascara, tareas, etiquetas, procesos=4)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import motor_rutas
+
+INF = float('inf')
+
+
+class LaberintoCompartido:
+    """
+    Compact read-only copy of a maze in a block of shared memory.
+
+    The block holds, one after the other: the offsets of the adjacency lists (n + 1 int64), the neighbours (m int64),
+    the weights (m int64 or float64), the passability mask (n uint8) and, optionally, the region labels (n int64).
+
+    Attributes:
+    ----------
+    descriptor : tuple
+        What a worker needs to attach to the block: the name of the block, the number of nodes and of adjacency
+        entries, the size of the board, the type of the weights and if there are labels.
+    """
+
+    def __init__(self, grafo: dict, mascara: motor_rutas.Transitabilidad, etiquetas=None):
+        """
+        :param grafo: (dict) The adjacency dictionary of the maze.
+        :param mascara: (motor_rutas.Transitabilidad) The passability mask of the maze.
+        :param etiquetas: (np.ndarray) Optional labels of the regions of the passable cells.
+        """
+        n = len(mascara)
+        desplazamientos = np.zeros(n + 1, dtype=np.int64)
+        vecinos, pesos = [], []
+        for nodo in range(n):
+            for vecino, peso in grafo.get(nodo, ()):
+                vecinos.append(vecino)
+                pesos.append(peso)
+            desplazamientos[nodo + 1] = len(vecinos)
+        tipo = np.int64 if all(isinstance(peso, int) for peso in pesos) else np.float64
+        partes = [desplazamientos, np.array(vecinos, dtype=np.int64), np.array(pesos, dtype=tipo),
+                  np.frombuffer(bytes(mascara.base), dtype=np.uint8)]
+        if etiquetas is not None:
+            partes.append(np.asarray(etiquetas, dtype=np.int64))
+
+        self._memoria = shared_memory.SharedMemory(create=True, size=max(sum(p.nbytes for p in partes), 1))
+        inicio = 0
+        for parte in partes:
+            self._memoria.buf[inicio:inicio + parte.nbytes] = parte.tobytes()
+            inicio += parte.nbytes
+        self.descriptor = (self._memoria.name, n, len(vecinos), mascara.nrows, mascara.ncols, np.dtype(tipo).str,
+                           etiquetas is not None)
+
+    def cerrar(self):
+        """
+        Release the block of shared memory.
+        """
+        self._memoria.close()
+        self._memoria.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def reconstruir(descriptor: tuple):
+    """
+    Rebuild the maze from a block of shared memory.
+
+    :param descriptor: (tuple) The descriptor of the block (LaberintoCompartido.descriptor).
+    :return: (tuple) The adjacency dictionary, the passability mask and the labels (None if there are none).
+    """
+    nombre, n, m, nrows, ncols, tipo, hay_etiquetas = descriptor
+    memoria = shared_memory.SharedMemory(name=nombre)
+    try:
+        buf, inicio = memoria.buf, 0
+
+        def leer(dtype, cantidad):
+            nonlocal inicio
+            arreglo = np.frombuffer(buf, dtype=dtype, count=cantidad, offset=inicio).copy()
+            inicio += arreglo.nbytes
+            return arreglo
+
+        desplazamientos = leer(np.int64, n + 1).tolist()
+        vecinos = leer(np.int64, m).tolist()
+        pesos = leer(np.dtype(tipo), m).tolist()
+        base = leer(np.uint8, n).tobytes()
+        etiquetas = leer(np.int64, n) if hay_etiquetas else None
+    finally:
+        memoria.close()
+
+    grafo = {nodo: list(zip(vecinos[desplazamientos[nodo]:desplazamientos[nodo + 1]],
+                            pesos[desplazamientos[nodo]:desplazamientos[nodo + 1]]))
+             for nodo in range(n)}
+    mascara = motor_rutas.Transitabilidad(nrows, ncols, (), n)
+    mascara.base[:] = base
+    mascara.paso[:] = base
+    return grafo, mascara, etiquetas
+
+
+def tramos(grafo: dict, mascara, etiquetas, espacio, motor, inicio: int, objetivos, bloqueadas):
+    """
+    Run the legs of one task as the solvers do: every leg starts at the last target reached, and every target reached
+    is blocked for the following legs.
+
+    :param bloqueadas: (set) The positions blocked when the task starts. It is updated with the targets reached.
+    :return: (list) The legs as tuples (inicio, objetivo, camino, distancia).
+    """
+    resultado = []
+    for objetivo in objetivos:
+        camino, distancia = motor(grafo, inicio, objetivo, mascara, bloqueadas, etiquetas, espacio)
+        resultado.append((inicio, objetivo, camino, distancia))
+        if distancia < INF:
+            inicio = objetivo
+            bloqueadas.add(objetivo)
+    return resultado
+
+
+_trabajador = None  # Maze of the worker process: grafo, mascara, etiquetas, espacio and motor
+
+
+def _iniciar(descriptor, motor):
+    global _trabajador
+    grafo, mascara, etiquetas = reconstruir(descriptor)
+    _trabajador = (grafo, mascara, etiquetas, motor_rutas.EspacioTrabajo(len(mascara)), motor)
+
+
+def _especular(tarea):
+    # Legs of a task blocking only its own targets
+    inicio, objetivos = tarea
+    return tramos(*_trabajador, inicio, objetivos, set())
+
+
+def fusionar(grafo: dict, mascara, etiquetas, espacio, motor, tareas, especulados):
+    """
+    Merge the speculative legs of the tasks in the sequential order, computing again the legs that conflict with the
+    positions blocked by the previous tasks.
+
+    :param tareas: (list) The tasks as tuples (inicio, objetivos), in the sequential order.
+    :param especulados: (list) The speculative legs of every task (see tramos).
+    :return: (tuple) The route of every task as a list of cells, and the number of legs computed again.
+    """
+    rutas, recalculados = [], 0
+    posiciones_bloqueadas = set()
+    for (inicio, objetivos), legs in zip(tareas, especulados):
+        bloqueadas = set(posiciones_bloqueadas)
+        ruta = [inicio]
+        valido = True  # The speculative chain still matches the real one
+        for objetivo, (inicio_e, _, camino, distancia) in zip(objetivos, legs):
+            if not (valido and inicio_e == inicio and (distancia == INF or bloqueadas.isdisjoint(camino[1:-1]))):
+                camino_r, distancia_r = motor(grafo, inicio, objetivo, mascara, bloqueadas, etiquetas, espacio)
+                recalculados += 1
+                valido = valido and (distancia_r < INF) == (distancia < INF)
+                camino, distancia = camino_r, distancia_r
+            if distancia < INF:
+                ruta.extend(camino[1:])
+                inicio = objetivo
+                bloqueadas.add(objetivo)
+        rutas.append(ruta)
+        posiciones_bloqueadas.update(bloqueadas)
+    return rutas, recalculados
+
+
+def calcular_rutas(grafo: dict, mascara: motor_rutas.Transitabilidad, tareas, etiquetas=None, procesos: int = None,
+                   motor=None):
+    """
+    Compute the routes of several tasks with a pool of processes. The result is the same as running the tasks one
+    after the other, each blocking the targets reached by the previous ones.
+
+    :param grafo: (dict) The adjacency dictionary of the maze.
+    :param mascara: (motor_rutas.Transitabilidad) The passability mask of the maze.
+    :param tareas: (list) The tasks as tuples (inicio, objetivos), in the sequential order.
+    :param etiquetas: (np.ndarray) Optional labels of the regions of the passable cells.
+    :param procesos: (int) Number of worker processes. If None, one per CPU.
+    :param motor: (callable) The search engine, used by the workers and by the merge, so the speculative legs are the
+                  legs of the sequential mode. It is sent to the workers by name, so it must be a module level
+                  function or a functools.partial of one. If None, it is chosen with motor_rutas.elegir_motor.
+    :return: (list) The route of every task as a list of cells.
+    """
+    tareas = [(int(inicio), [int(objetivo) for objetivo in objetivos]) for inicio, objetivos in tareas]
+    motor = motor or motor_rutas.elegir_motor(grafo)
+    with LaberintoCompartido(grafo, mascara, etiquetas) as laberinto:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar,
+                                 initargs=(laberinto.descriptor, motor)) as pool:
+            especulados = list(pool.map(_especular, tareas, chunksize=max(1, len(tareas) // (4 * (procesos or 4)))))
+    rutas, _ = fusionar(grafo, mascara, etiquetas, motor_rutas.EspacioTrabajo(len(mascara)), motor, tareas,
+                        especulados)
+    return rutas
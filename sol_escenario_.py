@@ -1,22 +1,28 @@
 import json
-import heapq
 import shutil
-import threading
-import json
-import heapq
-import shutil
-import labyrinth
+import instrumentacion
+import motor_rutas
+import formato_rutas
+import cache_contenido
 
 def cargar_grafo(filename):
     with open(filename, 'r') as file:
         data = json.load(file)
-    grafo = {}
-    for nodo, vecinos in data["V"].items():
-        grafo[int(nodo)] = []
-        for vecino in vecinos:
-            peso = data["E"].get(f"({nodo}, {vecino})") or data["E"].get(f"({vecino}, {nodo})")
-            if peso is not None:
-                grafo[int(nodo)].append((int(vecino), peso))
+    instrumentacion.bytes_archivo('bytes_leidos', filename)
+    return grafo_desde_datos(data)
+
+def grafo_desde_datos(data):
+    # E guarda si hay pared (0) o no (1) y C el costo de recorrer la arista (1 si no aparece). Cada llave de E se
+    # lee una sola vez, en el orden de E (el de los vecinos en V para los grafos de Grafo)
+    costos = data.get("C", {})
+    grafo = {int(nodo): [] for nodo in data["V"]}
+    for clave, peso in data["E"].items():
+        if peso != 0:
+            origen, destino = clave[1:-1].split(', ')
+            origen, destino = int(origen), int(destino)
+            costo = costos.get(clave, 1)
+            grafo[origen].append((destino, costo))
+            grafo[destino].append((origen, costo))
     return grafo
 
 def backup_labyrinth(ruta):
@@ -25,52 +31,22 @@ def backup_labyrinth(ruta):
     shutil.copy(original_json_path, backup_json_path)
     return backup_json_path
 
-def es_valida(pos, nrows, ncols):
-    row, col = divmod(pos, ncols)
-    if not (0 <= row < nrows and 0 <= col < ncols):
-        return False
-
-    # Verificar si la posición está en el borde derecho o izquierdo del laberinto
-    if (col == 0 and pos - 1 != 0) or (col == ncols - 1 and pos + 1 != nrows * ncols):
-        return False
-
-    return True
-
-def dijkstra(grafo, inicio, objetivo, posiciones_prohibidas, posiciones_bloqueadas, nrows, ncols):
-    cola = [(0, inicio)]
-    distancias = {nodo: float('inf') for nodo in grafo}
-    distancias[inicio] = 0
-    anteriores = {nodo: None for nodo in grafo}
-
-    while cola:
-        distancia_actual, nodo_actual = heapq.heappop(cola)
-
-        if nodo_actual == objetivo:
-            break
-
-        for vecino, peso in grafo[nodo_actual]:
-            if vecino in posiciones_prohibidas or not es_valida(vecino, nrows, ncols):
-                continue
-            if vecino in posiciones_bloqueadas and vecino != objetivo:
-                continue
-            distancia = distancia_actual + peso
-            if distancia < distancias[vecino]:
-                distancias[vecino] = distancia
-                anteriores[vecino] = nodo_actual
-                heapq.heappush(cola, (distancia, vecino))
-
-    camino = []
-    nodo = objetivo
-    while nodo is not None:
-        camino.append(nodo)
-        nodo = anteriores[nodo]
-    camino.reverse()
-
-    return camino, distancias[objetivo]
+def etiquetar_regiones(grafo, posiciones_prohibidas, nrows, ncols):
+    # Regiones conexas considerando solo las posiciones por las que los caminos pueden pasar
+    mascara = motor_rutas.como_transitabilidad(posiciones_prohibidas, nrows, ncols, grafo)
+    import regiones  # NumPy solo se carga al etiquetar
+    return regiones.etiquetar_adyacencia(grafo, mascara.transitable)
+
+def dijkstra(grafo, inicio, objetivo, posiciones_prohibidas, posiciones_bloqueadas, nrows, ncols, etiquetas=None, espacio=None, motor=None):
+    # La máscara de transitabilidad, el espacio de trabajo y el motor se eligen una vez por laberinto (main los pasa)
+    mascara = motor_rutas.como_transitabilidad(posiciones_prohibidas, nrows, ncols, grafo)
+    motor = motor or motor_rutas.dijkstra
+    return motor(grafo, inicio, objetivo, mascara, posiciones_bloqueadas, etiquetas, espacio)
 
 def cargar_posiciones_prohibidas(filename):
     with open(filename, 'r') as file:
         posiciones_prohibidas = [int(line.strip()) for line in file.readlines()]
+    instrumentacion.bytes_archivo('bytes_leidos', filename)
     return posiciones_prohibidas
 
 def asignar_puntos_secuencial(tortugas, puntos_prioridad, secuencia_colores, nrows, ncols):
@@ -110,25 +86,28 @@ def distancia_manhattan(pos1, pos2, ncols):
     row2, col2 = divmod(pos2, ncols)
     return abs(row1 - row2) + abs(col1 - col2)
 
-def guardar_solucion(filename, rutas_tortugas, type_method):
-    with open(filename, "r") as file:
-        data = json.load(file)
+def guardar_solucion(filename, caminos, type_method, ncols, data=None):
+    # Solución compacta: inicio y movimientos RLE de cada tortuga, el laberinto se referencia por su hash
+    if data is None:
+        with open(filename, "r") as file:
+            data = json.load(file)
+        instrumentacion.bytes_archivo('bytes_leidos', filename)
 
-    data["turtle"] = rutas_tortugas
+    solucion = formato_rutas.solucion(data, caminos, ncols, filename, type_method)
 
     filename = filename.replace(".json", f"_solucion{type_method}.json")
     with open(filename, "w") as file:
-        json.dump(data, file, indent=4)
+        json.dump(solucion, file)
+    instrumentacion.bytes_archivo('bytes_escritos', filename)
 
     print(f"Solucion guardada en {filename}")
 
-def main():
-    nrows, ncols = 15, 20
-    grafo = cargar_grafo('graph_generado.json')
-    posiciones_prohibidas = cargar_posiciones_prohibidas('cuadros_encerrados.txt')
-
-    with open('graph_generado.json', 'r') as file:
-        data = json.load(file)
+def calcular_caminos(data, prohibidas, nrows, ncols, procesos=None):
+    grafo = grafo_desde_datos(data)
+    posiciones_prohibidas = motor_rutas.como_transitabilidad(prohibidas, nrows, ncols, grafo)
+    etiquetas = etiquetar_regiones(grafo, posiciones_prohibidas, nrows, ncols)
+    espacio = motor_rutas.EspacioTrabajo(len(posiciones_prohibidas))
+    motor = motor_rutas.elegir_motor(grafo)  # Según el peso máximo de las aristas
 
     tortugas = list(data['turtle'].keys())
     colores_prioridad = ['red', 'blue', 'green']  # Definir la prioridad de colores
@@ -137,9 +116,17 @@ def main():
     secuencia_colores = ['red', 'blue', 'green']  # Secuencia en la que deben procesarse los colores
 
     # Asignación secuencial de puntos basada en la distancia más cercana y prioridad de colores
-    puntos_asignados = asignar_puntos_secuencial(tortugas, puntos_prioridad, secuencia_colores, nrows, ncols)
+    with instrumentacion.temporizador('asignar_puntos_secuencial'):
+        puntos_asignados = asignar_puntos_secuencial(tortugas, puntos_prioridad, secuencia_colores, nrows, ncols)
+
+    if procesos:
+        # Modo paralelo: las mismas rutas que el modo secuencial, calculadas con un pool de procesos
+        tareas = [(tortuga, [asignaciones[color] for color in secuencia_colores if color in asignaciones])
+                  for tortuga, asignaciones in puntos_asignados.items()]
+        import rutas_paralelas
+        return rutas_paralelas.calcular_rutas(grafo, posiciones_prohibidas, tareas, etiquetas, procesos, motor)
 
-    rutas_tortugas = {}
+    caminos = []
     posiciones_bloqueadas = set()
 
     # Cálculo de rutas para cada tortuga basado en los puntos asignados
@@ -151,35 +138,59 @@ def main():
         for color in secuencia_colores:
             if color in asignaciones:
                 objetivo = asignaciones[color]
-                camino, distancia = dijkstra(grafo, inicio, objetivo, posiciones_prohibidas, posiciones_bloqueadas_temp, nrows, ncols)
+                with instrumentacion.temporizador('dijkstra'):
+                    camino, distancia = dijkstra(grafo, inicio, objetivo, posiciones_prohibidas, posiciones_bloqueadas_temp, nrows, ncols, etiquetas, espacio, motor)
                 if distancia < float('inf'):
                     ruta_tortuga.extend(camino[1:])  # Añadir la ruta encontrada a la ruta de la tortuga
                     inicio = objetivo  # Actualizar el inicio para el próximo punto
                     posiciones_bloqueadas_temp.add(objetivo)  # Bloquear esta posición para otras tortugas
 
         if ruta_tortuga:
-            for i in range(len(ruta_tortuga) - 1):
-                rutas_tortugas[ruta_tortuga[i]] = ruta_tortuga[i + 1]
-            rutas_tortugas[ruta_tortuga[-1]] = 'f'  # Marcar el objetivo como final
+            caminos.append(ruta_tortuga)  # La ruta completa, aunque pase por celdas de otras tortugas
 
         posiciones_bloqueadas.update(posiciones_bloqueadas_temp)  # Actualizar las posiciones bloqueadas
 
-    guardar_solucion('graph_generado.json', rutas_tortugas, "Dijkstra")
+    return caminos
 
+def main(usar_cache=False, procesos=None):
+    nrows, ncols = 15, 20
+    with open('graph_generado.json', 'r') as file:
+        data = json.load(file)
+    instrumentacion.bytes_archivo('bytes_leidos', 'graph_generado.json')
+    prohibidas = cargar_posiciones_prohibidas('cuadros_encerrados.txt')
 
+    # Con usar_cache, si ya se resolvió el mismo laberinto (paredes, tortugas, colores, opciones) se reusan sus rutas
+    cache = cache_contenido.cache_por_defecto() if usar_cache else None
+    # Las tortugas y los colores van como listas: su orden decide los empates y el orden de las rutas, y clave
+    # ordenaría las llaves de un diccionario
+    llave = cache_contenido.clave('sol_escenario_', 'Dijkstra', formato_rutas.hash_laberinto(data),
+                                  list(data['turtle'].items()), list(data['colors'].items()), prohibidas, nrows, ncols)
+    caminos = cache.obtener(llave) if cache is not None else None
+    if caminos is None:
+        caminos = calcular_caminos(data, prohibidas, nrows, ncols, procesos)
+        if cache is not None:
+            cache.guardar(llave, caminos)
 
+    guardar_solucion('graph_generado.json', caminos, "Dijkstra", ncols, data)
+
+    return caminos
 
 
-if __name__ == "__main__":
-    hilo1 = threading.Thread(target=lambda: labyrinth.Labyrinth(15, 20, path=backup_labyrinth('graph_generado.json')).start())
-    hilo2 = threading.Thread(target=main)
-    hilo3 = threading.Thread(target=lambda: labyrinth.Labyrinth(15, 20, path=backup_labyrinth('graph_generado_solucionDijkstra.json')).start())
 
-    hilo1.start()
-    hilo2.start()
 
-    hilo2.join()
-    hilo1.join()
-    hilo3.start()
 
-    hilo3.join()
\ No newline at end of file
+async def resolver_y_mostrar(puente):
+    # El laberinto sin resolver se muestra mientras main resuelve en un executor, y luego se muestra la solución
+    import asyncio
+    loop = asyncio.get_running_loop()
+    with open('graph_generado.json', 'r') as file:
+        await puente.publicar(json.load(file))
+    await loop.run_in_executor(None, main)
+    with open('graph_generado_solucionDijkstra.json', 'r') as file:
+        await puente.publicar(formato_rutas.expandir(json.load(file)))
+
+
+if __name__ == "__main__":
+    # Un solo visor en el hilo principal de Tk; la resolución corre en el bucle de asyncio
+    import orquestador  # Tk solo se carga al mostrar
+    orquestador.ejecutar_con_visor(resolver_y_mostrar, 15, 20)
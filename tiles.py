@@ -16,6 +16,10 @@ UTP - Pereira, Colombia 2024
 """
 
 import tkinter as tk
+import os
+
+# Directory holding the turtle images, resolved from this file so the module works from any working directory
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources')
 
 
 class Tile:
@@ -59,6 +63,8 @@ class Tile:
         Draws the tile on the canvas.
     _draw_border(self, border_id: int):
         Draws a border on the tile based on the given border_id.
+    update_background(self, bg: str):
+        Changes the background color of the tile.
     update_border_visualization(self, border_id: int, state: bool):
         Updates the visualization of a border in the canvas.
     _get_line_coords(self, border_id: int):
@@ -117,9 +123,9 @@ class Tile:
         else:
             turtle_img_size = "25"
 
-        # Construct the absolute path to the turtle image file
-
-        turtle_img_path = f"resources\\{turtle_img_size}\\turtle_{turtle_img_size}px_{self.turtle_orientation}.png"
+        # Construct the absolute path to the turtle image file (portable between Windows and Linux)
+        turtle_img_path = os.path.join(RESOURCES_DIR, turtle_img_size,
+                                       f"turtle_{turtle_img_size}px_{self.turtle_orientation}.png")
         return tk.PhotoImage(file=turtle_img_path)
 
     def draw(self, bg='lightblue', turtle=False):
@@ -187,6 +193,13 @@ class Tile:
                                                                  line_coords[3], fill='lightblue1',
                                                                  width=self.border_width)
 
+    def update_background(self, bg: str):
+        """
+        This method changes the background color of the tile, without redrawing the tile.
+        :param bg: (str) The new background color of the tile.
+        """
+        self.canvas.itemconfig(self.bg_ID, fill=bg)
+
     def update_border_visualization(self, border_id: int, state: bool):
         """
         This method updates the visualization of a border in the canvas.
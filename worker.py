@@ -1,15 +1,22 @@
 """
 Implementation of worker example. In this case, random walls are generated.
 
+trabajador builds every frame as a Grafo from the bits of one random number. trabajador_empaquetado is the frame source
+for stress tests: it draws all the wall bits of a frame with one NumPy call, sends them as packed frames (see
+cuadros_empaquetados) at a target rate, and reports the rate it achieved.
+
 Damiel Zapata Y.
 German A Holguin L.
 UTP - Pereira, Colombia 2024.
 """
 
+import queue
 import time
-from globales import candado
+from globales import candado, cola
 from grafo import Grafo
-from random import randint
+from random import getrandbits
+import cuadros_empaquetados
+import instrumentacion
 
 
 def trabajador(rows, columns, ruta=''):
@@ -24,20 +31,69 @@ def trabajador(rows, columns, ruta=''):
     done = False
     reps = 0
     while not done and reps < 50:
-        grafo = Grafo()
-        # Create a graph of 10 by 20 vertices with random edges
-        for i in range(rows * columns):
-            # Horizontal edges
-            vertex_o = i
-            vertex_i = i + 1
-            if vertex_i % columns != 0:
-                grafo.add_edge(vertex_o, vertex_i, randint(0, 1))
-            # Vertical edges
-            vertex_i = i + columns
-            if vertex_i < rows * columns:
-                grafo.add_edge(vertex_o, vertex_i, randint(0, 1))
-        with candado:
-            # grafo.save_graph(ruta)
-            grafo.send_graph()
+        # Create a graph of rows by columns vertices with random walls, all the edges at once. The weights of the
+        # edges are the bits of one random number, in the order of the edges of the grid: a weight of 0 is a wall
+        n_edges = rows * (columns - 1) + (rows - 1) * columns
+        pesos = format(getrandbits(n_edges), f'0{n_edges}b') if n_edges else ''
+        grafo = Grafo.grid(rows, columns, walls=list(map('0'.__eq__, pesos)))
+        # grafo.save_graph(ruta)
+        grafo.send_graph()  # send_graph takes the lock itself (the lock is not reentrant)
         time.sleep(1)
         reps += 1
+
+
+def trabajador_empaquetado(rows, columns, fps=60.0, cuadros=50, semilla=None, destino=None):
+    """
+    function to send random packed frames to the Labyrinth at a target rate.
+
+    The frames are paced against a fixed schedule (the frame k is due k / fps seconds after the start), so a late frame
+    does not delay the following ones. If the destination queue is bounded and full, the frame is dropped.
+
+    :param rows: Number of rows of the board
+    :param columns: Number of columns of the board
+    :param fps: Target number of frames per second
+    :param cuadros: Number of frames to send
+    :param semilla: Seed of the random walls
+    :param destino: Queue the frames are sent to. Default is the global queue 'cola'
+    :return : (dict) The report: frames sent and dropped, the target rate, the rate at which the frames were produced
+              ('fps_producido', sent or dropped) and the rate at which they were delivered ('fps_logrado', only the
+              sent ones), all in frames per second, the elapsed seconds and the worst delay against the schedule in
+              seconds
+    """
+    import numpy as np  # NumPy is only loaded in this mode
+
+    destino = cola if destino is None else destino
+    rng = np.random.default_rng(semilla)
+    n_bytes = (cuadros_empaquetados.n_aristas(rows, columns) + 7) // 8
+    enviados = descartados = 0
+    retraso_maximo = 0.0
+    inicio = time.perf_counter()
+    primero = ultimo = inicio
+    for k in range(cuadros):
+        # One bit per edge: the random bytes are the packed bits of a fair coin per wall
+        paredes = rng.integers(0, 256, size=n_bytes, dtype=np.uint8).tobytes()
+        frame = cuadros_empaquetados.cuadro(rows, columns, paredes)
+        espera = inicio + k / fps - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        else:
+            retraso_maximo = max(retraso_maximo, -espera)
+        try:
+            with candado:
+                destino.put_nowait(frame)
+            enviados += 1
+        except queue.Full:
+            descartados += 1
+        ultimo = time.perf_counter()
+        if k == 0:
+            primero = ultimo
+    segundos = ultimo - primero  # From the first frame to the last one
+    fps_producido = (cuadros - 1) / segundos if segundos > 0 else 0.0
+    fps_logrado = fps_producido * enviados / cuadros if cuadros else 0.0  # The dropped frames are not delivered
+    instrumentacion.contar('cuadros_enviados', enviados)
+    instrumentacion.contar('cuadros_descartados_fuente', descartados)
+    reporte = {'enviados': enviados, 'descartados': descartados, 'fps_objetivo': fps, 'fps_producido': fps_producido,
+               'fps_logrado': fps_logrado, 'segundos': segundos, 'retraso_maximo': retraso_maximo}
+    print(f"Frames: {enviados} sent, {descartados} dropped. Rate: {fps_logrado:.1f} fps delivered, "
+          f"{fps_producido:.1f} fps produced, {fps:.1f} fps target. Worst delay: {retraso_maximo * 1000:.1f} ms")
+    return reporte